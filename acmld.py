@@ -1,6 +1,9 @@
+from __future__ import print_function
+
 import optparse
 import os
 import sys
+import time
 import re
 import getopt
 
@@ -9,14 +12,23 @@ try:
 	# pylint: disable-msg=F0401
 	# pylint: disable-msg=E0611
 	from urllib.request import HTTPCookieProcessor, Request, build_opener
+	from urllib.error import HTTPError
 	from urllib.parse import quote, unquote
 	from http.cookiejar import MozillaCookieJar
 except ImportError:
 	# Fallback for Python 2
-	from urllib2 import Request, build_opener, HTTPCookieProcessor
+	from urllib2 import Request, build_opener, HTTPCookieProcessor, HTTPError
 	from urllib import quote, unquote
 	from cookielib import MozillaCookieJar
 
+from scholar_archive import HttpArchive
+from scholar_batch import Prefetch, ProcessPool
+from scholar_cache import ScholarCache
+from scholar_flight import SingleFlight, canonical_url
+from scholar_http import ScholarTransport
+from scholar_ratelimit import RateLimiter
+from scholar_store import ArticleStore
+from scholar_trace import NULL_TRACER
 
 # Import BeautifulSoup -- try 4 first, fall back to older
 try:
@@ -67,6 +79,44 @@ class ScholarConf(object):
 	# cookie use across sessions.
 	COOKIE_JAR_FILE = None
 
+	# If set, responses get cached in this directory, so repeated
+	# queries are answered from disk. See scholar_cache.ScholarCache.
+	CACHE_DIR = None
+	CACHE_TTL = 7*24*3600 # Seconds a cached response stays valid
+	CACHE_MAX_BYTES = 256*1024*1024
+
+	# Number of result pages fetched ahead of the one being parsed,
+	# when a query spans several pages.
+	PREFETCH_PAGES = 4
+
+	# If set, parsed articles get recorded in this SQLite database,
+	# see scholar_store.ArticleStore.
+	STORE_FILE = None
+
+	# If set, responses get recorded in this archive file, or served
+	# from it instead of the network, depending on ARCHIVE_MODE
+	# ('record' or 'replay'). Replayed responses take ARCHIVE_LATENCY
+	# seconds, or as long as they took when recorded if 'recorded'.
+	# See scholar_archive.HttpArchive.
+	ARCHIVE_FILE = None
+	ARCHIVE_MODE = 'replay'
+	ARCHIVE_LATENCY = None
+
+	# If positive, result pages get parsed in a pool of this many
+	# worker processes, in parallel with the fetching threads, rather
+	# than in the thread that fetched them. See
+	# scholar_batch.ProcessPool.
+	PARSE_PROCESSES = 0
+
+	# Requests per second and host. Requests start out at RATE_LIMIT
+	# and speed up to at most RATE_LIMIT_MAX while the site keeps
+	# accepting them; rate-limit responses slow them down again. See
+	# scholar_ratelimit.RateLimiter.
+	RATE_LIMIT = 2.0
+	RATE_LIMIT_MAX = 5.0
+	RATE_LIMIT_BURST = 2
+	RATE_LIMIT_RETRIES = 3 # Retries of a rate-limited request
+
 class ScholarUtils(object):
 	"""A wrapper for various utensils that come in handy."""
 
@@ -91,59 +141,140 @@ class ScholarUtils(object):
 		sys.stderr.write('[%5s]  %s' % (level.upper(), msg + '\n'))
 		sys.stderr.flush()
 
+# Marks unset article attributes, see ScholarArticle:
+_UNSET = object()
+
 class ScholarArticle(object):
 	"""
 	A class representing articles listed on Google Scholar.  The class
 	provides basic dictionary-like behavior.
 	"""
+	# The triplets for each keyword correspond to (1) the key, (2) a
+	# user-suitable label for the item, and (3) its default value. The
+	# position in the tuple gives the ordering. Since articles can be
+	# numerous, labels and ordering live here, once per class, while
+	# each instance only holds the values, in slots:
+	SCHEMA = (
+		('title',         'Title',          None),
+		('url',           'URL',            None),
+		('date',          'Date',           None),
+		('conference',    'Conerence',      None),
+		('num_citations', 'Citations',      0),
+	)
+	KEYS = tuple([item[0] for item in SCHEMA])
+	LABELS = dict([(item[0], item[1]) for item in SCHEMA])
+
+	__slots__ = KEYS + ('extra', 'citation_data')
+
 	def __init__(self):
-		# The triplets for each keyword correspond to (1) the actual
-		# value, (2) a user-suitable label for the item, and (3) an
-		# ordering index:
-		self.attrs = {
-			'title':         [None, 'Title',          0],
-			'url':           [None, 'URL',            1],
-			'date':          [None, 'Date',           2],
-			'conference':	 [None, 'Conerence',	  3],	
-			'num_citations': [0,    'Citations',      4],
-
-        }
+		for key, _, default in self.SCHEMA:
+			setattr(self, key, default)
+
+		# Any further attributes set on the fly, as a list of [key,
+		# value] pairs in the order they were added. None until needed.
+		self.extra = None
 
 		# The citation data in one of the standard export formats,
 		# e.g. BibTeX.
 		self.citation_data = None
 
 	def __getitem__(self, key):
-		if key in self.attrs:
-			return self.attrs[key][0]
+		if key in self.LABELS:
+			return getattr(self, key, None)
+		if self.extra is not None:
+			for item in self.extra:
+				if item[0] == key:
+					return item[1]
 		return None
 
 	def __len__(self):
-		return len(self.attrs)
+		return len(self._items())
+
+	def keys(self):
+		"""Returns the keys of all attributes the article has, in order."""
+		return [item[0] for item in self._items()]
 
 	def __setitem__(self, key, item):
-		if key in self.attrs:
-			self.attrs[key][0] = item
-		else:
-			self.attrs[key] = [item, key, len(self.attrs)]
+		if key in self.LABELS:
+			setattr(self, key, item)
+			return
+		if self.extra is None:
+			self.extra = []
+		for pair in self.extra:
+			if pair[0] == key:
+				pair[1] = item
+				return
+		self.extra.append([key, item])
 
 	def __delitem__(self, key):
-		if key in self.attrs:
-			del self.attrs[key]
+		if key in self.LABELS:
+			if getattr(self, key, _UNSET) is not _UNSET:
+				delattr(self, key)
+		elif self.extra is not None:
+			self.extra = [pair for pair in self.extra if pair[0] != key] or None
+
+	@property
+	def attrs(self):
+		"""
+		The article's attributes in the dictionary layout older code
+		expects, mapping keys to [value, label, ordering index]
+		triplets. This is a snapshot; changing it does not change the
+		article.
+		"""
+		res = {}
+		for idx, (key, label, val) in enumerate(self._items()):
+			res[key] = [val, label, idx]
+		return res
+
+	def _items(self):
+		"""
+		Returns (key, label, value) triplets for all attributes the
+		article has, in order.
+		"""
+		items = []
+		for key, label, _ in self.SCHEMA:
+			val = getattr(self, key, _UNSET)
+			if val is not _UNSET:
+				items.append((key, label, val))
+		if self.extra is not None:
+			for key, val in self.extra:
+				items.append((key, key, val))
+		return items
+
+	def as_record(self):
+		"""
+		Returns the article's attributes as a compact, picklable list of
+		(key, value) pairs, in order. See from_record().
+		"""
+		return [(key, val) for key, _, val in self._items()]
+
+	@classmethod
+	def from_record(cls, record):
+		"""
+		Returns a new article with exactly the attributes of the given
+		record, as returned by as_record().
+		"""
+		art = cls()
+		keys = set([key for key, _ in record])
+		for key in cls.KEYS:
+			if key not in keys:
+				del art[key]
+		for key, val in record:
+			art[key] = val
+		return art
 
 	def set_citation_data(self, citation_data):
 		self.citation_data = citation_data
 
 	def as_txt(self):
-		# Get items sorted in specified order:
-		items = sorted(list(self.attrs.values()), key=lambda item: item[2])
+		items = self._items()
 		# Find largest label length:
 		max_label_len = max([len(str(item[1])) for item in items])
 		fmt = '%%%ds %%s' % max_label_len
 		res = []
 		for item in items:
-			if item[0] is not None:
-				res.append(fmt % (item[1], item[0]))
+			if item[2] is not None:
+				res.append(fmt % (item[1], item[2]))
 		return '\n'.join(res)
 
 
@@ -151,13 +282,21 @@ class ScholarArticleParser(object):
 	"""
 	ScholarArticleParser can parse HTML document strings obtained from
 	ACM Digital Library. 
+
+	If fields is given, it names the article attributes the caller is
+	interested in, and the parser skips the work for all others. The
+	title is always extracted, since articles without one get dropped.
 	"""
-	def __init__(self, site=None):
+	def __init__(self, site=None, fields=None):
 		self.soup = None
 		self.article = None
 		self.site = site or ScholarConf.SCHOLAR_SITE
+		self.tracer = NULL_TRACER
 		self.year_re = re.compile(r'\b(?:20|19)\d{2}\b')
 		self.citation = re.compile(r'Citation Count:[\s]+([0-9]+)')
+		self.fields = None
+		if fields is not None:
+			self.fields = set(fields)
 
 	def handle_article(self, art):
 		"""
@@ -165,6 +304,13 @@ class ScholarArticleParser(object):
 		successfully.  In this base class, the callback does nothing.
 		"""	
 
+	def handle_num_results(self, num_results):
+		"""
+		The parser invokes this callback if it determines the overall
+		number of results, as reported on the parsed results page. The
+		base class implementation does nothing.
+		"""
+
 	def _clean_article(self):
 		"""
 		This gets invoked after we have parsed an article, to do any
@@ -174,22 +320,57 @@ class ScholarArticleParser(object):
 		if self.article['title']:
 			self.article['title'] = self.article['title'].strip()
 
+	def _wants(self, *keys):
+		"""
+		This predicate checks whether any of the given article
+		attributes were requested via the fields constructor argument.
+		"""
+		if self.fields is None:
+			return True
+		for key in keys:
+			if key in self.fields:
+				return True
+		return False
+
 	def parse(self, html):
 		"""
 		This method initiates parsing of HTML content, cleans resulting
 		content as needed, and notifies the parser instance of
 		resulting instances via the handle_article callback.
 		"""
-		self.soup = BeautifulSoup(html)
+		for art in self.iter_parse(html):
+			self.handle_article(art)
 
+	def iter_parse(self, html):
+		"""
+		Generator variant of parse(): yields each article as soon as it
+		has been parsed and cleaned, instead of invoking the
+		handle_article callback.
+		"""
+		with self.tracer.span('soup', bytes=len(html)):
+			self.soup = BeautifulSoup(html)
+
+		# This parses any global, non-itemized attributes from the page.
+		self._parse_globals()
 
 		# Now parse out listed articles:
 		for div in self.soup.findAll(ScholarArticleParser._tag_contain_article):	
+			start = time.time()
 			self._parse_article(div)
 			self._clean_article()
- 			if self.article['title']:
-				self.handle_article(self.article)
+			self.tracer.record('article', start, time.time() - start)
+			if self.article['title']:
+				yield self.article
+
 
+	def _parse_globals(self):
+		tag = self.soup.find(name='div', attrs={'id': 'resfound'})
+		if tag is not None and tag.strong is not None:
+			try:
+				num_results = ''.join(tag.strong.findAll(text=True))
+				self.handle_num_results(int(num_results.replace(',', '')))
+			except ValueError:
+				pass
 
 	def _parse_article(self, div):
 		self.article = ScholarArticle()
@@ -200,11 +381,12 @@ class ScholarArticleParser(object):
 
 			if tag.name == 'div' and self._tag_has_class(tag, 'title') and tag.a:
 				self.article['title'] = ''.join(tag.a.findAll(text=True))
-				self.article['url'] = self._path2url(tag.a['href'])
+				if self._wants('url'):
+					self.article['url'] = self._path2url(tag.a['href'])
 				continue
 
 			
-			if tag.name == 'div' and self._tag_has_class(tag, 'source'):
+			if tag.name == 'div' and self._tag_has_class(tag, 'source') and self._wants('date', 'conference'):
 				spans = tag.findAll('span')
 				if len(spans) != 2:
 					continue
@@ -214,7 +396,7 @@ class ScholarArticleParser(object):
 				
 				self.article['conference'] = ''.join(spans[1].findAll(text=True))
 
-			if tag.name == 'div' and self._tag_has_class(tag, 'metrics'):
+			if tag.name == 'div' and self._tag_has_class(tag, 'metrics') and self._wants('num_citations'):
 				tags = tag.findAll('div')
 				if len(tags) < 2:
 					continue
@@ -238,7 +420,7 @@ class ScholarArticleParser(object):
 		"""
 		res = tag.get('class') or []
 		if type(res) != list:
- 			# BeautifulSoup 3 can return e.g. 'gs_md_wp gs_ttss',
+			# BeautifulSoup 3 can return e.g. 'gs_md_wp gs_ttss',
 			# so split -- conveniently produces a list in any case
 			res = res.split()
 		return klass in res
@@ -263,19 +445,85 @@ class ScholarQuerier(object):
 	articles found are collected in the articles member, a list of
 	ScholarArticle instances.
 	"""
+	# Responses telling us to slow down. The ACM DL signals this
+	# through the HTTP status only.
+	RATE_LIMIT_CODES = (429, 503)
+	BLOCK_URL_MARKERS = ()
+	BLOCK_PAGE_MARKERS = ()
+
+	# The source name articles get recorded under in the article store:
+	STORE_SOURCE = 'acm'
+
 	class Parser(ScholarArticleParser):
-		def __init__(self, querier):
-			ScholarArticleParser.__init__(self)
+		def __init__(self, querier, fields=None):
+			ScholarArticleParser.__init__(self, fields=fields)
 			self.querier = querier
+			self.tracer = getattr(querier, 'tracer', NULL_TRACER)
+			self.num_results = None
+
+		def handle_num_results(self, num_results):
+			self.num_results = num_results
 
 		def handle_article(self, art):
 			self.querier.add_article(art)
 
-	def __init__(self):
+	def __init__(self, cache=None, limiter=None, tracer=None, store=None, flights=None,
+				archive=None, parse_pool=None):
 		self.articles = []
 		self.query = None
 		self.cjar = MozillaCookieJar()
 
+		# The record/replay archive, if any. By default all queriers of
+		# a process share the one for ScholarConf.ARCHIVE_FILE:
+		self.archive = archive
+		if self.archive is None and ScholarConf.ARCHIVE_FILE:
+			self.archive = HttpArchive.shared(ScholarConf.ARCHIVE_FILE,
+											ScholarConf.ARCHIVE_MODE,
+											ScholarConf.ARCHIVE_LATENCY)
+
+		# The response cache, if any. By default all queriers of a
+		# process share the one for ScholarConf.CACHE_DIR, unless they
+		# record or replay an archive, which needs to see every
+		# request:
+		self.cache = cache
+		if self.cache is None and ScholarConf.CACHE_DIR and self.archive is None:
+			self.cache = ScholarCache.shared(ScholarConf.CACHE_DIR,
+											ScholarConf.CACHE_TTL,
+											ScholarConf.CACHE_MAX_BYTES)
+
+		# The article store parsed articles get recorded in, if any. By
+		# default all queriers of a process share the one for
+		# ScholarConf.STORE_FILE:
+		self.store = store
+		if self.store is None and ScholarConf.STORE_FILE:
+			self.store = ArticleStore.shared(ScholarConf.STORE_FILE)
+
+		# The process pool result pages get parsed in, if any. By
+		# default all queriers of a process share the one of
+		# ScholarConf.PARSE_PROCESSES workers:
+		self.parse_pool = parse_pool
+		if self.parse_pool is None and ScholarConf.PARSE_PROCESSES > 0:
+			self.parse_pool = ProcessPool.shared(ScholarConf.PARSE_PROCESSES)
+
+		# Timing spans get recorded here, see scholar_trace.Tracer:
+		self.tracer = tracer or NULL_TRACER
+
+		# The request rate limiter. By default all queriers of a
+		# process share one:
+		self.limiter = limiter
+		if self.limiter is None:
+			self.limiter = RateLimiter.shared(ScholarConf.SCHOLAR_SITE,
+											rate=ScholarConf.RATE_LIMIT,
+											burst=ScholarConf.RATE_LIMIT_BURST,
+											max_rate=ScholarConf.RATE_LIMIT_MAX)
+
+		# Identical requests in flight get coalesced into one. By
+		# default this happens across all queriers of a process, which
+		# assumes they use the same settings:
+		self.flights = flights
+		if self.flights is None:
+			self.flights = SingleFlight.shared(ScholarConf.SCHOLAR_SITE)
+
 		# If we have a cookie file, load it:
 		if ScholarConf.COOKIE_JAR_FILE and \
 			os.path.exists(ScholarConf.COOKIE_JAR_FILE):
@@ -286,35 +534,136 @@ class ScholarQuerier(object):
 				ScholarUtils.log('warn', 'could not load cookies file: %s' % msg)
 				self.cjar = MozillaCookieJar() # Just to be safe
 
-		self.opener = build_opener(HTTPCookieProcessor(self.cjar))
+		# Keep-alive connection pool, negotiating compressed transfer:
+		self.opener = ScholarTransport(self.cjar, tracer=self.tracer)
 		self.settings = None # Last settings object, if any
 
 
-	def send_query(self, query):
+	def send_query(self, query, fields=None):
+		"""
+		This method initiates a search query (a SearchScholarQuery
+		instance) with subsequent parsing of the response, across as
+		many result pages as the query asks for. If fields is given,
+		only those article attributes get extracted (see
+		ScholarArticleParser).
+		"""
+		with self.tracer.span('send_query'):
+			self.clear_articles()
+			self.query = query
+
+			for art in self._iter_query(query, fields):
+				self.add_article(art)
+
+
+	def iter_articles(self, queries, fields=None):
 		"""
-		This method initiates a search query (a ScholarQuery instance)
-		with subsequent parsing of the response.
+		Generator counterpart of send_query(). Takes a single query or
+		an iterable of them, and yields each article as soon as it has
+		been parsed, without collecting it in the articles member.
+		Queries whose retrieval fails yield nothing.
 		"""
-		self.clear_articles()
-		self.query = query
+		if hasattr(queries, 'get_url'):
+			queries = [queries]
+
+		for query in queries:
+			self.query = query
+			for art in self._iter_query(query, fields):
+				yield art
+
 
-		html = self._get_http_response(url=query.get_url(),
+	def _iter_query(self, query, fields=None):
+		"""
+		Retrieves and parses the result pages of the given query,
+		yielding the articles. Up to ScholarConf.PREFETCH_PAGES pages
+		beyond the one being parsed are fetched in the background.
+		Prefetching starts only once the site has reported the number
+		of results, so that no pages beyond it get requested; until
+		then, pages get fetched one by one. Pagination stops once the
+		requested total is reached or a page comes back empty.
+		"""
+		num_pages = query.get_num_pages()
+		remaining = query.total_results
+		pending = [] # Prefetches of the upcoming pages, in order
+		next_page = 0
+
+		for page in range(num_pages):
+			if len(pending) > 0:
+				result = pending.pop(0).result()
+			else:
+				# The first page, or no number of results reported:
+				result = self._get_page(query, page, fields)
+			next_page = max(next_page, page + 1)
+			if result is None:
+				return
+			num_results, articles = result
+			if num_results is not None:
+				query.num_results = num_results
+
+			# Keep up to PREFETCH_PAGES pages beyond this one in flight,
+			# as far as the number of results goes:
+			while next_page < num_pages and query.num_results \
+				and next_page <= page + ScholarConf.PREFETCH_PAGES \
+				and query.has_page(next_page):
+				pending.append(Prefetch(self._get_page, query, next_page, fields))
+				next_page += 1
+
+			found = 0
+			for art in articles:
+				found += 1
+				yield art
+				if remaining is not None:
+					remaining -= 1
+					if remaining <= 0:
+						return
+
+			if found == 0 or not query.has_page(page + 1):
+				return
+
+
+	def _get_page(self, query, page, fields=None):
+		"""
+		Retrieves and parses the given result page of the query.
+		Returns the number of results the site reports, if any, and the
+		list of articles, or None if retrieval failed. Concurrent
+		requests for the same page and fields share one fetch and
+		parse, and with it the resulting articles.
+		"""
+		with self.tracer.span('build_url'):
+			url = query.get_url(page)
+		if fields is not None:
+			fields = tuple(fields)
+		return self.flights.do(('page', canonical_url(url), fields),
+								self._fetch_page, url, fields)
+
+	def _fetch_page(self, url, fields):
+		html = self._get_http_response(url=url,
 										log_msg='dump of query response HTML',
 										err_msg='results retrieval failed')
 		if html is None:
-			return
+			return None
 
-		#print len(html)
+		if self.parse_pool is not None:
+			with self.tracer.span('parse_pool', bytes=len(html)):
+				num_results, records = self.parse_pool.run(parse_page_records, html, fields)
+			articles = [ScholarArticle.from_record(record) for record in records]
+		else:
+			parser = self.Parser(self, fields)
+			articles = list(parser.iter_parse(html))
+			num_results = parser.num_results
 
-		self.parse(html)
+		if self.store is not None:
+			self.store.put_many(self.STORE_SOURCE, articles)
+		return num_results, articles
 
 
-	def parse(self, html):
+	def parse(self, html, fields=None):
 		"""
 		This method allows parsing of provided HTML content.
 		"""
-		parser = self.Parser(self)
+		parser = self.Parser(self, fields)
 		parser.parse(html)
+		if parser.num_results is not None and self.query is not None:
+			self.query.num_results = parser.num_results
 
 
 	def add_article(self, art):
@@ -325,61 +674,209 @@ class ScholarQuerier(object):
 		"""Clears any existing articles stored from previous queries."""
 		self.articles = []
 
-	def _get_http_response(self, url, log_msg=None, err_msg=None):
+	def _get_http_response(self, url, log_msg=None, err_msg=None, cacheable=True):
 		"""
 		Helper method, sends HTTP request and returns response payload.
+		Unless cacheable is False, the response cache gets consulted
+		first, and successful responses are stored in it. Requests go
+		through the rate limiter; those the site rejects as too
+		frequent get retried after backing off. Concurrent requests for
+		the same URL share one of them. With an archive, responses get
+		recorded in it, or replayed from it without any network access.
 		"""
+		return self.flights.do(('fetch', canonical_url(url), cacheable),
+								self._send_http_request, url, log_msg, err_msg, cacheable)
+
+	def _send_http_request(self, url, log_msg, err_msg, cacheable):
 		if log_msg is None:
 			log_msg = 'HTTP response data follow'
 		if err_msg is None:
 			err_msg = 'request failed'
-		try:
-			ScholarUtils.log('info', 'requesting %s' % unquote(url))
 
-			req = Request(url=url, headers={'User-Agent': ScholarConf.USER_AGENT})
-			hdl = self.opener.open(req)
-			html = hdl.read()
+		if self.archive is not None and not self.archive.recording:
+			return self._replay(url, err_msg)
+
+		if cacheable and self.cache is not None:
+			html = self.cache.get(url)
+			if html is not None:
+				ScholarUtils.log('info', 'cache hit for %s' % unquote(url))
+				return html
 
-			ScholarUtils.log('debug', log_msg)
-			ScholarUtils.log('debug', '>>>>' + '-'*68)
-			ScholarUtils.log('debug', 'url: %s' % hdl.geturl())
-			ScholarUtils.log('debug', 'result: %s' % hdl.getcode())
-			ScholarUtils.log('debug', 'headers:\n' + str(hdl.info()))
-			ScholarUtils.log('debug', 'data:\n' + html.decode('utf-8')) # For Python 3
-			ScholarUtils.log('debug', '<<<<' + '-'*68)
+		for _ in range(ScholarConf.RATE_LIMIT_RETRIES + 1):
+			start = time.time()
+			waited = self.limiter.acquire(url)
+			if waited > 0:
+				self.tracer.record('rate_wait', start, waited)
+			if waited > 1:
+				ScholarUtils.log('info', 'rate limit delayed request by %.1f sec' % waited)
 
+			try:
+				ScholarUtils.log('info', 'requesting %s' % unquote(url))
+
+				req = Request(url=url, headers={'User-Agent': ScholarConf.USER_AGENT})
+				start = time.time()
+				with self.tracer.span('request', url=url):
+					hdl = self.opener.open(req)
+					html = hdl.read()
+
+				# Decoding the body is expensive, so only do it if we
+				# actually log it:
+				if ScholarConf.LOG_LEVEL >= ScholarUtils.LOG_LEVELS['debug']:
+					ScholarUtils.log('debug', log_msg)
+					ScholarUtils.log('debug', '>>>>' + '-'*68)
+					ScholarUtils.log('debug', 'url: %s' % hdl.geturl())
+					ScholarUtils.log('debug', 'result: %s' % hdl.getcode())
+					ScholarUtils.log('debug', 'headers:\n' + str(hdl.info()))
+					ScholarUtils.log('debug', 'data:\n' + html.decode('utf-8')) # For Python 3
+					ScholarUtils.log('debug', '<<<<' + '-'*68)
+			except HTTPError as err:
+				if err.code not in self.RATE_LIMIT_CODES:
+					ScholarUtils.log('info', err_msg + ': %s' % err)
+					if self.archive is not None:
+						self.archive.record(url, None, err.code, time.time() - start)
+					return None
+				self._throttled(url, err.headers.get('Retry-After') if err.headers else None)
+				continue
+			except Exception as err:
+				ScholarUtils.log('info', err_msg + ': %s' % err)
+				return None
+
+			if self._is_block_page(hdl.geturl(), html):
+				self._throttled(url)
+				continue
+
+			self.limiter.success(url)
+			if self.archive is not None:
+				self.archive.record(url, html, 200, time.time() - start)
+			if cacheable and self.cache is not None:
+				self.cache.put(url, html)
 			return html
-		except Exception as err:
-			ScholarUtils.log('info', err_msg + ': %s' % err)
+
+		ScholarUtils.log('info', err_msg + ': still rate limited after %d retries' \
+			% ScholarConf.RATE_LIMIT_RETRIES)
+		return None
+
+	def _replay(self, url, err_msg):
+		with self.tracer.span('replay', url=url):
+			response = self.archive.get(url)
+		if response is None:
+			ScholarUtils.log('info', err_msg + ': not in archive: %s' % unquote(url))
 			return None
+		status, html = response
+		if html is None:
+			ScholarUtils.log('info', err_msg + ': replayed HTTP error %d' % status)
+		return html
+
+	def _throttled(self, url, retry_after=None):
+		rate = self.limiter.throttled(url, retry_after)
+		msg = 'rate limited, slowing down to %.2f requests/sec' % rate
+		if retry_after is not None:
+			msg += ', retry after %s' % retry_after
+		ScholarUtils.log('warn', msg)
+
+	def _is_block_page(self, url, html):
+		"""
+		Predicate telling whether a response that came back fine at
+		the HTTP level is really the site's interstitial for clients
+		it considers abusive.
+		"""
+		for marker in self.BLOCK_URL_MARKERS:
+			if marker in url:
+				return True
+		for marker in self.BLOCK_PAGE_MARKERS:
+			if marker in html:
+				return True
+		return False
+
+
+def parse_page_records(html, fields=None):
+	"""
+	Parses the given result page like ScholarQuerier does, and returns
+	the number of results the site reports, if any, and the articles as
+	records (see ScholarArticle.as_record()). This is what the worker
+	processes of ScholarQuerier.parse_pool run.
+	"""
+	parser = ScholarQuerier.Parser(None, fields)
+	records = [art.as_record() for art in parser.iter_parse(html)]
+	return parser.num_results, records
 
 
 class SearchScholarQuery():
 	def __init__(self):
 		self.sTitle = None 
+		self.titles = None # Alternatives to sTitle, see set_titles()
 		self.sYear = None
+		self.start = 0
+		self.total_results = None # None means a single page
+		self.num_results = None # As reported on the results page
 
 	def set_title(self, sTitle):
 		"""Sets words that *all* must be found in the title."""
 		self.sTitle = sTitle
 
+	def set_titles(self, titles):
+		"""
+		Sets titles of which *at least one* must be found, each as an
+		exact phrase. This takes precedence over set_title().
+		"""
+		self.titles = list(titles)
+
 	def set_year(self, year):
 		self.sYear = year
 
-	def get_url(self):
-		self.sTitle = self.sTitle.replace(':', '')
-		self.sTitle = self.sTitle.replace('+', '%252B')
-		wordList = self.sTitle.split()
+	def set_start(self, start):
+		"""Sets the offset of the first result to retrieve."""
+		self.start = ScholarUtils.ensure_int(start, 'result offset must be numeric')
 
+	def set_total_results(self, total_results):
+		"""
+		Sets the overall number of results to retrieve, across as many
+		result pages as needed.
+		"""
+		msg = 'total number of results must be numeric'
+		self.total_results = ScholarUtils.ensure_int(total_results, msg)
+
+	def get_page_size(self):
+		return ScholarConf.MAX_PAGE_RESULTS
+
+	def get_num_pages(self):
+		if self.total_results is None:
+			return 1
+		size = self.get_page_size()
+		return max(1, (self.total_results + size - 1) // size)
+
+	def has_page(self, page):
+		"""
+		Predicate telling whether the given result page (counting from
+		zero) may hold any results, judging by the number of results
+		the site reported so far.
+		"""
+		if not self.num_results:
+			return True
+		return self.start + page * self.get_page_size() < self.num_results
+
+	def get_url(self, page=0):
 		sURL = 'http://dl.acm.org/results.cfm?query=acmdlTitle:('
 
-		for word in wordList:
-			sURL += '%252B'
-			sURL += word
-			sURL += '%20'
+		if self.titles != None:
+			phraseList = []
+			for sTitle in self.titles:
+				sTitle = sTitle.replace(':', '').replace('"', '')
+				sTitle = sTitle.replace('+', '%252B')
+				phraseList.append('%22' + '%20'.join(sTitle.split()) + '%22')
+			sURL += '%20'.join(phraseList)
+		else:
+			self.sTitle = self.sTitle.replace(':', '')
+			self.sTitle = self.sTitle.replace('+', '%252B')
+			wordList = self.sTitle.split()
 
-		if len(wordList) > 0:
-			sURL = sURL[:-3]
+			for word in wordList:
+				sURL += '%252B'
+				sURL += word
+				sURL += '%20'
+
+			if len(wordList) > 0:
+				sURL = sURL[:-3]
 
 		sURL += ')&within=owners.owner=HOSTED&filtered=&dte='
 
@@ -395,19 +892,29 @@ class SearchScholarQuery():
 		else:
 			sURL += ""
 
+		nStart = self.start + page * self.get_page_size()
+		if nStart > 0:
+			sURL += '&start=%d' % nStart
+
 		return sURL
 
 
 
 def usage():
-	print '-t', '--title', 'paper title'
-	print '-y', '--year', 'when paper was published'
+	print('-t', '--title', 'paper title')
+	print('-y', '--year', 'when paper was published')
+	print('-c', '--count', 'number of results, across several pages if needed')
+	print('--store', 'SQLite database to record parsed articles in, for later lookups')
+	print('--record', 'archive file to record all responses in')
+	print('--replay', 'archive file to serve all responses from, instead of the network')
+	print('--parse-processes', 'number of worker processes to parse result pages in')
 
 
 
 def main(argv):
 	try:
-		opts, args = getopt.getopt(argv, 't:y:', ['title==', 'year=='])
+		opts, args = getopt.getopt(argv, 't:y:c:', ['title==', 'year==', 'count=', 'store=', 'record=', 'replay=',
+												'parse-processes='])
 	except getopt.GetoptError:
 		usage()
 		sys.exit(2)
@@ -415,12 +922,22 @@ def main(argv):
 
 	sTitle = None
 	sYear = None
+	nCount = None
 
 	for opt, arg in opts:
 		if opt in ('-t', '--title'):
 			sTitle = arg
 		elif opt in ('-y', '--year'):
 			sYear = arg
+		elif opt in ('-c', '--count'):
+			nCount = arg
+		elif opt == '--store':
+			ScholarConf.STORE_FILE = arg
+		elif opt in ('--record', '--replay'):
+			ScholarConf.ARCHIVE_FILE = arg
+			ScholarConf.ARCHIVE_MODE = opt[2:]
+		elif opt == '--parse-processes':
+			ScholarConf.PARSE_PROCESSES = int(arg)
 		
 
 	if sTitle == None :
@@ -432,6 +949,8 @@ def main(argv):
 
 	query.set_title(sTitle)
 	query.set_year(sYear)
+	if nCount != None:
+		query.set_total_results(nCount)
 
 	querier.send_query(query)
 
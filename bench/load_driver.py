@@ -0,0 +1,181 @@
+#
+# Load driver for the stand-in server in standin_server.py: runs the
+# rankConfCitation.py lookups for the given paper lists at increasing
+# concurrency, and reports papers/sec along with the requests, 429s
+# and failures the server saw at each level. The server gets started
+# on a free port unless --server points at a running one; options
+# after -- go to it.
+#
+# Usage: python bench/load_driver.py [-d DATABASE] [-j LEVELS] [-b N]
+#        [-p PROCESSES] [--rate RPS] [--server HOST:PORT] [LIST ...]
+#        [-- SERVER OPTIONS]
+#
+# For example, to see how batching and the client rate limiter cope
+# with a site that throttles beyond 20 requests/sec:
+#
+#   python bench/load_driver.py -j 1,4,16 -b 5 --rate 50 -- --max-rate 20
+#
+# or, to see how parsing in worker processes scales with cores once
+# the server answers faster than one thread can parse:
+#
+#   python bench/load_driver.py -j 4,16 -p 4 -- --latency 0 --noise 18
+#
+
+from __future__ import print_function
+
+import json
+import optparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+try:
+	# Try importing for Python 3
+	# pylint: disable-msg=F0401
+	# pylint: disable-msg=E0611
+	from urllib.request import build_opener, ProxyHandler
+except ImportError:
+	# Fallback for Python 2
+	from urllib2 import build_opener, ProxyHandler
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, TOP_DIR)
+
+import rankConfCitation
+from scholar_batch import ProcessPool
+from scholar_flight import SingleFlight
+from scholar_ratelimit import RateLimiter
+
+
+class LoadSource(rankConfCitation.Source):
+	"""
+	A rankConfCitation source whose queriers share a rate limiter and
+	request coalescing of their own, so that every concurrency level
+	starts afresh.
+	"""
+	def __init__(self, name, rate, burst):
+		rankConfCitation.Source.__init__(self, name)
+		self.limiter = RateLimiter(rate=rate, burst=burst, max_rate=rate)
+		self.flights = SingleFlight()
+
+	def makeQuerier(self):
+		return self.backend.ScholarQuerier(limiter=self.limiter, flights=self.flights)
+
+
+def free_port():
+	sock = socket.socket()
+	sock.bind(('127.0.0.1', 0))
+	port = sock.getsockname()[1]
+	sock.close()
+	return port
+
+
+def server_stats(address):
+	# The stats must not go through the proxy the lookups use:
+	opener = build_opener(ProxyHandler({}))
+	return json.loads(opener.open('http://%s/stats' % address, timeout=10).read().decode('utf-8'))
+
+
+def wait_for_server(address, timeout=10):
+	deadline = time.time() + timeout
+	while True:
+		try:
+			return server_stats(address)
+		except Exception:
+			if time.time() > deadline:
+				raise
+			time.sleep(0.1)
+
+
+def run_level(options, paperLists, jobs):
+	"""
+	Looks up all papers with the given number of concurrent jobs and
+	returns the number of papers, those left unresolved and the
+	elapsed seconds.
+	"""
+	rankConfCitation.nJobs = jobs
+	rankConfCitation.nPerHost = jobs
+	rankConfCitation.nBatch = options.batch
+
+	source = LoadSource(options.database, options.rate, max(2, jobs))
+	start = time.time()
+	rankConfCitation.batchQuery([source], paperLists)
+	elapsed = time.time() - start
+
+	papers = set()
+	for _, _, paperList in paperLists:
+		papers.update(paperList)
+	return len(papers), source.nUnresolved, elapsed
+
+
+def main():
+	usage = '%prog [options] [LIST ...] [-- SERVER OPTIONS]'
+	parser = optparse.OptionParser(usage=usage)
+	parser.add_option('-d', '--database', default='google',
+					help='Database to look papers up in, google or acm (default google)')
+	parser.add_option('-j', '--jobs', default='1,2,4,8,16',
+					help='Comma-separated concurrency levels (default 1,2,4,8,16)')
+	parser.add_option('-b', '--batch', type='int', default=1,
+					help='Titles per query, see rankConfCitation.py -b (default 1)')
+	parser.add_option('-p', '--parse-processes', type='int', default=0,
+					help='Parse result pages in this many worker processes (default 0, in-thread)')
+	parser.add_option('--rate', type='float', default=1000.0,
+					help='Client-side requests/sec limit per host (default 1000)')
+	parser.add_option('--server', metavar='HOST:PORT', default=None,
+					help='Use a running stand-in server instead of starting one')
+
+	argv = sys.argv[1:]
+	server_args = []
+	if '--' in argv:
+		server_args = argv[argv.index('--') + 1:]
+		argv = argv[:argv.index('--')]
+	options, args = parser.parse_args(argv)
+
+	lists = args or [os.path.join(TOP_DIR, 'PLDI2011.txt'), os.path.join(TOP_DIR, 'PLDI2012.txt')]
+	paperLists = []
+	for fname in lists:
+		with open(fname) as hdl:
+			paperList = [line.strip() for line in hdl if line.strip()]
+		sConf, sYear = rankConfCitation.listVenue(fname)
+		paperLists.append((sConf, sYear, paperList))
+
+	if options.parse_processes > 0:
+		backend = rankConfCitation.SOURCES[options.database][0]
+		__import__(backend).ScholarConf.PARSE_PROCESSES = options.parse_processes
+		ProcessPool.shared(options.parse_processes)
+
+	server = None
+	address = options.server
+	if address is None:
+		address = '127.0.0.1:%d' % free_port()
+		server = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'),
+								'-p', address.split(':')[1]] + server_args)
+	os.environ['http_proxy'] = 'http://%s' % address
+
+	try:
+		wait_for_server(address)
+		print('%6s %7s %9s %10s %9s %6s %7s %11s' \
+			% ('jobs', 'papers', 'seconds', 'papers/s', 'requests', '429s', 'errors', 'unresolved'))
+		for jobs in [int(level) for level in options.jobs.split(',')]:
+			before = server_stats(address)
+			num_papers, unresolved, elapsed = run_level(options, paperLists, jobs)
+			after = server_stats(address)
+
+			def delta(key):
+				return after.get(key, 0) - before.get(key, 0)
+
+			print('%6d %7d %9.2f %10.1f %9d %6d %7d %11d' \
+				% (jobs, num_papers, elapsed, num_papers / elapsed, delta('requests'),
+				delta('throttled'), delta('errors'), unresolved))
+			sys.stdout.flush()
+	finally:
+		if server is not None:
+			server.terminate()
+			server.wait()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
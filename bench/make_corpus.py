@@ -0,0 +1,234 @@
+#
+# Regenerates the stored result pages in bench/corpus from the paper
+# lists in the top-level directory: Scholar gs_r result pages, ACM DL
+# details result pages and the BibTeX citation-export responses the
+# Scholar pages link to. The pages mimic the markup that
+# the parsers in google_scholar.py and acmld.py understand, with
+# deterministic pseudo-random authors, venues and counts, so
+# benchmark runs are comparable across machines and over time.
+#
+# Usage: python bench/make_corpus.py
+#
+# The random module draws differently on Python 2 and 3; the stored
+# corpus was generated with Python 2.
+#
+
+import os
+import random
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_DIR = os.path.dirname(BENCH_DIR)
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+
+SURNAMES = ['Aiken', 'Fisher', 'Rinard', 'Hawkins', 'Lerner', 'Pingali',
+			'Sadayappan', 'Vechev', 'Yahav', 'Sewell', 'Zdancewic', 'Musuvathi',
+			'Grossman', 'Ceze', 'August', 'Sampson', 'Gulwani', 'Solar-Lezama']
+
+EXCERPT_WORDS = ('we present a novel approach to the problem of program analysis '
+				'that scales to large code bases while retaining precision our '
+				'evaluation on real world benchmarks shows significant speedups over '
+				'prior work and demonstrates the practicality of the technique').split()
+
+SCHOLAR_HEAD = '''<!doctype html><html><head><title>Google Scholar</title>
+<meta http-equiv="Content-Type" content="text/html;charset=ISO-8859-1">
+<style>%(style)s</style>
+<script>%(script)s</script>
+</head><body><div id="gs_top"><div id="gs_hdr"><a href="/schhp?hl=en&amp;num=20">Scholar</a>
+<form id="gs_hdr_frm" action="/scholar"><input type="text" name="q" value="%(query)s"></form></div>
+<div id="gs_ab"><div id="gs_ab_md">About %(total)s results (0.%(ms)02d sec)</div></div>
+<div id="gs_bdy"><div id="gs_lnv">%(nav)s</div><div id="gs_ccl">'''
+
+SCHOLAR_TAIL = '''</div><div id="gs_n"><center><table><tr><td><b>1</b></td><td><a href="/scholar?start=20&amp;q=%(query)s&amp;hl=en&amp;num=20&amp;as_sdt=0,5">Next</a></td></tr></table></center></div></div></div></body></html>'''
+
+SCHOLAR_RESULT = ('<div class="gs_r">%(pdf)s<div class="gs_ri"><h3 class="gs_rt">%(title)s</h3>'
+	'<div class="gs_a">%(authors)s - %(venue)s, %(year)d - %(host)s</div>'
+	'<div class="gs_rs">%(excerpt)s</div>'
+	'<div class="gs_fl">%(cited_by)s'
+	'<a href="/scholar?q=related:%(info)s:scholar.google.com/&amp;hl=en&amp;num=20&amp;as_sdt=0,5">Related articles</a> '
+	'<a href="/scholar?cluster=%(cluster)d&amp;hl=en&amp;num=20&amp;as_sdt=0,5">All %(versions)d versions</a> '
+	'<a href="/scholar.bib?q=info:%(info)s:scholar.google.com/&amp;output=citation&amp;hl=en&amp;num=20&amp;as_sdt=0,5&amp;ct=citation&amp;cd=%(idx)d">Import into BibTeX</a> '
+	'<a href="#" class="gs_nph" onclick="return gs_ocit(event,\'%(info)s\',\'%(idx)d\')">Cite</a></div></div></div>')
+
+# Scholar shows no "Cited by" link for papers without citations:
+SCHOLAR_CITED_BY = '<a href="/scholar?cites=%(cluster)d&amp;as_sdt=2005&amp;sciodt=0,5&amp;hl=en&amp;num=20">Cited by %(cites)d</a> '
+
+SCHOLAR_PDF = ('<div class="gs_ggs gs_fl"><div class="gs_md_wp gs_ttss" id="gs_ggsW%(idx)d">'
+	'<a href="http://www.%(host)s/~%(user)s/papers/%(slug)s.pdf"><span class="gs_ctg2">[PDF]</span> from %(host)s</a></div></div>')
+
+ACM_HEAD = '''<!DOCTYPE html><html><head><title>ACM Digital Library</title>
+<link rel="stylesheet" href="css/dl.css"><script>%(script)s</script></head>
+<body><div id="header"><a href="/">ACM DL</a></div><div id="results">
+<div id="resfound">Found <strong>%(total)d</strong> within Title: (%(query)s)</div>
+'''
+
+ACM_TAIL = '''</div><div id="footer">Powered by The ACM Guide to Computing Literature</div></body></html>'''
+
+ACM_RESULT = '''<div class="details">
+<div class="title"><a href="citation.cfm?id=%(id)d&amp;CFID=%(cfid)d&amp;CFTOKEN=%(cftoken)d" target="_self" class="medium-text">%(title)s</a></div>
+<div class="authors">%(authors)s</div>
+<div class="source"><span class="publicationDate">%(date)s</span> <span style="padding-left:10px">%(venue)s</span></div>
+<div class="publisher">Publisher: ACM New York, NY, USA</div>
+<div class="metrics"><div class="metricsCol1"><span class="downloadAll">Downloads (6 Weeks): %(d6)d, Downloads (12 Months): %(d12)d</span></div><div class="metricsCol2"><div><span class="citedCount">Citation Count: %(cites)d</span></div></div></div>
+<div class="ft"><a href="ft_gateway.cfm?id=%(id)d&amp;ftid=%(ftid)d&amp;dwn=1" target="_blank">PDF</a></div>
+<div class="abstract">%(abstract)s</div>
+<div class="kw"><strong>Keywords</strong>: %(keywords)s</div>
+</div>
+'''
+
+BIBTEX = '''@inproceedings{%(key)s,
+  title={%(title)s},
+  author={%(authors)s},
+  booktitle={%(venue)s},
+  pages={%(first)d--%(last)d},
+  year={%(year)d},
+  organization={ACM}
+}
+'''
+
+
+def read_titles(fname):
+	with open(os.path.join(TOP_DIR, fname)) as hdl:
+		return [line.strip() for line in hdl if line.strip()]
+
+
+def authors(rnd):
+	names = []
+	for _ in range(rnd.randint(1, 5)):
+		names.append('%s %s' % (chr(ord('A') + rnd.randint(0, 25)), rnd.choice(SURNAMES)))
+	return ', '.join(names)
+
+
+def excerpt(rnd):
+	words = [rnd.choice(EXCERPT_WORDS) for _ in range(rnd.randint(25, 45))]
+	# Scholar highlights query terms in excerpts:
+	words[3] = '<b>' + words[3] + '</b>'
+	return ' '.join(words) + ' ...'
+
+
+def scholar_page(rnd, titles, query, exports=None, total=None, clusters=None, cites=None):
+	results = []
+	for idx, title in enumerate(titles):
+		args = {'idx': idx,
+				'authors': authors(rnd),
+				'venue': rnd.choice(['ACM SIGPLAN Notices', 'PLDI', 'Proceedings of the 32nd ACM SIGPLAN conference']),
+				'year': rnd.choice([2011, 2011, 2012, 2010]),
+				'host': rnd.choice(['dl.acm.org', 'cs.example.edu', 'research.example.com']),
+				'excerpt': excerpt(rnd),
+				'cluster': rnd.randint(10**18, 10**19 - 1),
+				'cites': rnd.randint(0, 400),
+				'versions': rnd.randint(1, 25),
+				'info': '%012x' % rnd.randint(0, 16**12 - 1),
+				'user': rnd.choice(SURNAMES).lower(),
+				'slug': '-'.join(title.lower().split()[:3]).replace(':', '')}
+		# Given cluster IDs and citation counts override the random
+		# ones, which still get drawn, to keep the stored corpus as it
+		# was:
+		if clusters is not None:
+			args['cluster'] = clusters[idx]
+		if cites is not None:
+			args['cites'] = cites[idx]
+
+		if idx % 7 == 5:
+			# A [CITATION] entry, without link:
+			args['title'] = ('<span class="gs_ctu"><span class="gs_ct1">[CITATION]</span>'
+							'<span class="gs_ct2">[C]</span></span> %s' % title)
+		else:
+			args['title'] = '<a href="http://dl.acm.org/citation.cfm?id=%d">%s</a>' \
+				% (1993000 + rnd.randint(0, 999), title)
+		args['pdf'] = SCHOLAR_PDF % args if idx % 2 == 0 else ''
+		args['cited_by'] = SCHOLAR_CITED_BY % args if args['cites'] > 0 else ''
+		results.append(SCHOLAR_RESULT % args)
+
+		if exports is not None:
+			surname = args['authors'].split(',')[0].split()[-1].lower()
+			exports[args['info']] = BIBTEX % {'key': '%s%d%s' % (surname, args['year'], title.split()[0].lower()),
+												'title': title,
+												'authors': args['authors'].replace(', ', ' and '),
+												'venue': args['venue'],
+												'first': idx * 10 + 1,
+												'last': idx * 10 + 10,
+												'year': args['year']}
+
+	# The random total is drawn regardless, to keep the stored corpus
+	# as it was:
+	drawn = rnd.randint(20, 5000)
+	if total is None:
+		total = drawn
+	head = SCHOLAR_HEAD % {'style': '#gs_top{position:relative}' * 400,
+							'script': 'var gs_ie=0;function gs_ocit(e,i,c){return false}' * 60,
+							'query': query,
+							'total': '{:,}'.format(total),
+							'ms': rnd.randint(1, 99),
+							'nav': '<a href="/scholar?as_ylo=2014">Since 2014</a>' * 20}
+	return head + ''.join(results) + SCHOLAR_TAIL % {'query': query}
+
+
+def acm_page(rnd, titles, query, total=None):
+	results = []
+	for title in titles:
+		names = [name.split()[-1] for name in authors(rnd).split(', ')]
+		year = rnd.choice([2011, 2012])
+		args = {'id': 1993000 + rnd.randint(0, 999),
+				'cfid': rnd.randint(10**8, 10**9),
+				'cftoken': rnd.randint(10**7, 10**8),
+				'title': title,
+				'authors': ', '.join(['<a href="author_page.cfm?id=%d">%s</a>' \
+									% (rnd.randint(10**9, 10**10), name) for name in names]),
+				'date': rnd.choice(['June %d', 'January %d']) % year,
+				'venue': "PLDI '%02d Proceedings of the ACM SIGPLAN conference on Programming language design and implementation" % (year % 100),
+				'd6': rnd.randint(0, 50),
+				'd12': rnd.randint(50, 900),
+				'cites': rnd.randint(0, 120),
+				'ftid': rnd.randint(10**5, 10**6),
+				'abstract': excerpt(rnd),
+				'keywords': ', '.join(rnd.sample(EXCERPT_WORDS, 4))}
+		results.append(ACM_RESULT % args)
+
+	head = ACM_HEAD % {'script': 'var cfid=0;function dlClick(e){return true}' * 80,
+						'query': query,
+						'total': len(titles) if total is None else total}
+	return head + ''.join(results) + ACM_TAIL
+
+
+def write(subdir, fname, data):
+	dname = os.path.join(CORPUS_DIR, subdir)
+	if not os.path.isdir(dname):
+		os.makedirs(dname)
+	with open(os.path.join(dname, fname), 'w') as hdl:
+		hdl.write(data)
+
+
+def main():
+	rnd = random.Random(2014)
+	exports = {}
+
+	for listname in ['PLDI2011', 'PLDI2012']:
+		titles = read_titles(listname + '.txt')
+		for page in range(2):
+			chunk = titles[page*20:(page+1)*20]
+			write('scholar', '%s_p%d.html' % (listname.lower(), page + 1),
+				scholar_page(rnd, chunk, 'pldi', exports))
+		# A single-title lookup, as rankConfCitation does it:
+		write('scholar', '%s_title.html' % listname.lower(),
+			scholar_page(rnd, titles[:1], titles[0].replace(' ', '+'), exports))
+
+	# The ACM pages are drawn separately, so that adding them did not
+	# change the Scholar pages above.
+	rnd = random.Random(2015)
+	for listname in ['PLDI2011', 'PLDI2012']:
+		titles = read_titles(listname + '.txt')
+		for page in range(2):
+			chunk = titles[page*20:(page+1)*20]
+			write('acm', '%s_p%d.html' % (listname.lower(), page + 1),
+				acm_page(rnd, chunk, 'pldi'))
+		write('acm', '%s_title.html' % listname.lower(),
+			acm_page(rnd, titles[:1], titles[0]))
+
+	for info, data in exports.items():
+		write('citation', info + '.bib', data)
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,157 @@
+#
+# Before/after benchmark for ScholarArticleParser120726._parse_article,
+# run over the stored Scholar result pages in bench/corpus/scholar.
+#
+# Usage: python bench/parser_bench.py [-n ROUNDS]
+#
+
+import glob
+import optparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from google_scholar import BeautifulSoup, ScholarArticle, ScholarArticleParser, \
+	ScholarArticleParser120726
+
+
+class LegacyParser120726(ScholarArticleParser120726):
+	"""
+	The _parse_article implementation as it was before the single-pass
+	rewrite, kept for comparison. It serializes every child tag in
+	search of ".pdf" and looks up each result-info div twice.
+	"""
+	def _parse_article(self, div):
+		self.article = ScholarArticle()
+
+		for tag in div:
+			if not hasattr(tag, 'name') or tag.name is None:
+				continue
+			if str(tag).lower().find('.pdf'):
+				if tag.find('div', {'class': 'gs_ttss'}):
+					self._parse_links(tag.find('div', {'class': 'gs_ttss'}))
+
+			if tag.name == 'div' and self._tag_has_class(tag, 'gs_ri'):
+				try:
+					atag = tag.h3.a
+					self.article['title'] = ''.join(atag.findAll(text=True))
+					self.article['url'] = self._path2url(atag['href'])
+					if self.article['url'].endswith('.pdf'):
+						self.article['url_pdf'] = self.article['url']
+				except:
+					for span in tag.h3.findAll(name='span'):
+						span.clear()
+					self.article['title'] = ''.join(tag.h3.findAll(text=True))
+
+				if tag.find('div', {'class': 'gs_a'}):
+					year = self.year_re.findall(tag.find('div', {'class': 'gs_a'}).text)
+					self.article['year'] = year[0] if len(year) > 0 else None
+
+				if tag.find('div', {'class': 'gs_fl'}):
+					self._parse_links(tag.find('div', {'class': 'gs_fl'}))
+
+				if tag.find('div', {'class': 'gs_rs'}):
+					raw_text = tag.find('div', {'class': 'gs_rs'}).findAll(text=True)
+					if len(raw_text) > 0:
+						raw_text = ''.join(raw_text)
+						raw_text = raw_text.replace('\n', '')
+						self.article['excerpt'] = raw_text
+
+
+class Collector(object):
+	"""Parser mixin collecting the articles it sees."""
+	def __init__(self):
+		self.articles = []
+
+	def handle_article(self, art):
+		self.articles.append(art)
+
+
+class LegacyCollector(Collector, LegacyParser120726):
+	def __init__(self):
+		Collector.__init__(self)
+		LegacyParser120726.__init__(self)
+
+
+class CurrentCollector(Collector, ScholarArticleParser120726):
+	def __init__(self):
+		Collector.__init__(self)
+		ScholarArticleParser120726.__init__(self)
+
+
+def run(parser_class, pages, rounds):
+	"""
+	Parses all pages rounds times and returns the best per-round time
+	along with the articles found in the last round.
+	"""
+	best = None
+	for _ in range(rounds):
+		articles = []
+		start = time.time()
+		for html in pages:
+			parser = parser_class()
+			parser.parse(html)
+			articles.extend(parser.articles)
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best, articles
+
+
+def run_walk(parser_class, soups, rounds):
+	"""
+	Like run(), but only times the per-article extraction, on pages
+	that BeautifulSoup has already parsed.
+	"""
+	best = None
+	divs = []
+	for soup in soups:
+		divs.extend(soup.findAll(ScholarArticleParser._tag_results_checker))
+	for _ in range(rounds):
+		parser = parser_class()
+		start = time.time()
+		for div in divs:
+			parser._parse_article(div)
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+
+def main():
+	parser = optparse.OptionParser(usage='%prog [-n ROUNDS]')
+	parser.add_option('-n', '--rounds', type='int', default=5,
+						help='Number of timed rounds, best one is reported')
+	options, _ = parser.parse_args()
+
+	pages = []
+	for fname in sorted(glob.glob(os.path.join(BENCH_DIR, 'corpus', 'scholar', '*.html'))):
+		with open(fname, 'rb') as hdl:
+			pages.append(hdl.read())
+
+	before, old_articles = run(LegacyCollector, pages, options.rounds)
+	after, new_articles = run(CurrentCollector, pages, options.rounds)
+
+	soups = [BeautifulSoup(html) for html in pages]
+	walk_before = run_walk(LegacyCollector, soups, options.rounds)
+	walk_after = run_walk(CurrentCollector, soups, options.rounds)
+
+	if [art.as_csv() for art in old_articles] != [art.as_csv() for art in new_articles]:
+		print('MISMATCH: rewritten parser produces different articles')
+		return 1
+
+	print('%d pages, %d articles, best of %d rounds' \
+		% (len(pages), len(new_articles), options.rounds))
+	print('full parse    before: %8.1f ms  (%.1f pages/sec)' % (before * 1000, len(pages) / before))
+	print('              after:  %8.1f ms  (%.1f pages/sec)  speedup %.2fx' \
+		% (after * 1000, len(pages) / after, before / after))
+	print('article walk  before: %8.1f ms' % (walk_before * 1000))
+	print('              after:  %8.1f ms  speedup %.2fx' \
+		% (walk_after * 1000, walk_before / walk_after))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
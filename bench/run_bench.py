@@ -0,0 +1,309 @@
+#
+# Offline benchmark suite for google_scholar.py, acmld.py and the
+# filtering in rankConfCitation.py. Everything runs against the stored
+# pages in bench/corpus (see make_corpus.py), so no request goes out
+# to the live sites.
+#
+# Usage: python bench/run_bench.py [-n ROUNDS] [-b NAME] [--json FILE]
+#
+# For each benchmark, the best of ROUNDS timed runs is reported as
+# pages/sec and articles/sec, along with the peak memory allocated
+# during one extra run. On Python 3 the peak comes from tracemalloc and
+# is specific to the benchmark; Python 2 lacks tracemalloc, so there
+# we report the process-wide maximum resident set size instead. With
+# --json, the results also get written as a JSON document, for
+# tracking regressions across commits.
+#
+
+import glob
+import json
+import optparse
+import os
+import platform
+import re
+import sys
+import time
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import acmld
+import google_scholar
+import rankConfCitation
+import scholar_match
+
+
+def load_pages(subdir):
+	"""Returns a list of (name, content) pairs for a corpus directory."""
+	pages = []
+	for fname in sorted(glob.glob(os.path.join(CORPUS_DIR, subdir, '*'))):
+		with open(fname, 'rb') as hdl:
+			pages.append((os.path.basename(fname), hdl.read()))
+	return pages
+
+
+class CorpusQuery(object):
+	"""A single-page query whose URL points at a stored corpus page."""
+	def __init__(self, subdir, name):
+		self.url = 'corpus:%s/%s' % (subdir, name)
+		self.attrs = {}
+		self.total_results = None
+
+	def get_url(self, page=0):
+		return self.url
+
+	def get_num_pages(self):
+		return 1
+
+	def has_page(self, page):
+		return page == 0
+
+	def __setitem__(self, key, item):
+		self.attrs[key] = item
+
+
+class GoogleCorpusQuerier(google_scholar.ScholarQuerier):
+	"""
+	A Scholar querier answering requests from the corpus: query URLs
+	map to result pages, citation-export links to the stored BibTeX.
+	"""
+	INFO_RE = re.compile(r'info:([0-9a-f]+):')
+
+	def __init__(self, pages, exports):
+		google_scholar.ScholarQuerier.__init__(self)
+		self.pages = pages
+		self.exports = exports
+
+	def _get_http_response(self, url, log_msg=None, err_msg=None, cacheable=True):
+		if url.startswith('corpus:'):
+			return self.pages[url.split('/', 1)[1]]
+		match = self.INFO_RE.search(url)
+		if match is None:
+			return None
+		return self.exports.get(match.group(1) + '.bib')
+
+
+class ACMCorpusQuerier(acmld.ScholarQuerier):
+	"""An ACM querier answering requests from the corpus."""
+	def __init__(self, pages):
+		acmld.ScholarQuerier.__init__(self)
+		self.pages = pages
+
+	def _get_http_response(self, url, log_msg=None, err_msg=None, cacheable=True):
+		return self.pages[url.split('/', 1)[1]]
+
+
+class Collector(object):
+	"""Parser mixin collecting the articles it sees."""
+	def __init__(self):
+		self.articles = []
+
+	def handle_article(self, art):
+		self.articles.append(art)
+
+
+class GoogleCollector(Collector, google_scholar.ScholarArticleParser120726):
+	def __init__(self):
+		Collector.__init__(self)
+		google_scholar.ScholarArticleParser120726.__init__(self)
+
+
+class ACMCollector(Collector, acmld.ScholarArticleParser):
+	def __init__(self):
+		Collector.__init__(self)
+		acmld.ScholarArticleParser.__init__(self)
+
+
+class Suite(object):
+	"""
+	The benchmarks. Each bench_* method does one pass over its share
+	of the corpus and returns a (pages, articles) tuple of what it
+	processed.
+	"""
+	def __init__(self):
+		self.scholar_pages = load_pages('scholar')
+		self.acm_pages = load_pages('acm')
+		self.exports = dict(load_pages('citation'))
+
+		# Pre-parsed articles for the formatting and filtering runs:
+		self.scholar_articles = self._parse_all(GoogleCollector, self.scholar_pages)
+		self.acm_articles = self._parse_all(ACMCollector, self.acm_pages)
+
+		# For the filtering run, the titles looked up on each ACM page:
+		self.acm_titles = []
+		for name, html in self.acm_pages:
+			titles = [art['title'] for art in self._parse_all(ACMCollector, [(name, html)])]
+			self.acm_titles.append(titles)
+
+	@staticmethod
+	def _parse_all(parser_class, pages):
+		articles = []
+		for _, html in pages:
+			parser = parser_class()
+			parser.parse(html)
+			articles.extend(parser.articles)
+		return articles
+
+	def names(self):
+		return sorted([name[6:] for name in dir(self) if name.startswith('bench_')])
+
+	def bench_scholar_parse(self):
+		articles = self._parse_all(GoogleCollector, self.scholar_pages)
+		return len(self.scholar_pages), len(articles)
+
+	def bench_acm_parse(self):
+		articles = self._parse_all(ACMCollector, self.acm_pages)
+		return len(self.acm_pages), len(articles)
+
+	def bench_scholar_querier(self):
+		# End to end through ScholarQuerier, including one
+		# citation-export fetch per article.
+		querier = GoogleCorpusQuerier(dict(self.scholar_pages), self.exports)
+		articles = 0
+		for name, _ in self.scholar_pages:
+			querier.send_query(CorpusQuery('scholar', name))
+			articles += len(querier.articles)
+		return len(self.scholar_pages), articles
+
+	def bench_acm_querier(self):
+		querier = ACMCorpusQuerier(dict(self.acm_pages))
+		articles = 0
+		for name, _ in self.acm_pages:
+			querier.send_query(CorpusQuery('acm', name))
+			articles += len(querier.articles)
+		return len(self.acm_pages), articles
+
+	def bench_as_txt(self):
+		for art in self.scholar_articles:
+			art.as_txt()
+		for art in self.acm_articles:
+			art.as_txt()
+		return 0, len(self.scholar_articles) + len(self.acm_articles)
+
+	def bench_as_csv(self):
+		for art in self.scholar_articles:
+			art.as_csv()
+		return 0, len(self.scholar_articles)
+
+	def bench_rank_filters(self):
+		# What queryACMCitation does per title, with each page standing
+		# in for the results of all its titles' lookups.
+		start = 0
+		for titles in self.acm_titles:
+			articles = self.acm_articles[start:start + len(titles)]
+			start += len(titles)
+			for title in titles:
+				arts = rankConfCitation.filterByYear(articles, '2011')
+				arts = rankConfCitation.filterByConference(arts, 'PLDI')
+				rankConfCitation.filterByTitle(arts, title)
+		return len(self.acm_titles), len(self.acm_articles)
+
+	def bench_title_match(self):
+		# The same, through the title matcher that replaced the filters.
+		start = 0
+		for titles in self.acm_titles:
+			articles = self.acm_articles[start:start + len(titles)]
+			start += len(titles)
+			for title in titles:
+				matcher = scholar_match.TitleMatcher(year='2011', venue='PLDI')
+				matcher.add_all(articles).match(title)
+		return len(self.acm_titles), len(self.acm_articles)
+
+
+def measure(func, rounds):
+	"""
+	Runs func rounds times and returns a result dictionary with the
+	best time, throughput and peak memory.
+	"""
+	best = None
+	for _ in range(rounds):
+		start = time.time()
+		pages, articles = func()
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	best = max(best, 1e-9)
+
+	if tracemalloc is not None:
+		tracemalloc.start()
+		func()
+		peak = tracemalloc.get_traced_memory()[1] // 1024
+		tracemalloc.stop()
+		peak_kind = 'tracemalloc'
+	elif resource is not None:
+		func()
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		peak_kind = 'maxrss'
+	else:
+		peak, peak_kind = None, None
+
+	return {'seconds': best,
+			'pages': pages,
+			'articles': articles,
+			'pages_per_sec': pages / best,
+			'articles_per_sec': articles / best,
+			'peak_kb': peak,
+			'peak_kind': peak_kind}
+
+
+def main():
+	parser = optparse.OptionParser(usage='%prog [-n ROUNDS] [-b NAME] [--json FILE]')
+	parser.add_option('-n', '--rounds', type='int', default=5,
+						help='Number of timed rounds, best one is reported')
+	parser.add_option('-b', '--bench', metavar='NAME', action='append', default=None,
+						help='Run only this benchmark; may be repeated')
+	parser.add_option('-l', '--list', action='store_true', default=False,
+						help='List benchmarks and exit')
+	parser.add_option('--json', metavar='FILE', default=None,
+						help='Also write results as JSON to FILE ("-" for stdout)')
+	options, _ = parser.parse_args()
+
+	suite = Suite()
+	if options.list:
+		print('\n'.join(suite.names()))
+		return 0
+
+	names = options.bench or suite.names()
+	for name in names:
+		if name not in suite.names():
+			print('unknown benchmark "%s"' % name)
+			return 1
+
+	results = []
+	for name in names:
+		res = measure(getattr(suite, 'bench_' + name), options.rounds)
+		res['name'] = name
+		results.append(res)
+		if options.json != '-':
+			print('%-18s %9.2f ms %10.1f pages/s %11.1f articles/s %10s KB peak' \
+				% (name, res['seconds'] * 1000, res['pages_per_sec'],
+					res['articles_per_sec'], res['peak_kb']))
+
+	if options.json:
+		doc = {'format': 1,
+				'timestamp': int(time.time()),
+				'python': platform.python_version(),
+				'bs4': getattr(sys.modules.get('bs4'), '__version__', None),
+				'rounds': options.rounds,
+				'results': results}
+		if options.json == '-':
+			print(json.dumps(doc, indent=1, sort_keys=True))
+		else:
+			with open(options.json, 'w') as hdl:
+				json.dump(doc, hdl, indent=1, sort_keys=True)
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,356 @@
+#
+# Local stand-in for Google Scholar and the ACM DL, for load and
+# concurrency testing of google_scholar.py, acmld.py and
+# rankConfCitation.py without touching the live sites. The server acts
+# as an HTTP proxy, so clients reach it through
+# http_proxy=http://127.0.0.1:PORT with the sites' real URLs, and
+# answers with synthetic pages in the markup of make_corpus.py:
+#
+#   /scholar?...            searches (SearchScholarQuery), including
+#                           title searches and OR-batched phrases,
+#                           cluster lookups (ClusterScholarQuery), which
+#                           find papers searched for by title before,
+#                           and citing papers (CitesScholarQuery)
+#   /scholar_settings?...   the settings form, with its scisig token
+#   /scholar_setprefs?...   settings submission
+#   /scholar.bib?...        BibTeX exports linked from result pages
+#   /results.cfm?...        ACM DL title searches (acmld)
+#   /stats                  request counters, as JSON
+#
+# Pages are deterministic per URL. Title searches answer with the
+# searched title plus --noise unrelated hits; other searches page
+# through --total synthetic results. Citing papers come from a
+# made-up citation graph among --papers papers, each cited by up to
+# --citing others. Latency, failure rate,
+# throttling (429 with Retry-After beyond --max-rate requests/sec)
+# and page size are configurable.
+#
+# Usage: python bench/standin_server.py [-p PORT] [--latency SECONDS]
+#        [--jitter FRACTION] [--error-rate P] [--miss-rate P]
+#        [--max-rate RPS] [--page-size N] [--noise N] [--total N]
+#        [--citing N] [--papers N]
+#
+
+import json
+import optparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+
+try:
+	# Try importing for Python 3
+	# pylint: disable-msg=F0401
+	# pylint: disable-msg=E0611
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+	from urllib.parse import urlsplit, parse_qs, unquote
+except ImportError:
+	# Fallback for Python 2
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+	from urlparse import urlsplit, parse_qs
+	from urllib import unquote
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import make_corpus
+
+TITLE_WORDS = ('adaptive static analysis concurrent program repair memory model '
+				'type inference garbage collection compiler verified synthesis loop '
+				'fusion symbolic execution race detection incremental parallel '
+				'scheduling heap shape abstraction').split()
+
+# Cluster IDs of the papers in the made-up citation graph start here:
+CLUSTER_BASE = 10**18
+
+SETTINGS_PAGE = '''<html><body><form id="gs_settings_form" action="/scholar_setprefs">
+<input type="hidden" name="scisig" value="AAGBfm0AAAAAstandin">
+<input type="hidden" name="inststart" value="0"></form></body></html>'''
+
+
+class StandinState(object):
+	"""
+	Configuration and counters of the server, shared by its handler
+	threads.
+	"""
+	def __init__(self, options):
+		self.options = options
+		self.lock = threading.Lock()
+		self.counts = {}
+		self.exports = {} # info token -> BibTeX, for pages served
+		self.titles = {} # cluster ID -> title, for papers searched for
+		self.tokens = float(options.burst)
+		self.stamp = time.time()
+
+	def count(self, key, amount=1):
+		with self.lock:
+			self.counts[key] = self.counts.get(key, 0) + amount
+
+	def admit(self):
+		"""
+		Token-bucket admission control for --max-rate; returns True if
+		the request may proceed.
+		"""
+		if not self.options.max_rate:
+			return True
+		with self.lock:
+			now = time.time()
+			self.tokens = min(self.options.burst,
+							self.tokens + (now - self.stamp) * self.options.max_rate)
+			self.stamp = now
+			if self.tokens < 1:
+				return False
+			self.tokens -= 1
+			return True
+
+	def add_exports(self, exports):
+		with self.lock:
+			if len(self.exports) > 100000:
+				self.exports.clear()
+			self.exports.update(exports)
+
+	def add_titles(self, titles):
+		with self.lock:
+			if len(self.titles) > 100000:
+				self.titles.clear()
+			self.titles.update(titles)
+
+	def stats(self):
+		with self.lock:
+			return dict(self.counts)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		state = self.server.state
+		options = state.options
+		parts = urlsplit(self.path)
+		args = parse_qs(parts.query, keep_blank_values=True)
+
+		if parts.path == '/stats':
+			return self._send(200, json.dumps(state.stats(), sort_keys=True), 'application/json')
+
+		state.count('requests')
+		rnd = random.Random(zlib.crc32(self.path.encode('utf-8')))
+
+		if options.latency:
+			time.sleep(options.latency * (1 + options.jitter * (2 * random.random() - 1)))
+
+		if not state.admit():
+			state.count('throttled')
+			return self._send(429, 'Too many requests', extra={'Retry-After': '1'})
+		if random.random() < options.error_rate:
+			state.count('errors')
+			return self._send(500, 'Internal error')
+
+		if parts.path == '/results.cfm':
+			state.count('acm')
+			return self._send(200, self._acm_page(rnd, args))
+		if parts.path == '/scholar_settings':
+			state.count('settings')
+			return self._send(200, SETTINGS_PAGE)
+		if parts.path == '/scholar_setprefs':
+			state.count('settings')
+			return self._send(200, '<html><body>Settings saved</body></html>')
+		if parts.path == '/scholar.bib':
+			state.count('bib')
+			info = re.search(r'info:([0-9a-f]+):', args.get('q', [''])[0])
+			data = state.exports.get(info.group(1)) if info else None
+			if data is None:
+				return self._send(404, 'Not found')
+			return self._send(200, data, 'text/plain')
+		if parts.path == '/scholar':
+			state.count('scholar')
+			return self._send(200, self._scholar_page(rnd, args))
+
+		state.count('not_found')
+		return self._send(404, 'Not found')
+
+	def _scholar_page(self, rnd, args):
+		options = self.server.state.options
+		num = min(options.page_size, int(args.get('num', ['20'])[0] or 20))
+		start = int(args.get('start', ['0'])[0] or 0)
+
+		if args.get('cites', [''])[0]:
+			citing = citing_clusters(args['cites'][0], options)
+			clusters = citing[start:start + num]
+			exports = {}
+			page = make_corpus.scholar_page(rnd, [synthetic_title(cluster) for cluster in clusters],
+											'query', exports, total=len(citing), clusters=clusters,
+											cites=[len(citing_clusters(cluster, options)) for cluster in clusters])
+			self.server.state.add_exports(exports)
+			return page
+
+		clusters = None
+		if args.get('cluster', [''])[0]:
+			cluster = int(args['cluster'][0])
+			titles = [self.server.state.titles.get(cluster, 'Paper of cluster %d' % cluster)]
+			clusters = [cluster]
+			total = 1
+		else:
+			wanted = self._wanted_titles(rnd, args)
+			if wanted is None:
+				total = options.total
+				titles = [synthetic_title(idx) for idx in range(start, min(total, start + num))]
+			else:
+				# The papers searched for by title keep their cluster ID
+				# and citation count, and cluster lookups find them:
+				self.server.state.add_titles(dict([(title_cluster(title), title) for title in wanted]))
+				titles = wanted + [synthetic_title(rnd.randint(0, 10**6)) for _ in range(options.noise)]
+				total = len(titles)
+				titles = titles[start:start + num]
+				clusters = [title_cluster(title) for title in titles]
+
+		cites = None
+		if clusters is not None:
+			cites = [paper_cites(cluster) for cluster in clusters]
+
+		exports = {}
+		page = make_corpus.scholar_page(rnd, titles, 'query', exports, total=total,
+										clusters=clusters, cites=cites)
+		self.server.state.add_exports(exports)
+		return page
+
+	def _wanted_titles(self, rnd, args):
+		"""
+		Returns the titles a title search asks for, minus those
+		--miss-rate makes the site not know, or None for other searches.
+		"""
+		some = args.get('as_oq', [''])[0]
+		if some:
+			titles = re.findall(r'"([^"]+)"', some) or [some]
+		elif args.get('as_epq', [''])[0]:
+			titles = [args['as_epq'][0]]
+		elif args.get('as_occt', [''])[0] == 'title' and args.get('as_q', [''])[0]:
+			titles = [args['as_q'][0]]
+		else:
+			return None
+		return self._known(rnd, titles)
+
+	def _acm_page(self, rnd, args):
+		options = self.server.state.options
+		query = unquote(args.get('query', [''])[0])
+		match = re.search(r'acmdlTitle:\((.*)\)', query)
+		terms = match.group(1) if match else ''
+		titles = re.findall(r'"([^"]+)"', terms)
+		if len(titles) == 0:
+			titles = [' '.join([word.lstrip('+') for word in terms.split()])]
+
+		titles = self._known(rnd, titles)
+		titles += [synthetic_title(rnd.randint(0, 10**6)) for _ in range(options.noise)]
+		start = int(args.get('start', ['0'])[0] or 0)
+		return make_corpus.acm_page(rnd, titles[start:start + options.page_size], 'query',
+									total=len(titles))
+
+	def _known(self, rnd, titles):
+		miss_rate = self.server.state.options.miss_rate
+		return [title for title in titles if rnd.random() >= miss_rate]
+
+	def _send(self, code, body, ctype='text/html', extra=None):
+		if not isinstance(body, bytes):
+			body = body.encode('utf-8')
+		self.server.state.count('bytes', len(body))
+
+		gzipped = 'gzip' in (self.headers.get('Accept-Encoding') or '')
+		if gzipped:
+			compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+			body = compressor.compress(body) + compressor.flush()
+
+		self.send_response(code)
+		self.send_header('Content-Type', ctype)
+		self.send_header('Content-Length', str(len(body)))
+		if gzipped:
+			self.send_header('Content-Encoding', 'gzip')
+		for key, val in (extra or {}).items():
+			self.send_header(key, val)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, fmt, *args):
+		pass
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+	request_queue_size = 128
+
+	def __init__(self, address, options):
+		HTTPServer.__init__(self, address, StandinHandler)
+		self.state = StandinState(options)
+
+
+def synthetic_title(idx):
+	"""Returns a deterministic made-up paper title for the index."""
+	rnd = random.Random(idx)
+	words = [rnd.choice(TITLE_WORDS) for _ in range(rnd.randint(3, 7))]
+	return ' '.join(words).capitalize()
+
+
+def title_cluster(title):
+	"""Returns the made-up cluster ID of the paper of the given title."""
+	return 2 * CLUSTER_BASE + zlib.crc32(title.lower().encode('utf-8')) % 10**9
+
+
+def paper_cites(cluster):
+	"""Returns the made-up citation count of the given cluster."""
+	return random.Random(cluster).randint(0, 400)
+
+
+def citing_clusters(cluster, options):
+	"""
+	Returns the cluster IDs of the papers citing the given one in the
+	made-up citation graph: up to --citing of the --papers papers.
+	"""
+	rnd = random.Random(zlib.crc32(('%s' % cluster).encode('utf-8')))
+	count = rnd.randint(0, options.citing)
+	return sorted(set([CLUSTER_BASE + rnd.randint(0, options.papers - 1) for _ in range(count)]))
+
+
+def make_option_parser():
+	parser = optparse.OptionParser(usage='%prog [options]')
+	parser.add_option('-p', '--port', type='int', default=8780,
+					help='Port to listen on (default 8780)')
+	parser.add_option('--latency', type='float', default=0.1,
+					help='Seconds each response takes (default 0.1)')
+	parser.add_option('--jitter', type='float', default=0.5,
+					help='Latency varies by up to this fraction either way (default 0.5)')
+	parser.add_option('--error-rate', type='float', default=0.0,
+					help='Fraction of requests failing with HTTP 500 (default 0)')
+	parser.add_option('--miss-rate', type='float', default=0.0,
+					help='Fraction of searched titles the site does not know (default 0)')
+	parser.add_option('--max-rate', type='float', default=0.0,
+					help='Requests/sec beyond which requests get a 429 (default unlimited)')
+	parser.add_option('--burst', type='int', default=5,
+					help='Requests allowed at once before --max-rate applies (default 5)')
+	parser.add_option('--page-size', type='int', default=20,
+					help='Maximum results per page (default 20)')
+	parser.add_option('--noise', type='int', default=2,
+					help='Unrelated hits added to each title search (default 2)')
+	parser.add_option('--total', type='int', default=1000,
+					help='Number of results of non-title searches (default 1000)')
+	parser.add_option('--citing', type='int', default=30,
+					help='Maximum number of papers citing any paper (default 30)')
+	parser.add_option('--papers', type='int', default=100000,
+					help='Number of papers in the citation graph (default 100000)')
+	return parser
+
+
+def main():
+	options, _ = make_option_parser().parse_args()
+	server = StandinServer(('127.0.0.1', options.port), options)
+	sys.stderr.write('stand-in server listening on 127.0.0.1:%d\n' % options.port)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,114 @@
+from __future__ import print_function
+
+import getopt
+import sys
+
+import google_scholar
+from scholar_crawl import CitationCrawler
+from scholar_journal import ResultJournal
+
+
+def usage():
+	print('-C', '--cluster', 'cluster ID of a seed paper; may be repeated, further IDs can follow the options')
+	print('-i', '--ids', 'file of seed cluster IDs, one per line')
+	print('-D', '--depth', 'number of levels of citing papers to crawl (default 1)')
+	print('-m', '--max-citing', 'maximum number of citing papers to retrieve per paper (default 100)')
+	print('-j', '--jobs', 'number of concurrent lookups (default 4)')
+	print('--per-host', 'maximum concurrent requests per host (default 2)')
+	print('-o', '--output', 'file to save the graph to, see scholar_graph.CitationGraph (default citations.csr)')
+	print('--journal', 'file recording completed expansions, for resuming (default: <output>.journal)')
+	print('--no-journal', 'do not record or resume expansions')
+	print('--cache-dir', 'directory for caching responses across runs')
+
+
+seedList = []
+nDepth = 1
+nMaxCiting = 100
+nJobs = 4
+nPerHost = 2
+sOutput = 'citations.csr'
+sJournal = None
+bJournal = True
+sCacheDir = None
+
+
+def parseOptions(argv):
+	global nDepth, nMaxCiting, nJobs, nPerHost, sOutput, sJournal, bJournal, sCacheDir
+
+	try:
+		opts, args = getopt.getopt(argv, 'C:i:D:m:j:o:', ['cluster=', 'ids=', 'depth=', 'max-citing=', 'jobs=', 'per-host=', 'output=', 'journal=', 'no-journal', 'cache-dir='])
+	except getopt.GetoptError:
+		usage()
+		sys.exit(2)
+
+	for opt, arg in opts:
+		if opt in ('-C', '--cluster'):
+			seedList.append(arg)
+		elif opt in ('-i', '--ids'):
+			with open(arg) as f:
+				seedList.extend([line.strip() for line in f if line.strip()])
+		elif opt in ('-D', '--depth'):
+			nDepth = int(arg)
+		elif opt in ('-m', '--max-citing'):
+			nMaxCiting = int(arg)
+		elif opt in ('-j', '--jobs'):
+			nJobs = int(arg)
+		elif opt == '--per-host':
+			nPerHost = int(arg)
+		elif opt in ('-o', '--output'):
+			sOutput = arg
+		elif opt == '--journal':
+			sJournal = arg
+		elif opt == '--no-journal':
+			bJournal = False
+		elif opt == '--cache-dir':
+			sCacheDir = arg
+
+	seedList.extend(args)
+
+
+def makeCitesQuery(clusterId):
+	return google_scholar.CitesScholarQuery(cluster=clusterId)
+
+
+def reportLevel(level, nExpanded):
+	sys.stderr.write('level %d: %d papers expanded\n' % (level, nExpanded))
+
+
+if __name__=='__main__':
+	parseOptions(sys.argv[1:])
+
+	if len(seedList) == 0:
+		usage()
+		sys.exit(2)
+
+	if sCacheDir != None:
+		google_scholar.ScholarConf.CACHE_DIR = sCacheDir
+
+	journal = None
+	if bJournal:
+		if sJournal == None:
+			sJournal = sOutput + '.journal'
+		journal = ResultJournal(sJournal)
+
+	crawler = CitationCrawler(google_scholar.ScholarQuerier, makeCitesQuery, depth=nDepth,
+							max_citing=nMaxCiting, num_workers=nJobs, per_host=nPerHost,
+							journal=journal)
+	try:
+		graph = crawler.crawl(seedList, reportLevel)
+	finally:
+		if journal != None:
+			journal.close()
+
+	graph.save(sOutput)
+	print('%s: %d papers, %d citations' % (sOutput, graph.num_nodes(), graph.num_edges()))
+	sys.stderr.write('queries: %d, resumed from journal: %d, failed: %d\n' \
+					% (crawler.num_queries, crawler.num_resumed, crawler.num_failed))
+
+	# Once every expansion succeeded, there is nothing left to resume:
+	if journal != None:
+		if crawler.num_failed == 0:
+			journal.remove()
+		else:
+			sys.stderr.write('%d expansions failed, rerun to retry them (journal: %s)\n' \
+							% (crawler.num_failed, sJournal))
@@ -5,6 +5,8 @@
 import optparse
 import os
 import sys
+import time
+import threading
 import re
 
 try:
@@ -12,14 +14,23 @@ try:
 	# pylint: disable-msg=F0401
 	# pylint: disable-msg=E0611
 	from urllib.request import HTTPCookieProcessor, Request, build_opener
+	from urllib.error import HTTPError
 	from urllib.parse import quote, unquote
 	from http.cookiejar import MozillaCookieJar
 except ImportError:
 	# Fallback for Python 2
-	from urllib2 import Request, build_opener, HTTPCookieProcessor
+	from urllib2 import Request, build_opener, HTTPCookieProcessor, HTTPError
 	from urllib import quote, unquote
 	from cookielib import MozillaCookieJar
 
+from scholar_archive import HttpArchive
+from scholar_batch import Prefetch, ProcessPool
+from scholar_cache import ScholarCache
+from scholar_flight import SingleFlight, canonical_url
+from scholar_http import ScholarTransport
+from scholar_ratelimit import RateLimiter
+from scholar_store import ArticleStore
+from scholar_trace import NULL_TRACER, Tracer
 
 # Import BeautifulSoup -- try 4 first, fall back to older
 try:
@@ -70,6 +81,50 @@ class ScholarConf(object):
 	# cookie use across sessions.
 	COOKIE_JAR_FILE = None
 
+	# If set, responses get cached in this directory, so repeated
+	# queries are answered from disk. See scholar_cache.ScholarCache.
+	CACHE_DIR = None
+	CACHE_TTL = 7*24*3600 # Seconds a cached response stays valid
+	CACHE_MAX_BYTES = 256*1024*1024
+
+	# Number of result pages fetched ahead of the one being parsed,
+	# when a query spans several pages.
+	PREFETCH_PAGES = 4
+
+	# If set, parsed articles get recorded in this SQLite database,
+	# see scholar_store.ArticleStore.
+	STORE_FILE = None
+
+	# If set, responses get recorded in this archive file, or served
+	# from it instead of the network, depending on ARCHIVE_MODE
+	# ('record' or 'replay'). Replayed responses take ARCHIVE_LATENCY
+	# seconds, or as long as they took when recorded if 'recorded'.
+	# See scholar_archive.HttpArchive.
+	ARCHIVE_FILE = None
+	ARCHIVE_MODE = 'replay'
+	ARCHIVE_LATENCY = None
+
+	# If positive, result pages get parsed in a pool of this many
+	# worker processes, in parallel with the fetching threads, rather
+	# than in the thread that fetched them. See
+	# scholar_batch.ProcessPool.
+	PARSE_PROCESSES = 0
+
+	# Requests per second and host. Requests start out at RATE_LIMIT
+	# and speed up to at most RATE_LIMIT_MAX while the site keeps
+	# accepting them; rate-limit responses slow them down again. See
+	# scholar_ratelimit.RateLimiter.
+	RATE_LIMIT = 1.0
+	RATE_LIMIT_MAX = 2.0
+	RATE_LIMIT_BURST = 2
+	RATE_LIMIT_RETRIES = 3 # Retries of a rate-limited request
+
+	# Citation exports get retrieved with up to CITATION_WORKERS
+	# requests in flight. With a cache directory, they also get kept
+	# there, per cluster, for CITATION_TTL seconds.
+	CITATION_WORKERS = 4
+	CITATION_TTL = 90*24*3600
+
 class ScholarUtils(object):
 	"""A wrapper for various utensils that come in handy."""
 
@@ -94,75 +149,154 @@ class ScholarUtils(object):
 		sys.stderr.write('[%5s]  %s' % (level.upper(), msg + '\n'))
 		sys.stderr.flush()
 
+# Marks unset article attributes, see ScholarArticle:
+_UNSET = object()
+
 class ScholarArticle(object):
 	"""
 	A class representing articles listed on Google Scholar.  The class
 	provides basic dictionary-like behavior.
 	"""
+	# The triplets for each keyword correspond to (1) the key, (2) a
+	# user-suitable label for the item, and (3) its default value. The
+	# position in the tuple gives the ordering. Since articles can be
+	# numerous, labels and ordering live here, once per class, while
+	# each instance only holds the values, in slots:
+	SCHEMA = (
+		('title',         'Title',          None),
+		('url',           'URL',            None),
+		('year',          'Year',           None),
+		('num_citations', 'Citations',      0),
+		('num_versions',  'Versions',       0),
+		('cluster_id',    'Cluster ID',     None),
+		('url_pdf',       'PDF link',       None),
+		('url_citations', 'Citations list', None),
+		('url_versions',  'Versions list',  None),
+		('url_citation',  'Citation link',  None),
+		('excerpt',       'Excerpt',        None),
+	)
+	KEYS = tuple([item[0] for item in SCHEMA])
+	LABELS = dict([(item[0], item[1]) for item in SCHEMA])
+
+	__slots__ = KEYS + ('extra', 'citation_data')
+
 	def __init__(self):
-		# The triplets for each keyword correspond to (1) the actual
-		# value, (2) a user-suitable label for the item, and (3) an
-		# ordering index:
-		self.attrs = {
-			'title':         [None, 'Title',          0],
-			'url':           [None, 'URL',            1],
-			'year':          [None, 'Year',           2],
-			'num_citations': [0,    'Citations',      3],
-			'num_versions':  [0,    'Versions',       4],
-			'cluster_id':    [None, 'Cluster ID',     5],
-			'url_pdf':       [None, 'PDF link',       6],
-			'url_citations': [None, 'Citations list', 7],
-			'url_versions':  [None, 'Versions list',  8],
-			'url_citation':  [None, 'Citation link',  9],
-			'excerpt':       [None, 'Excerpt',       10],
-        }
+		for key, _, default in self.SCHEMA:
+			setattr(self, key, default)
+
+		# Any further attributes set on the fly, as a list of [key,
+		# value] pairs in the order they were added. None until needed.
+		self.extra = None
 
 		# The citation data in one of the standard export formats,
 		# e.g. BibTeX.
 		self.citation_data = None
 
 	def __getitem__(self, key):
-		if key in self.attrs:
-			return self.attrs[key][0]
+		if key in self.LABELS:
+			return getattr(self, key, None)
+		if self.extra is not None:
+			for item in self.extra:
+				if item[0] == key:
+					return item[1]
 		return None
 
 	def __len__(self):
-		return len(self.attrs)
+		return len(self._items())
+
+	def keys(self):
+		"""Returns the keys of all attributes the article has, in order."""
+		return [item[0] for item in self._items()]
 
 	def __setitem__(self, key, item):
-		if key in self.attrs:
-			self.attrs[key][0] = item
-		else:
-			self.attrs[key] = [item, key, len(self.attrs)]
+		if key in self.LABELS:
+			setattr(self, key, item)
+			return
+		if self.extra is None:
+			self.extra = []
+		for pair in self.extra:
+			if pair[0] == key:
+				pair[1] = item
+				return
+		self.extra.append([key, item])
 
 	def __delitem__(self, key):
-		if key in self.attrs:
-			del self.attrs[key]
+		if key in self.LABELS:
+			if getattr(self, key, _UNSET) is not _UNSET:
+				delattr(self, key)
+		elif self.extra is not None:
+			self.extra = [pair for pair in self.extra if pair[0] != key] or None
+
+	@property
+	def attrs(self):
+		"""
+		The article's attributes in the dictionary layout older code
+		expects, mapping keys to [value, label, ordering index]
+		triplets. This is a snapshot; changing it does not change the
+		article.
+		"""
+		res = {}
+		for idx, (key, label, val) in enumerate(self._items()):
+			res[key] = [val, label, idx]
+		return res
+
+	def _items(self):
+		"""
+		Returns (key, label, value) triplets for all attributes the
+		article has, in order.
+		"""
+		items = []
+		for key, label, _ in self.SCHEMA:
+			val = getattr(self, key, _UNSET)
+			if val is not _UNSET:
+				items.append((key, label, val))
+		if self.extra is not None:
+			for key, val in self.extra:
+				items.append((key, key, val))
+		return items
+
+	def as_record(self):
+		"""
+		Returns the article's attributes as a compact, picklable list of
+		(key, value) pairs, in order. See from_record().
+		"""
+		return [(key, val) for key, _, val in self._items()]
+
+	@classmethod
+	def from_record(cls, record):
+		"""
+		Returns a new article with exactly the attributes of the given
+		record, as returned by as_record().
+		"""
+		art = cls()
+		keys = set([key for key, _ in record])
+		for key in cls.KEYS:
+			if key not in keys:
+				del art[key]
+		for key, val in record:
+			art[key] = val
+		return art
 
 	def set_citation_data(self, citation_data):
 		self.citation_data = citation_data
 
 	def as_txt(self):
-		# Get items sorted in specified order:
-		items = sorted(list(self.attrs.values()), key=lambda item: item[2])
+		items = self._items()
 		# Find largest label length:
 		max_label_len = max([len(str(item[1])) for item in items])
 		fmt = '%%%ds %%s' % max_label_len
 		res = []
 		for item in items:
-			if item[0] is not None:
-				res.append(fmt % (item[1], item[0]))
+			if item[2] is not None:
+				res.append(fmt % (item[1], item[2]))
 		return '\n'.join(res)
 
 	def as_csv(self, header=False, sep='|'):
-		# Get keys sorted in specified order:
-		keys = [pair[0] for pair in \
-			sorted([(key, val[2]) for key, val in list(self.attrs.items())],
-				key=lambda pair: pair[1])]
+		items = self._items()
 		res = []
 		if header:
-			res.append(sep.join(keys))
-		res.append(sep.join([unicode(self.attrs[key][0]) for key in keys]))
+			res.append(sep.join([item[0] for item in items]))
+		res.append(sep.join([unicode(item[2]) for item in items]))
 		return '\n'.join(res)
 
 	def as_citation(self):
@@ -180,12 +314,24 @@ class ScholarArticleParser(object):
 	ScholarArticleParser can parse HTML document strings obtained from
 	Google Scholar. This is a base class; concrete implementations
 	adapting to tweaks made by Google over time follow below.
+
+	If fields is given, it names the article attributes the caller is
+	interested in, and the parser skips the work for all others. The
+	title is always extracted, since articles without one get dropped.
 	"""
-	def __init__(self, site=None):
+	# Attributes extracted from the links below each result:
+	LINK_FIELDS = ('num_citations', 'num_versions', 'cluster_id',
+					'url_citations', 'url_versions', 'url_citation')
+
+	def __init__(self, site=None, fields=None):
 		self.soup = None
 		self.article = None
 		self.site = site or ScholarConf.SCHOLAR_SITE
+		self.tracer = NULL_TRACER
 		self.year_re = re.compile(r'\b(?:20|19)\d{2}\b')
+		self.fields = None
+		if fields is not None:
+			self.fields = set(fields)
 
 	def handle_article(self, art):
 		"""
@@ -206,17 +352,29 @@ class ScholarArticleParser(object):
 		content as needed, and notifies the parser instance of
 		resulting instances via the handle_article callback.
 		"""
-		self.soup = BeautifulSoup(html)
+		for art in self.iter_parse(html):
+			self.handle_article(art)
+
+	def iter_parse(self, html):
+		"""
+		Generator variant of parse(): yields each article as soon as it
+		has been parsed and cleaned, instead of invoking the
+		handle_article callback.
+		"""
+		with self.tracer.span('soup', bytes=len(html)):
+			self.soup = BeautifulSoup(html)
 
 		# This parses any global, non-itemized attributes from the page.
 		self._parse_globals()
 
 		# Now parse out listed articles:
 		for div in self.soup.findAll(ScholarArticleParser._tag_results_checker):
+			start = time.time()
 			self._parse_article(div)
 			self._clean_article()
- 			if self.article['title']:
-				self.handle_article(self.article)	
+			self.tracer.record('article', start, time.time() - start)
+			if self.article['title']:
+				yield self.article
 
 	def _clean_article(self):
 		"""
@@ -227,6 +385,18 @@ class ScholarArticleParser(object):
 		if self.article['title']:
 			self.article['title'] = self.article['title'].strip()
 
+	def _wants(self, *keys):
+		"""
+		This predicate checks whether any of the given article
+		attributes were requested via the fields constructor argument.
+		"""
+		if self.fields is None:
+			return True
+		for key in keys:
+			if key in self.fields:
+				return True
+		return False
+
 	def _parse_globals(self):
 		tag = self.soup.find(name='div', attrs={'id': 'gs_ab_md'})
 		if tag is not None:
@@ -234,8 +404,8 @@ class ScholarArticleParser(object):
 			# raw text is a list because the body contains <b> etc
 			if raw_text is not None and len(raw_text) > 0:
 				try:
- 					num_results = raw_text[0].split()[1]
- 					# num_results may now contain commas to separate
+					num_results = raw_text[0].split()[1]
+					# num_results may now contain commas to separate
 					# thousands, strip:
 					num_results = num_results.replace(',', '')
 					num_results = int(num_results)
@@ -252,11 +422,12 @@ class ScholarArticleParser(object):
 
 			if tag.name == 'div' and self._tag_has_class(tag, 'gs_rt') and tag.h3 and tag.h3.a:
 				self.article['title'] = ''.join(tag.h3.a.findAll(text=True))
-				self.article['url'] = self._path2url(tag.h3.a['href'])
-				if self.article['url'].endswith('.pdf'):
-					self.article['url_pdf'] = self.article['url']
+				if self._wants('url', 'url_pdf'):
+					self.article['url'] = self._path2url(tag.h3.a['href'])
+					if self.article['url'].endswith('.pdf'):
+						self.article['url_pdf'] = self.article['url']
 
-			if tag.name == 'font':
+			if tag.name == 'font' and self._wants(*self.LINK_FIELDS):
 				for tag2 in tag:
 					if not hasattr(tag2, 'name'):
 						continue
@@ -275,6 +446,9 @@ class ScholarArticleParser(object):
 				if hasattr(tag, 'string') and tag.string.startswith('Cited by'):
 					self.article['num_citations'] = self._as_int(tag.string.split()[-1])
 
+				if not self._wants('url_citations', 'cluster_id'):
+					continue
+
 				# Weird Google Scholar behavior here: if the original
 				# search query came with a number-of-results limit,
 				# then this limit gets propagated to the URLs embedded
@@ -293,9 +467,18 @@ class ScholarArticleParser(object):
 			if tag.get('href').startswith('/scholar?cluster'):
 				if hasattr(tag, 'string') and tag.string.startswith('All '):
 					self.article['num_versions'] = self._as_int(tag.string.split()[1])
-				self.article['url_versions'] = self._strip_url_arg('num', self._path2url(tag.get('href')))
-
-			if tag.getText().startswith('Import'):
+				if self._wants('url_versions'):
+					self.article['url_versions'] = self._strip_url_arg('num', self._path2url(tag.get('href')))
+
+				# Papers nobody cites have no citations link, but the
+				# versions URL carries the cluster ID as well:
+				if self.article['cluster_id'] is None and self._wants('cluster_id'):
+					args = tag.get('href').split('?', 1)[1]
+					for arg in args.split('&'):
+						if arg.startswith('cluster='):
+							self.article['cluster_id'] = arg[8:]
+
+			if self._wants('url_citation') and tag.getText().startswith('Import'):
 				self.article['url_citation'] = self._path2url(tag.get('href'))	
 
 
@@ -307,7 +490,7 @@ class ScholarArticleParser(object):
 		"""
 		res = tag.get('class') or []
 		if type(res) != list:
- 			# BeautifulSoup 3 can return e.g. 'gs_md_wp gs_ttss',
+			# BeautifulSoup 3 can return e.g. 'gs_md_wp gs_ttss',
 			# so split -- conveniently produces a list in any case
 			res = res.split()
 		return klass in res
@@ -347,65 +530,100 @@ class ScholarArticleParser120726(ScholarArticleParser):
 	This class reflects update to the Scholar results page layout that
 	Google made 07/26/12.
 	"""
+	# The result-info blocks _parse_article picks out of a gs_ri div:
+	INFO_CLASSES = ('gs_a', 'gs_fl', 'gs_rs', 'gs_ttss')
+
 	def _parse_article(self, div):
 		self.article = ScholarArticle()
+		want_links = self._wants(*self.LINK_FIELDS)
 
 		for tag in div:
-			if not hasattr(tag, 'name'):
+			if not hasattr(tag, 'name') or tag.name is None:
 				continue
-			if str(tag).lower().find('.pdf'):
-				if tag.find('div', {'class': 'gs_ttss'}):
-					self._parse_links(tag.find('div', {'class': 'gs_ttss'}))
 
 			if tag.name == 'div' and self._tag_has_class(tag, 'gs_ri'):
-				# There are (at least) two formats here. In the first
-				# one, we have a link, e.g.:
-				#
-				# <h3 class="gs_rt">
-				#   <a href="http://dl.acm.org/citation.cfm?id=972384" class="yC0">
-				#     <b>Honeycomb</b>: creating intrusion detection signatures using
-				#        honeypots
-				#   </a>
-				# </h3>
-				#
-				# In the other, there's no actual link -- it's what
-				# Scholar renders as "CITATION" in the HTML:
-				#
-				# <h3 class="gs_rt">
-				#   <span class="gs_ctu">
-				#     <span class="gs_ct1">[CITATION]</span>
-				#     <span class="gs_ct2">[C]</span>
-				#   </span>
-				#   <b>Honeycomb</b> automated ids signature creation using honeypots
-				# </h3>
-				#
-				# We now distinguish the two.
-				try:
-					atag = tag.h3.a
-					self.article['title'] = ''.join(atag.findAll(text=True))
+				self._parse_result_info(tag, want_links)
+			elif want_links:
+				# The PDF box next to the result info, if any. Look for
+				# the gs_ttss div directly rather than serializing the
+				# subtree in search of ".pdf".
+				ttss = self._first_divs(tag, ('gs_ttss',)).get('gs_ttss')
+				if ttss is not None:
+					self._parse_links(ttss)
+
+	def _parse_result_info(self, tag, want_links):
+		# There are (at least) two formats here. In the first
+		# one, we have a link, e.g.:
+		#
+		# <h3 class="gs_rt">
+		#   <a href="http://dl.acm.org/citation.cfm?id=972384" class="yC0">
+		#     <b>Honeycomb</b>: creating intrusion detection signatures using
+		#        honeypots
+		#   </a>
+		# </h3>
+		#
+		# In the other, there's no actual link -- it's what
+		# Scholar renders as "CITATION" in the HTML:
+		#
+		# <h3 class="gs_rt">
+		#   <span class="gs_ctu">
+		#     <span class="gs_ct1">[CITATION]</span>
+		#     <span class="gs_ct2">[C]</span>
+		#   </span>
+		#   <b>Honeycomb</b> automated ids signature creation using honeypots
+		# </h3>
+		#
+		# We now distinguish the two.
+		h3 = tag.h3
+		if h3 is not None:
+			atag = h3.a
+			if atag is not None and atag.get('href') is not None:
+				self.article['title'] = ''.join(atag.findAll(text=True))
+				if self._wants('url', 'url_pdf'):
 					self.article['url'] = self._path2url(atag['href'])
 					if self.article['url'].endswith('.pdf'):
 						self.article['url_pdf'] = self.article['url']
-				except:
-					# Remove a few spans that have unneeded content (e.g. [CITATION])
-					for span in tag.h3.findAll(name='span'):
-						span.clear()
-					self.article['title'] = ''.join(tag.h3.findAll(text=True))
-
-				if tag.find('div', {'class': 'gs_a'}):
-					year = self.year_re.findall(tag.find('div', {'class': 'gs_a'}).text)
-					self.article['year'] = year[0] if len(year) > 0 else None
-
-				if tag.find('div', {'class': 'gs_fl'}):
-					self._parse_links(tag.find('div', {'class': 'gs_fl'}))
-
-				if tag.find('div', {'class': 'gs_rs'}):
-					# These are the content excerpts rendered into the results.
-					raw_text = tag.find('div', {'class': 'gs_rs'}).findAll(text=True)
-					if len(raw_text) > 0:
-						raw_text = ''.join(raw_text)
-						raw_text = raw_text.replace('\n', '')
-						self.article['excerpt'] = raw_text
+			else:
+				# Remove a few spans that have unneeded content (e.g. [CITATION])
+				for span in h3.findAll(name='span'):
+					span.clear()
+				self.article['title'] = ''.join(h3.findAll(text=True))
+
+		# A single walk over the nested divs finds all blocks we need.
+		blocks = self._first_divs(tag, self.INFO_CLASSES)
+
+		if want_links and 'gs_ttss' in blocks:
+			self._parse_links(blocks['gs_ttss'])
+
+		if self._wants('year') and 'gs_a' in blocks:
+			year = self.year_re.findall(blocks['gs_a'].text)
+			self.article['year'] = year[0] if len(year) > 0 else None
+
+		if want_links and 'gs_fl' in blocks:
+			self._parse_links(blocks['gs_fl'])
+
+		if self._wants('excerpt') and 'gs_rs' in blocks:
+			# These are the content excerpts rendered into the results.
+			raw_text = blocks['gs_rs'].findAll(text=True)
+			if len(raw_text) > 0:
+				raw_text = ''.join(raw_text)
+				raw_text = raw_text.replace('\n', '')
+				self.article['excerpt'] = raw_text
+
+	def _first_divs(self, tag, classes):
+		"""
+		Returns a dictionary mapping each of the given classes to the
+		first div below tag (in document order) that has it, in one
+		traversal of the subtree.
+		"""
+		res = {}
+		for div in tag.findAll('div'):
+			for klass in classes:
+				if klass not in res and self._tag_has_class(div, klass):
+					res[klass] = div
+			if len(res) == len(classes):
+				break
+		return res
 
 class ScholarQuery(object):
 	"""
@@ -425,23 +643,76 @@ class ScholarQuery(object):
 		# basic data structure:
 		self.attrs = {}
 
+		# Pagination: the offset of the first result we want, and the
+		# overall number of results to retrieve across pages. The
+		# default of None means a single page.
+		self.start = 0
+		self.total_results = None
+
 	def set_num_page_results(self, num_page_results):
 		msg = 'maximum number of results on page must be numeric'
 		self.num_results = ScholarUtils.ensure_int(num_page_results, msg)
 
-	def get_url(self):
+	def set_start(self, start):
+		"""Sets the offset of the first result to retrieve."""
+		msg = 'result offset must be numeric'
+		self.start = ScholarUtils.ensure_int(start, msg)
+
+	def set_total_results(self, total_results):
+		"""
+		Sets the overall number of results to retrieve. If that exceeds
+		the number of results per page, the querier retrieves as many
+		pages as needed.
+		"""
+		msg = 'total number of results must be numeric'
+		self.total_results = ScholarUtils.ensure_int(total_results, msg)
+
+	def get_page_size(self):
+		"""Returns the number of results per page."""
+		return self.num_results or ScholarConf.MAX_PAGE_RESULTS
+
+	def get_num_pages(self):
+		"""Returns the number of result pages to retrieve."""
+		if self.total_results is None:
+			return 1
+		size = self.get_page_size()
+		return max(1, (self.total_results + size - 1) // size)
+
+	def has_page(self, page):
+		"""
+		Predicate telling whether the given result page (counting from
+		zero) may hold any results, judging by the overall number of
+		results Scholar reported so far. Without such a report, it
+		optimistically returns True.
+		"""
+		reported = self['num_results']
+		if not reported:
+			return True
+		return self.start + page * self.get_page_size() < reported
+
+	def get_url(self, page=0):
 		"""
 		Returns a complete, submittable URL string for this particular
-		query instance. The URL and its arguments will vary depending
-		on the query.
+		query instance, for the given result page (counting from zero).
+		The URL and its arguments will vary depending on the query.
 		"""
 		return None
 
+	def _page_url(self, url, page):
+		"""
+		Adds the result offset for the given page to a query URL. The
+		first page of a query without offset keeps its plain URL.
+		"""
+		start = self.start + page * self.get_page_size()
+		if start == 0:
+			return url
+		return url + '&start=%d' % start
+
 	def _add_attribute_type(self, key, label, default_value=None):
 		"""
 		Adds a new type of attribute to the list of attributes
 		understood by this query. Meant to be used by the constructors
- 		in derived classes.
+		in derived classes.
 		"""
 		if len(self.attrs) == 0:
 			self.attrs[key] = [default_value, label, 0]
@@ -502,17 +773,39 @@ class ClusterScholarQuery(ScholarQuery):
 		msg = 'cluster ID must be numeric'
 		self.cluster = ScholarUtils.ensure_int(cluster, msg)
 
-	def get_url(self):
+	def get_url(self, page=0):
 		if self.cluster is None:
 			raise QueryArgumentError('cluster query needs cluster ID')
 
 		urlargs = {'cluster': self.cluster,
-					'num': self.num_results or ScholarConf.MAX_PAGE_RESULTS}
+					'num': self.get_page_size()}
+
+		for key, val in urlargs.items():
+			urlargs[key] = quote(encode(val))
+
+		return self._page_url(self.SCHOLAR_CLUSTER_URL % urlargs, page)
+
+class CitesScholarQuery(ClusterScholarQuery):
+	"""
+	This version pulls up the articles citing the article cluster of
+	the given ID, as linked from an article's citation count (see its
+	url_citations).
+	"""
+	SCHOLAR_CITES_URL = ScholarConf.SCHOLAR_SITE + '/scholar?' \
+		+ 'cites=%(cluster)s' \
+		+ '&num=%(num)s'
+
+	def get_url(self, page=0):
+		if self.cluster is None:
+			raise QueryArgumentError('citations query needs cluster ID')
+
+		urlargs = {'cluster': self.cluster,
+					'num': self.get_page_size()}
 
 		for key, val in urlargs.items():
 			urlargs[key] = quote(encode(val))
 
-		return self.SCHOLAR_CLUSTER_URL % urlargs
+		return self._page_url(self.SCHOLAR_CITES_URL % urlargs, page)
 
 class SearchScholarQuery(ScholarQuery):
 	"""
@@ -596,7 +889,7 @@ class SearchScholarQuery(ScholarQuery):
 	def set_include_patents(self, yesorno):
 		self.include_patents = yesorno
 
-	def get_url(self):
+	def get_url(self, page=0):
 		if self.words is None and self.words_some is None \
 			and self.words_none is None and self.phrase is None \
 			and self.author is None and self.pub is None \
@@ -627,12 +920,12 @@ class SearchScholarQuery(ScholarQuery):
 					'yhi': self.timeframe[1] or '',
 					'patents': '0' if self.include_patents else '1',
 					'citations': '0' if self.include_citations else '1',
-					'num': self.num_results or ScholarConf.MAX_PAGE_RESULTS}
+					'num': self.get_page_size()}
 
 		for key, val in urlargs.items():
 			urlargs[key] = quote(encode(val))
 
-		return self.SCHOLAR_QUERY_URL % urlargs
+		return self._page_url(self.SCHOLAR_QUERY_URL % urlargs, page)
 
 class ScholarSettings(object):
 
@@ -688,7 +981,7 @@ class ScholarQuerier(object):
 		+ '&scisig=%(scisig)s' \
 		+ '&inststart=0' \
 		+ '&as_sdt=1,5' \
- 		+ '&as_sdtp=' \
+		+ '&as_sdtp=' \
 		+ '&num=%(num)s' \
 		+ '&scis=%(scis)s' \
 		+ '%(scisf)s' \
@@ -697,23 +990,86 @@ class ScholarQuerier(object):
 	# Older URLs:
 	# ScholarConf.SCHOLAR_SITE + '/scholar?q=%s&hl=en&btnG=Search&as_sdt=2001&as_sdtp=on
 
+	# Responses telling us to slow down: HTTP status codes, and
+	# markers of the "unusual traffic" interstitial, which Scholar
+	# serves either at its own URL or in place of the results.
+	RATE_LIMIT_CODES = (429, 503)
+	BLOCK_URL_MARKERS = ('/sorry/',)
+	BLOCK_PAGE_MARKERS = (b'gs_captcha_ccl', b'unusual traffic from your computer network')
+
+	# The source name articles get recorded under in the article store:
+	STORE_SOURCE = 'scholar'
+
 	class Parser(ScholarArticleParser120726):
-		def __init__(self, querier):
-			ScholarArticleParser120726.__init__(self)
+		def __init__(self, querier, fields=None):
+			ScholarArticleParser120726.__init__(self, fields=fields)
 			self.querier = querier
+			self.tracer = getattr(querier, 'tracer', NULL_TRACER)
+			self.num_results = None
 
 		def handle_num_results(self, num_results):
-			if self.querier is not None and self.querier.query is not None:
- 				self.querier.query['num_results'] = num_results
+			self.num_results = num_results
 
 		def handle_article(self, art):
 			self.querier.add_article(art)
 
-	def __init__(self):
+	def __init__(self, cache=None, limiter=None, tracer=None, store=None, flights=None,
+				archive=None, parse_pool=None):
 		self.articles = []
 		self.query = None
 		self.cjar = MozillaCookieJar()
 
+		# The record/replay archive, if any. By default all queriers of
+		# a process share the one for ScholarConf.ARCHIVE_FILE:
+		self.archive = archive
+		if self.archive is None and ScholarConf.ARCHIVE_FILE:
+			self.archive = HttpArchive.shared(ScholarConf.ARCHIVE_FILE,
+											ScholarConf.ARCHIVE_MODE,
+											ScholarConf.ARCHIVE_LATENCY)
+
+		# The response cache, if any. By default all queriers of a
+		# process share the one for ScholarConf.CACHE_DIR, unless they
+		# record or replay an archive, which needs to see every
+		# request:
+		self.cache = cache
+		if self.cache is None and ScholarConf.CACHE_DIR and self.archive is None:
+			self.cache = ScholarCache.shared(ScholarConf.CACHE_DIR,
+											ScholarConf.CACHE_TTL,
+											ScholarConf.CACHE_MAX_BYTES)
+
+		# The article store parsed articles get recorded in, if any. By
+		# default all queriers of a process share the one for
+		# ScholarConf.STORE_FILE:
+		self.store = store
+		if self.store is None and ScholarConf.STORE_FILE:
+			self.store = ArticleStore.shared(ScholarConf.STORE_FILE)
+
+		# The process pool result pages get parsed in, if any. By
+		# default all queriers of a process share the one of
+		# ScholarConf.PARSE_PROCESSES workers:
+		self.parse_pool = parse_pool
+		if self.parse_pool is None and ScholarConf.PARSE_PROCESSES > 0:
+			self.parse_pool = ProcessPool.shared(ScholarConf.PARSE_PROCESSES)
+
+		# Timing spans get recorded here, see scholar_trace.Tracer:
+		self.tracer = tracer or NULL_TRACER
+
+		# The request rate limiter. By default all queriers of a
+		# process share one:
+		self.limiter = limiter
+		if self.limiter is None:
+			self.limiter = RateLimiter.shared(ScholarConf.SCHOLAR_SITE,
+											rate=ScholarConf.RATE_LIMIT,
+											burst=ScholarConf.RATE_LIMIT_BURST,
+											max_rate=ScholarConf.RATE_LIMIT_MAX)
+
+		# Identical requests in flight get coalesced into one. By
+		# default this happens across all queriers of a process, which
+		# assumes they use the same settings:
+		self.flights = flights
+		if self.flights is None:
+			self.flights = SingleFlight.shared(ScholarConf.SCHOLAR_SITE)
+
 		# If we have a cookie file, load it:
 		if ScholarConf.COOKIE_JAR_FILE and \
 			os.path.exists(ScholarConf.COOKIE_JAR_FILE):
@@ -724,9 +1080,15 @@ class ScholarQuerier(object):
 				ScholarUtils.log('warn', 'could not load cookies file: %s' % msg)
 				self.cjar = MozillaCookieJar() # Just to be safe
 
-		self.opener = build_opener(HTTPCookieProcessor(self.cjar))
+		# Keep-alive connection pool, negotiating compressed transfer:
+		self.opener = ScholarTransport(self.cjar, tracer=self.tracer)
 		self.settings = None # Last settings object, if any
 
+		# Citation export data retrieved so far, by cluster ID or
+		# citation link. See get_citation_data().
+		self.citation_data = {}
+		self.citation_lock = threading.Lock()
+
 	def apply_settings(self, settings):
 		"""
 		Applies settings as provided by a ScholarSettings instance.
@@ -742,7 +1104,8 @@ class ScholarQuerier(object):
 		# the settings.
 		html = self._get_http_response(url=self.GET_SETTINGS_URL,
 										log_msg='dump of settings form HTML',
-										err_msg='requesting settings failed')
+										err_msg='requesting settings failed',
+										cacheable=False)
 		if html is None:
 			return False
 
@@ -772,28 +1135,162 @@ class ScholarQuerier(object):
 
 		html = self._get_http_response(url=self.SET_SETTINGS_URL % urlargs,
 										log_msg='dump of settings result HTML',
-										err_msg='applying setttings failed')
+										err_msg='applying setttings failed',
+										cacheable=False)
 		if html is None:
 			return False
 
 		ScholarUtils.log('info', 'settings applied')
 		return True
 
-	def send_query(self, query):
+	def send_query(self, query, fields=None):
 		"""
 		This method initiates a search query (a ScholarQuery instance)
-		with subsequent parsing of the response.
+		with subsequent parsing of the response, across as many result
+		pages as the query asks for. If fields is given, only those
+		article attributes get extracted (see ScholarArticleParser).
+		Citation export data gets retrieved once all pages are parsed,
+		concurrently, see get_citation_data_many().
+		"""
+		with self.tracer.span('send_query'):
+			self.clear_articles()
+			self.query = query
+
+			for art in self._iter_query(query, fields):
+				self.add_article(art)
+			self.get_citation_data_many(self.articles)
+
+	def iter_articles(self, queries, fields=None):
+		"""
+		Generator counterpart of send_query(). Takes a single query or
+		an iterable of them, and yields each article as soon as it has
+		been parsed and its citation data retrieved, moving on to the
+		next query once a response is used up. The articles do not get
+		collected in the articles member, so consumers can process
+		arbitrarily long result streams in constant memory. Queries
+		whose retrieval fails yield nothing.
+		"""
+		if hasattr(queries, 'get_url'):
+			queries = [queries]
+
+		for query in queries:
+			self.query = query
+			for art in self._with_citation_data(self._iter_query(query, fields)):
+				yield art
+
+	def _with_citation_data(self, articles):
 		"""
-		self.clear_articles()
-		self.query = query
+		Passes through the given articles in order, but only once
+		their citation data has been retrieved. Retrieval starts as an
+		article comes in, with up to ScholarConf.CITATION_WORKERS
+		articles in flight. Articles without citation link, as
+		without a citation format set, need no retrieval and go
+		straight through unless queued behind others.
+		"""
+		pending = [] # (article, its retrieval or None), in order
+		for art in articles:
+			fetch = None
+			if art['url_citation'] is not None and art.citation_data is None:
+				fetch = Prefetch(self.get_citation_data, art)
+			elif len(pending) == 0:
+				yield art
+				continue
 
-		html = self._get_http_response(url=query.get_url(),
+			pending.append((art, fetch))
+			if len(pending) >= ScholarConf.CITATION_WORKERS:
+				art, fetch = pending.pop(0)
+				if fetch is not None:
+					fetch.result()
+				yield art
+		for art, fetch in pending:
+			if fetch is not None:
+				fetch.result()
+			yield art
+
+	def _iter_query(self, query, fields=None):
+		"""
+		Retrieves and parses the result pages of the given query,
+		yielding the articles. Up to ScholarConf.PREFETCH_PAGES pages
+		beyond the one being parsed are fetched in the background, so
+		a deep result set costs about one round trip of latency rather
+		than one per page. Prefetching starts only once Scholar has
+		reported the number of results, so that no pages beyond it get
+		requested; until then, pages get fetched one by one. Pagination
+		stops once the requested total is reached or a page comes back
+		empty.
+		"""
+		num_pages = query.get_num_pages()
+		remaining = query.total_results
+		pending = [] # Prefetches of the upcoming pages, in order
+		next_page = 0
+
+		for page in range(num_pages):
+			if len(pending) > 0:
+				result = pending.pop(0).result()
+			else:
+				# The first page, or no number of results reported:
+				result = self._get_page(query, page, fields)
+			next_page = max(next_page, page + 1)
+			if result is None:
+				return
+			num_results, articles = result
+			if num_results is not None:
+				query['num_results'] = num_results
+
+			# Keep up to PREFETCH_PAGES pages beyond this one in flight,
+			# as far as the number of results goes:
+			while next_page < num_pages and query['num_results'] \
+				and next_page <= page + ScholarConf.PREFETCH_PAGES \
+				and query.has_page(next_page):
+				pending.append(Prefetch(self._get_page, query, next_page, fields))
+				next_page += 1
+
+			found = 0
+			for art in articles:
+				found += 1
+				yield art
+				if remaining is not None:
+					remaining -= 1
+					if remaining <= 0:
+						return
+
+			if found == 0 or not query.has_page(page + 1):
+				return
+
+	def _get_page(self, query, page, fields=None):
+		"""
+		Retrieves and parses the given result page of the query.
+		Returns the number of results the site reports, if any, and the
+		list of articles, or None if retrieval failed. Concurrent
+		requests for the same page and fields share one fetch and
+		parse, and with it the resulting articles.
+		"""
+		with self.tracer.span('build_url'):
+			url = query.get_url(page)
+		if fields is not None:
+			fields = tuple(fields)
+		return self.flights.do(('page', self._cache_key(canonical_url(url)), fields),
+								self._fetch_page, url, fields)
+
+	def _fetch_page(self, url, fields):
+		html = self._get_http_response(url=url,
 										log_msg='dump of query response HTML',
 										err_msg='results retrieval failed')
 		if html is None:
-			return
+			return None
+
+		if self.parse_pool is not None:
+			with self.tracer.span('parse_pool', bytes=len(html)):
+				num_results, records = self.parse_pool.run(parse_page_records, html, fields)
+			articles = [ScholarArticle.from_record(record) for record in records]
+		else:
+			parser = self.Parser(self, fields)
+			articles = list(parser.iter_parse(html))
+			num_results = parser.num_results
 
-		self.parse(html)
+		if self.store is not None:
+			self.store.put_many(self.STORE_SOURCE, articles)
+		return num_results, articles
 
 	def get_citation_data(self, article):
 		"""
@@ -806,25 +1303,79 @@ class ScholarQuerier(object):
 		if article.citation_data is not None:
 			return True
 
-		ScholarUtils.log('info', 'retrieving citation export data')
-		data = self._get_http_response(url=article['url_citation'],
-										log_msg='citation data response',
-										err_msg='requesting citation data failed')
+		# Articles of the same cluster share their export data, so we
+		# retrieve it only once, even if asked for it concurrently:
+		key = self._citation_key(article)
+		data = self.flights.do(('citation', key), self._fetch_citation_data,
+								key, article['url_citation'])
 		if data is None:
 			return False
 
 		article.set_citation_data(data)
 		return True
 
-	def parse(self, html):
+	def get_citation_data_many(self, articles):
+		"""
+		Retrieves the citation export data of all given articles, with
+		up to ScholarConf.CITATION_WORKERS requests in flight. Returns
+		the number of articles that have citation data afterwards.
+		"""
+		count = 0
+		for art in self._with_citation_data(articles):
+			if art.citation_data is not None:
+				count += 1
+		return count
+
+	def _citation_key(self, article):
+		citform = 0
+		if self.settings is not None:
+			citform = self.settings.citform
+		if article['cluster_id'] is not None:
+			return 'citation:%d:cluster:%s' % (citform, article['cluster_id'])
+		return 'citation:%d:%s' % (citform, article['url_citation'])
+
+	def _fetch_citation_data(self, key, url):
+		"""
+		Returns the citation export data for the given key, from the
+		data retrieved so far or the cache if possible, otherwise by
+		retrieving it from url. Failed retrievals do not get
+		remembered, allowing for another attempt later on.
+		"""
+		with self.citation_lock:
+			data = self.citation_data.get(key)
+		if data is not None:
+			return data
+
+		with self.tracer.span('citation', key=key):
+			if self.cache is not None:
+				data = self.cache.get(key)
+
+			if data is None:
+				ScholarUtils.log('info', 'retrieving citation export data')
+				data = self._get_http_response(url=url,
+												log_msg='citation data response',
+												err_msg='requesting citation data failed',
+												cacheable=False)
+				if data is not None and self.cache is not None:
+					self.cache.put(key, data, ScholarConf.CITATION_TTL)
+
+		if data is not None:
+			with self.citation_lock:
+				self.citation_data[key] = data
+		return data
+
+	def parse(self, html, fields=None):
 		"""
 		This method allows parsing of provided HTML content.
 		"""
-		parser = self.Parser(self)
+		num_articles = len(self.articles)
+		parser = self.Parser(self, fields)
 		parser.parse(html)
+		if parser.num_results is not None and self.query is not None:
+			self.query['num_results'] = parser.num_results
+		self.get_citation_data_many(self.articles[num_articles:])
 
 	def add_article(self, art):
-		self.get_citation_data(art)
 		self.articles.append(art)
 
 	def clear_articles(self):
@@ -846,33 +1397,141 @@ class ScholarQuerier(object):
 			ScholarUtils.log('warn', 'could not save cookies file: %s' % msg)
 			return False
 
-	def _get_http_response(self, url, log_msg=None, err_msg=None):
+	def _get_http_response(self, url, log_msg=None, err_msg=None, cacheable=True):
 		"""
 		Helper method, sends HTTP request and returns response payload.
+		Unless cacheable is False, the response cache gets consulted
+		first, and successful responses are stored in it. Requests go
+		through the rate limiter; those the site rejects as too
+		frequent get retried after backing off. Concurrent requests for
+		the same URL share one of them. With an archive, responses get
+		recorded in it, or replayed from it without any network access.
+		"""
+		return self.flights.do(('fetch', self._cache_key(canonical_url(url)), cacheable),
+								self._send_http_request, url, log_msg, err_msg, cacheable)
+
+	def _cache_key(self, url):
+		"""
+		Returns the key of the given URL's response in the cache. The
+		settings cookie changes the result pages, which only carry
+		citation export links for a set citation format, so the format
+		is part of the key.
 		"""
+		if self.settings is None or self.settings.citform == 0:
+			return url
+		return 'citform:%d:%s' % (self.settings.citform, url)
+
+	def _send_http_request(self, url, log_msg, err_msg, cacheable):
 		if log_msg is None:
 			log_msg = 'HTTP response data follow'
 		if err_msg is None:
 			err_msg = 'request failed'
-		try:
-			ScholarUtils.log('info', 'requesting %s' % unquote(url))
 
-			req = Request(url=url, headers={'User-Agent': ScholarConf.USER_AGENT})
-			hdl = self.opener.open(req)
-			html = hdl.read()
+		if self.archive is not None and not self.archive.recording:
+			return self._replay(url, err_msg)
+
+		if cacheable and self.cache is not None:
+			html = self.cache.get(self._cache_key(url))
+			if html is not None:
+				ScholarUtils.log('info', 'cache hit for %s' % unquote(url))
+				return html
 
-			ScholarUtils.log('debug', log_msg)
-			ScholarUtils.log('debug', '>>>>' + '-'*68)
-			ScholarUtils.log('debug', 'url: %s' % hdl.geturl())
-			ScholarUtils.log('debug', 'result: %s' % hdl.getcode())
-			ScholarUtils.log('debug', 'headers:\n' + str(hdl.info()))
-			ScholarUtils.log('debug', 'data:\n' + html.decode('utf-8')) # For Python 3
-			ScholarUtils.log('debug', '<<<<' + '-'*68)
+		for _ in range(ScholarConf.RATE_LIMIT_RETRIES + 1):
+			start = time.time()
+			waited = self.limiter.acquire(url)
+			if waited > 0:
+				self.tracer.record('rate_wait', start, waited)
+			if waited > 1:
+				ScholarUtils.log('info', 'rate limit delayed request by %.1f sec' % waited)
 
+			try:
+				ScholarUtils.log('info', 'requesting %s' % unquote(url))
+
+				req = Request(url=url, headers={'User-Agent': ScholarConf.USER_AGENT})
+				start = time.time()
+				with self.tracer.span('request', url=url):
+					hdl = self.opener.open(req)
+					html = hdl.read()
+
+				# Decoding the body is expensive, so only do it if we
+				# actually log it:
+				if ScholarConf.LOG_LEVEL >= ScholarUtils.LOG_LEVELS['debug']:
+					ScholarUtils.log('debug', log_msg)
+					ScholarUtils.log('debug', '>>>>' + '-'*68)
+					ScholarUtils.log('debug', 'url: %s' % hdl.geturl())
+					ScholarUtils.log('debug', 'result: %s' % hdl.getcode())
+					ScholarUtils.log('debug', 'headers:\n' + str(hdl.info()))
+					ScholarUtils.log('debug', 'data:\n' + html.decode('utf-8')) # For Python 3
+					ScholarUtils.log('debug', '<<<<' + '-'*68)
+			except HTTPError as err:
+				if err.code not in self.RATE_LIMIT_CODES:
+					ScholarUtils.log('info', err_msg + ': %s' % err)
+					if self.archive is not None:
+						self.archive.record(url, None, err.code, time.time() - start)
+					return None
+				self._throttled(url, err.headers.get('Retry-After') if err.headers else None)
+				continue
+			except Exception as err:
+				ScholarUtils.log('info', err_msg + ': %s' % err)
+				return None
+
+			if self._is_block_page(hdl.geturl(), html):
+				self._throttled(url)
+				continue
+
+			self.limiter.success(url)
+			if self.archive is not None:
+				self.archive.record(url, html, 200, time.time() - start)
+			if cacheable and self.cache is not None:
+				self.cache.put(self._cache_key(url), html)
 			return html
-		except Exception as err:
-			ScholarUtils.log('info', err_msg + ': %s' % err)
+
+		ScholarUtils.log('info', err_msg + ': still rate limited after %d retries' \
+			% ScholarConf.RATE_LIMIT_RETRIES)
+		return None
+
+	def _replay(self, url, err_msg):
+		with self.tracer.span('replay', url=url):
+			response = self.archive.get(url)
+		if response is None:
+			ScholarUtils.log('info', err_msg + ': not in archive: %s' % unquote(url))
 			return None
+		status, html = response
+		if html is None:
+			ScholarUtils.log('info', err_msg + ': replayed HTTP error %d' % status)
+		return html
+
+	def _throttled(self, url, retry_after=None):
+		rate = self.limiter.throttled(url, retry_after)
+		msg = 'rate limited, slowing down to %.2f requests/sec' % rate
+		if retry_after is not None:
+			msg += ', retry after %s' % retry_after
+		ScholarUtils.log('warn', msg)
+
+	def _is_block_page(self, url, html):
+		"""
+		Predicate telling whether a response that came back fine at
+		the HTTP level is really the site's interstitial for clients
+		it considers abusive.
+		"""
+		for marker in self.BLOCK_URL_MARKERS:
+			if marker in url:
+				return True
+		for marker in self.BLOCK_PAGE_MARKERS:
+			if marker in html:
+				return True
+		return False
+
+def parse_page_records(html, fields=None):
+	"""
+	Parses the given result page like ScholarQuerier does, and returns
+	the number of results the site reports, if any, and the articles as
+	records (see ScholarArticle.as_record()). This is what the worker
+	processes of ScholarQuerier.parse_pool run.
+	"""
+	parser = ScholarQuerier.Parser(None, fields)
+	records = [art.as_record() for art in parser.iter_parse(html)]
+	return parser.num_results, records
 
 def txt(querier, with_globals):
 	if with_globals:
@@ -892,21 +1551,23 @@ def txt(querier, with_globals):
 			if item[0] is not None:
 				print(fmt % (item[1], item[0]))
 		if len(items) > 0:
-			print
+			print('')
 
 	articles = querier.articles
 	for art in articles:
 		print(encode(art.as_txt()) + '\n')
 
-def csv(querier, header=False, sep='|'):
-	articles = querier.articles
+def csv(querier, header=False, sep='|', articles=None):
+	if articles is None:
+		articles = querier.articles
 	for art in articles:
 		result = art.as_csv(header=header, sep=sep)
 		print(encode(result))
 	header = False
 
-def citation_export(querier):
-	articles = querier.articles
+def citation_export(querier, articles=None):
+	if articles is None:
+		articles = querier.articles
 	for art in articles:
 		print(art.as_citation() + '\n')
 
@@ -951,8 +1612,11 @@ def main():
 						help='Do not include citations in results')
 	group.add_option('-C', '--cluster-id', metavar='CLUSTER_ID', default=None,
 						help='Do not search, just use articles in given cluster ID')
+	group.add_option('--cites', metavar='CLUSTER_ID', default=None,
+						help='Do not search, list the articles citing given cluster ID')
 	group.add_option('-c', '--count', type='int', default=None,
-						help='Maximum number of results')
+						help='Maximum number of results. Beyond %d, results get retrieved ' \
+						'across several pages' % ScholarConf.MAX_PAGE_RESULTS)
 	parser.add_option_group(group)
 
 	group = optparse.OptionGroup(parser, 'Output format',
@@ -972,6 +1636,23 @@ def main():
 	group = optparse.OptionGroup(parser, 'Miscellaneous')
 	group.add_option('--cookie-file', metavar='FILE', default=None,
 						help='File to use for cookie storage. If given, will read any existing cookies if found at startup, and save resulting cookies in the end.')
+	group.add_option('--cache-dir', metavar='DIR', default=None,
+						help='Directory for caching responses across sessions. Repeated queries are answered from the cache.')
+	group.add_option('--cache-ttl', metavar='SECONDS', type='int', default=None,
+						help='Number of seconds cached responses stay valid (default one week)')
+	group.add_option('--store', metavar='FILE', default=None,
+						help='SQLite database to record parsed articles in, for later lookups')
+	group.add_option('--record', metavar='FILE', default=None,
+						help='Record all responses in archive FILE, for replaying them later')
+	group.add_option('--replay', metavar='FILE', default=None,
+						help='Serve all responses from archive FILE instead of the network')
+	group.add_option('--replay-latency', metavar='SECONDS', default=None,
+						help='Delay replayed responses by SECONDS, or by their recorded response time if "recorded"')
+	group.add_option('--parse-processes', metavar='N', type='int', default=0,
+						help='Parse result pages in a pool of N worker processes (default 0, in-process)')
+	group.add_option('--trace', metavar='FILE', default=None,
+						help='Record timing spans of requests and parsing, write them ' \
+						'to FILE as JSON lines and print a summary to stderr')
 	group.add_option('-d', '--debug', action='count', default=0,
 						help='Enable verbose logging to stderr. Repeated options increase detail of debug output.')
 	group.add_option('-v', '--version', action='store_true', default=False,
@@ -997,16 +1678,44 @@ def main():
 	if options.cookie_file:
 		ScholarConf.COOKIE_JAR_FILE = options.cookie_file
 
+	if options.cache_dir:
+		ScholarConf.CACHE_DIR = options.cache_dir
+	if options.cache_ttl is not None:
+		ScholarConf.CACHE_TTL = options.cache_ttl
+	if options.store:
+		ScholarConf.STORE_FILE = options.store
+
+	if options.record and options.replay:
+		print('Cannot record and replay at the same time.')
+		return 1
+	if options.record:
+		ScholarConf.ARCHIVE_FILE = options.record
+		ScholarConf.ARCHIVE_MODE = 'record'
+	elif options.replay:
+		ScholarConf.ARCHIVE_FILE = options.replay
+		ScholarConf.ARCHIVE_MODE = 'replay'
+		if options.replay_latency == 'recorded':
+			ScholarConf.ARCHIVE_LATENCY = 'recorded'
+		elif options.replay_latency is not None:
+			ScholarConf.ARCHIVE_LATENCY = float(options.replay_latency)
+
+	if options.parse_processes > 0:
+		ScholarConf.PARSE_PROCESSES = options.parse_processes
+
 	# Sanity-check the options: if they include a cluster ID query, it
 	# makes no sense to have search arguments:
-	if options.cluster_id is not None:
+	if options.cluster_id is not None or options.cites is not None:
 		if options.author or options.allw or options.some or options.none \
 			or options.phrase or options.title_only or options.pub \
 			or options.after or options.before:
 				print('Cluster ID queries do not allow additional search arguments.')
 				return 1
 
-	querier = ScholarQuerier()
+	tracer = None
+	if options.trace:
+		tracer = Tracer()
+
+	querier = ScholarQuerier(tracer=tracer)
 	settings = ScholarSettings()
 
 	if options.citation == 'bt':
@@ -1025,6 +1734,8 @@ def main():
 
 	if options.cluster_id:
 		query = ClusterScholarQuery(cluster=options.cluster_id)
+	elif options.cites:
+		query = CitesScholarQuery(cluster=options.cites)
 	else:
 		query = SearchScholarQuery()
 		if options.author:
@@ -1049,23 +1760,33 @@ def main():
 			query.set_include_citations(False)
 
 	if options.count is not None:
-		options.count = min(options.count, ScholarConf.MAX_PAGE_RESULTS)
-		query.set_num_page_results(options.count)
-
-	querier.send_query(query)
+		if options.count > ScholarConf.MAX_PAGE_RESULTS:
+			query.set_total_results(options.count)
+		query.set_num_page_results(min(options.count, ScholarConf.MAX_PAGE_RESULTS))
 
+	# The CSV and citation formats print articles as they arrive,
+	# while the text format needs the full result set first.
 	if options.csv:
-		csv(querier)
+		csv(querier, articles=querier.iter_articles(query))
 	elif options.csv_header:
-		csv(querier, header=True)
+		csv(querier, header=True, articles=querier.iter_articles(query))
 	elif options.citation is not None:
-		citation_export(querier)
+		citation_export(querier, articles=querier.iter_articles(query))
 	else:
+		querier.send_query(query)
 		txt(querier, with_globals=options.txt_globals)
 
 	if options.cookie_file:
 		querier.save_cookies()
 
+	if querier.cache is not None:
+		ScholarUtils.log('info', 'cache hits: %d, misses: %d' % querier.cache.stats())
+	ScholarUtils.log('info', 'requests saved by coalescing: %d' % querier.flights.stats()[1])
+
+	if tracer is not None:
+		tracer.save(options.trace)
+		sys.stderr.write(tracer.format_summary() + '\n')
+
 	return 0
 
 if __name__ == "__main__":
@@ -1,91 +1,480 @@
+from __future__ import print_function
 
+import os
+import re
 import sys
 import getopt
+import time
+
+from scholar_archive import HttpArchive
+from scholar_batch import BatchQuerier, ProcessPool
+from scholar_cache import ScholarCache
+from scholar_flight import SingleFlight
+from scholar_journal import ResultJournal
+from scholar_match import TitleMatcher, demultiplex
+from scholar_refresh import RefreshPolicy, DAY
+from scholar_store import ArticleStore
+from scholar_trace import Tracer
 
 def usage():
-	print '-f', '--file', 'file containing paper list'
-	print '-d', '--database', 'database to query'
-	print '-y', '--year', 'when papers are published'
-
-
-try:
-	opts, args = getopt.getopt(sys.argv[1:], 'd:y:f:c:', ['database==', 'year==', 'file==', 'conference=='])
-except getopt.GetoptError:
-	usage()
-	sys.exit(2)
-
-
-
-sFile = None
+	print('-f', '--file', 'file containing paper list; may be repeated, further lists can follow the options')
+	print('-d', '--database', 'database to query, google or acm; may be repeated or comma-separated')
+	print('-y', '--year', 'when papers are published (default: from the list\'s file name, e.g. PLDI2011.txt)')
+	print('-c', '--conference', 'where papers are published (default: from the list\'s file name)')
+	print('-j', '--jobs', 'number of concurrent lookups (default 4)')
+	print('--per-host', 'maximum concurrent requests per host (default 2)')
+	print('--parse-processes', 'number of worker processes to parse result pages in (default 0, in the lookup threads)')
+	print('-b', '--batch', 'number of titles to look up per query, demultiplexing the results (default 1)')
+	print('--cache-dir', 'directory for caching responses across runs')
+	print('--journal', 'file recording completed lookups, for resuming (default: <first file>.<database>.journal)')
+	print('--no-journal', 'do not record or resume lookups')
+	print('--store', 'SQLite database of parsed articles; papers found there are not looked up again, and those resolved before get looked up by cluster ID')
+	print('--max-age', 'number of days stored articles stay fresh enough to use (default: no limit; 90 with --refresh)')
+	print('--refresh', 'with --store, look up again only the papers whose citation counts are due for a check, judging by their age and citation velocity, and print their growth')
+	print('--min-age', 'with --refresh, number of days stored articles stay fresh at least (default 1)')
+	print('--record', 'archive file to record all responses in, for replaying the run later')
+	print('--replay', 'archive file to serve all responses from, instead of the network')
+	print('--replay-latency', 'seconds each replayed response takes, or "recorded" for the recorded times (default 0)')
+	print('--trace', 'file to write timing spans to, as JSON lines; prints a summary to stderr')
+
+
+fileList = []
+dbList = []
 sYear = None
-sDB = None
 sConf = None
-
-for opt, arg in opts:
-	if opt in ('-f', '--file'):
-		sFile = arg
-	elif opt in ('-y', '--year'):
-		sYear = arg
-	elif opt in ('-d', '--database'):
-		sDB = arg
-	elif opt in ('-c', '--conference'):
-		sConf = arg
-
-
-if cmp(sDB, 'google') == 0:
-	from google_scholar import * 
-elif cmp(sDB, 'acm') == 0:
-	from acmld import *
-else:
-	usage()
-	sys.exit(2)
+nJobs = 4
+nPerHost = 2
+nParse = 0 # Parsing processes
+nBatch = 1 # Titles per query
+nBatchChars = 256 # Maximum length of the titles packed into one query
+sCacheDir = None
+sJournal = None
+bJournal = True
+sTrace = None
+tracer = None
+sStore = None
+store = None
+nMaxAge = None # Days
+bRefresh = False
+nMinAge = 1 # Days, with bRefresh
+policy = None
+sArchive = None
+sArchiveMode = None # 'record' or 'replay'
+archiveLatency = None
+
+
+def parseOptions(argv):
+	global sYear, sConf, nJobs, nPerHost, nParse, nBatch, sCacheDir, sJournal, bJournal, sTrace, sStore, nMaxAge, bRefresh, nMinAge, sArchive, sArchiveMode, archiveLatency
+
+	try:
+		opts, args = getopt.getopt(argv, 'd:y:f:c:j:b:', ['database==', 'year==', 'file==', 'conference==', 'jobs=', 'per-host=', 'parse-processes=', 'batch=', 'cache-dir=', 'journal=', 'no-journal', 'trace=', 'store=', 'max-age=', 'refresh', 'min-age=', 'record=', 'replay=', 'replay-latency='])
+	except getopt.GetoptError:
+		usage()
+		sys.exit(2)
+
+	for opt, arg in opts:
+		if opt in ('-f', '--file'):
+			fileList.append(arg)
+		elif opt in ('-y', '--year'):
+			sYear = arg
+		elif opt in ('-d', '--database'):
+			dbList.extend([sDB for sDB in arg.split(',') if sDB])
+		elif opt in ('-c', '--conference'):
+			sConf = arg
+		elif opt in ('-j', '--jobs'):
+			nJobs = int(arg)
+		elif opt == '--per-host':
+			nPerHost = int(arg)
+		elif opt == '--parse-processes':
+			nParse = int(arg)
+		elif opt in ('-b', '--batch'):
+			nBatch = int(arg)
+		elif opt == '--cache-dir':
+			sCacheDir = arg
+		elif opt == '--journal':
+			sJournal = arg
+		elif opt == '--no-journal':
+			bJournal = False
+		elif opt == '--trace':
+			sTrace = arg
+		elif opt == '--store':
+			sStore = arg
+		elif opt == '--max-age':
+			nMaxAge = float(arg)
+		elif opt == '--refresh':
+			bRefresh = True
+		elif opt == '--min-age':
+			nMinAge = float(arg)
+		elif opt in ('--record', '--replay'):
+			sArchive = arg
+			sArchiveMode = opt[2:]
+		elif opt == '--replay-latency':
+			archiveLatency = arg if arg == 'recorded' else float(arg)
+
+	fileList.extend(args)
+
+
+class Source(object):
+	"""
+	A database papers get looked up in: its backend module, how to
+	query it and which article fields the lookups need, along with the
+	state of the run against it. The backend gets imported only here,
+	so that the filtering functions below can be imported without
+	one.
+	"""
+	def __init__(self, name):
+		sModule, self.makeQuery, self.makeBatchQuery, self.makeClusterQuery, fields = SOURCES[name]
+		self.fields = list(fields)
+		self.name = name
+		self.backend = __import__(sModule)
+		self.journal = None
+		self.sJournal = None
+		self.nUnresolved = 0 # Papers whose lookup came back empty
+		self.nStored = 0 # Papers answered from the store
+		self.previous = {} # Paper -> (stored records, fetched at), for papers refreshed
+		self.nBatchQueries = 0 # Queries for several papers at once
+		self.nBatchResolved = 0 # Papers resolved by those
+		self.nClusterQueries = 0 # Queries by the cluster ID a paper resolved to before
+		self.nClusterResolved = 0 # Papers resolved by those
+
+	def makeQuerier(self):
+		return self.backend.ScholarQuerier(tracer=tracer)
+
+
+def articleToRecord(art, fields):
+	record = {}
+	for key in fields:
+		record[key] = art[key]
+	return record
+
+
+def recordToArticle(record, backend):
+	art = backend.ScholarArticle()
+	for key in record:
+		art[key] = record[key]
+	return art
+
+
+def makeRefreshPolicy(nMinAge, nMaxAge):
+	"""
+	Returns the RefreshPolicy for the --min-age and --max-age options,
+	in days. Without --max-age, counts get checked at least every 90
+	days; --max-age 0 leaves just --min-age as the interval.
+	"""
+	if nMaxAge == None:
+		nMaxAge = 90
+	return RefreshPolicy(nMinAge * DAY, nMaxAge * DAY)
+
+
+def listVenue(sPaperFile):
+	"""
+	Returns the conference and year a paper list's file name suggests,
+	e.g. ('PLDI', '2011') for PLDI2011.txt, with -c and -y taking
+	precedence.
+	"""
+	sName = os.path.splitext(os.path.basename(sPaperFile))[0]
+	match = re.match(r'^([A-Za-z]+)[-_]?((?:19|20)\d\d)$', sName)
+	if match == None:
+		return sConf, sYear
+	return sConf or match.group(1), sYear or match.group(2)
+
+
+def packPapers(paperList):
+	"""
+	Splits the given papers into groups of at most nBatch titles,
+	nBatchChars characters in all, to be looked up together.
+	"""
+	groups = []
+	group = []
+	nChars = 0
+	for paper in paperList:
+		if len(group) > 0 and (len(group) >= nBatch or nChars + len(paper) > nBatchChars):
+			groups.append(group)
+			group = []
+			nChars = 0
+		group.append(paper)
+		nChars += len(paper)
+	if len(group) > 0:
+		groups.append(group)
+	return groups
+
+
+def batchQuery(sources, paperLists):
+	"""
+	Looks up the papers of all given lists in every given source,
+	through one pool of concurrent workers, and returns a dictionary
+	mapping each source name to a dictionary mapping each paper to the
+	articles its query produced. A paper on several lists gets looked
+	up once per source. Only the article fields a source needs get
+	parsed. With a journal, papers resolved by an earlier, interrupted
+	run are taken from it instead of being looked up again, and every
+	new lookup that finds articles gets journaled as soon as it
+	completes. With a store, papers it holds articles for that are
+	recent enough get answered from it as well. With a refresh policy,
+	that is all papers the policy does not consider due for a check;
+	the stored articles of those looked up again go to the source's
+	previous dictionary, and stand in for the ones a failed lookup
+	did not produce.
+
+	paperLists holds (conference, year, papers) triplets; the former
+	two help to pick the right articles among the results.
+
+	If nBatch is above 1, the papers get looked up several at a time
+	first, through a query for any of their titles, and the results
+	demultiplexed by title (see scholar_match.demultiplex). Only
+	papers left without a match get a query of their own.
+
+	Papers the store knows the cluster ID of, from an earlier run (see
+	rememberClusters()), get looked up by that ID before anything
+	else, with one small query each whose single result needs no
+	matching. Only if that fails do they get searched for by title.
+	"""
+	results = {}
+	pending = [] # (source, paper) pairs left to look up
+	groups = [] # (source, conference, year, papers) to look up together
+	clusters = [] # (source, paper, cluster ID) to look up by cluster ID
+
+	for source in sources:
+		found = results[source.name] = {}
+		if source.journal != None:
+			for paper, records in source.journal.load().items():
+				found[paper] = [recordToArticle(record, source.backend) for record in records]
+			if len(found) > 0:
+				sys.stderr.write('resuming: %d papers already resolved in %s\n' % (len(found), source.name))
+
+		source.nStored = 0
+		seen = set()
+		for sListConf, sListYear, paperList in paperLists:
+			papers = []
+			for paper in paperList:
+				if paper in seen or paper in found:
+					continue
+				seen.add(paper)
+
+				if store != None and policy != None:
+					entries = store.find_title_entries(source.backend.ScholarQuerier.STORE_SOURCE, paper)
+					if len(entries) > 0:
+						key, fetchedAt, _ = entries[0]
+						records = [data for _, _, data in entries]
+						if not policy.is_stale(store.history(key), fetchedAt, sListYear):
+							found[paper] = [recordToArticle(record, source.backend) for record in records]
+							source.nStored += 1
+							continue
+						source.previous[paper] = (records, fetchedAt)
+				elif store != None:
+					maxAge = nMaxAge * 86400 if nMaxAge != None else None
+					records = store.find_title(source.backend.ScholarQuerier.STORE_SOURCE, paper, maxAge)
+					if len(records) > 0:
+						found[paper] = [recordToArticle(record, source.backend) for record in records]
+						source.nStored += 1
+						continue
+
+				if store != None and source.makeClusterQuery != None:
+					sCluster = store.find_title_cluster(source.backend.ScholarQuerier.STORE_SOURCE, paper)
+					if sCluster != None:
+						clusters.append((source, paper, sCluster))
+						continue
+				papers.append(paper)
+
+			pending.extend([(source, paper) for paper in papers])
+			if nBatch > 1:
+				for group in packPapers(papers):
+					if len(group) > 1:
+						groups.append((source, sListConf, sListYear, group))
+
+	def record(key, articles):
+		source, paper = key
+		results[source.name][paper] = articles
+		# Empty results may stem from a failed request, so those get
+		# retried on the next run.
+		if source.journal != None and len(articles) > 0:
+			source.journal.append(paper, [articleToRecord(art, source.fields) for art in articles])
+
+	def recordBatch(key, articles):
+		source, sListConf, sListYear, papers = key
+		for paper, matched in demultiplex(papers, articles, sListYear, sListConf).items():
+			record((source, paper), matched)
+
+	batch = BatchQuerier(None, num_workers=nJobs, per_host=nPerHost)
+
+	if len(clusters) > 0:
+		jobs = []
+		for source, paper, sCluster in clusters:
+			jobs.append(((source, paper), source.makeClusterQuery(source.backend, sCluster),
+						source.makeQuerier, source.fields))
+			source.nClusterQueries += 1
+		batch.run(jobs, record)
+
+		# Clusters may get merged or split, so failures fall back to a
+		# title search:
+		for source, paper, _ in clusters:
+			if len(results[source.name].get(paper, [])) > 0:
+				source.nClusterResolved += 1
+			else:
+				results[source.name].pop(paper, None)
+				pending.append((source, paper))
+
+	if len(groups) > 0:
+		jobs = []
+		for source, sListConf, sListYear, group in groups:
+			jobs.append(((source, sListConf, sListYear, tuple(group)),
+						source.makeBatchQuery(source.backend, group),
+						source.makeQuerier, source.fields))
+			source.nBatchQueries += 1
+		batch.run(jobs, recordBatch)
+
+		for source, paper in pending:
+			if paper in results[source.name]:
+				source.nBatchResolved += 1
+		pending = [(source, paper) for source, paper in pending if paper not in results[source.name]]
+
+	jobs = []
+	for source, paper in pending:
+		jobs.append(((source, paper), source.makeQuery(source.backend, paper),
+					source.makeQuerier, source.fields))
+	batch.run(jobs, record)
+
+	# Stale articles beat none:
+	for source in sources:
+		for paper in list(source.previous):
+			if len(results[source.name].get(paper, [])) == 0:
+				records, _ = source.previous.pop(paper)
+				results[source.name][paper] = [recordToArticle(record, source.backend) for record in records]
+
+	for source in sources:
+		unresolved = set()
+		for _, _, paperList in paperLists:
+			for paper in paperList:
+				if len(results[source.name].get(paper, [])) == 0:
+					unresolved.add(paper)
+		source.nUnresolved = len(unresolved)
+
+	return results
+
+
+def makeGoogleQuery(backend, paper):
+	query = backend.SearchScholarQuery()
+	query.set_scope(True)
+	query.set_words(paper)
+	return query
 
 
+def makeGoogleClusterQuery(backend, sCluster):
+	query = backend.ClusterScholarQuery(cluster=sCluster)
+	query.set_num_page_results(1)
+	return query
 
 
-def queryGoogleCitation(paperList):
+def makeGoogleBatchQuery(backend, papers):
+	# Scholar takes the phrases comma-separated, so commas and quotes
+	# within titles have to go.
+	phrases = []
+	for paper in papers:
+		phrases.append(' '.join(paper.replace(',', ' ').replace('"', ' ').split()))
 
-	querier = ScholarQuerier()
-	query = SearchScholarQuery()
+	query = backend.SearchScholarQuery()
 	query.set_scope(True)
-
+	query.set_words_some(', '.join(phrases))
+	return query
+
+
+def resolvePaper(paper, articles, sYear=None, sConf=None):
+	"""
+	Picks the article among the search results that is the given
+	paper, judging by title, year and venue. Returns it, or None if
+	none matches with enough confidence. If Scholar lists the paper
+	several times, the most cited entry wins among those agreeing
+	with the year and venue as well as the best match does.
+	"""
+	if len(articles) == 1:
+		return articles[0]
+
+	matcher = TitleMatcher(year=sYear, venue=sConf).add_all(articles)
+	best, confidence = matcher.match(paper)
+	if best == None:
+		return None
+
+	context = matcher.context_score(best)
+	for art in articles:
+		if art is not best and art['title'] == best['title'] \
+			and matcher.context_score(art) == context \
+			and int(art['num_citations']) > int(best['num_citations']):
+			best = art
+	return best
+
+
+def queryCitation(paperList, results, sYear=None, sConf=None):
+	"""
+	Resolves each paper of the list among the articles its lookup
+	produced, and returns dictionaries mapping the papers resolved to
+	their citation counts and articles. Unresolved papers get printed
+	along with the number of articles found.
+	"""
 	citationDict = {}
+	articleDict = {}
 
-	for paper in paperList:	
-		query.set_words(paper)
-		querier.send_query(query)
-
-		articles = querier.articles
-
-		if len(articles) != 1:			
-			nameCitation = {}
-			for art in articles:
-				if art.attrs['title'][0] in nameCitation:
-					if int(articles[0].attrs['num_citations'][0]) > nameCitation[art.attrs['title'][0]]:
-						nameCitation[art.attrs['title'][0]] = int(articles[0].attrs['num_citations'][0])
-				else:
-					nameCitation[art.attrs['title'][0]] = int(articles[0].attrs['num_citations'][0])
-
-			maxLength = 10000
+	for paper in paperList:
+		articles = results.get(paper, [])
+		art = resolvePaper(paper, articles, sYear, sConf)
 
-			for key in nameCitation:
-				if len(key) < maxLength:
-					maxLength = len(key)
-					paper = key
+		if art == None:
+			print(paper, len(articles))
+		else:
+			citationDict[paper] = int(art['num_citations'])
+			articleDict[paper] = art
 
-			citationDict[paper] = nameCitation[paper]
+	return citationDict, articleDict
 
-		else:
-			citationDict[paper] = int(articles[0].attrs['num_citations'][0])
 
-	return citationDict
+def paperGrowth(citationDict, previous, backend, sYear=None, sConf=None):
+	"""
+	Returns (paper, change in citations, count before, days since)
+	tuples for the papers both resolved now and among the previous
+	lookups, as recorded by batchQuery() for the papers refreshed.
+	"""
+	growth = []
+	now = time.time()
+	for paper in citationDict:
+		if paper not in previous:
+			continue
+		records, fetchedAt = previous[paper]
+		old = resolvePaper(paper, [recordToArticle(record, backend) for record in records], sYear, sConf)
+		if old == None or old['num_citations'] == None:
+			continue
+		nBefore = int(old['num_citations'])
+		growth.append((paper, citationDict[paper] - nBefore, nBefore, (now - fetchedAt) / 86400))
+	return growth
+
+
+def printGrowth(growth):
+	for paper, nDelta, nBefore, nDays in sorted(growth, key=lambda item: item[1], reverse=True):
+		print(paper, '%+d' % nDelta, '(%d -> %d in %.1f days)' % (nBefore, nBefore + nDelta, nDays))
+
+
+def rememberClusters(source, articleDict):
+	"""
+	Records the cluster IDs the papers resolved to in the store, for
+	batchQuery() to look them up by in later runs.
+	"""
+	clusterDict = {}
+	for paper, art in articleDict.items():
+		if art['cluster_id'] != None:
+			clusterDict[paper] = art['cluster_id']
+	store.put_title_clusters(source.backend.ScholarQuerier.STORE_SOURCE, clusterDict)
+
+
+def printRanking(citationDict, articleDict, backend):
+	for w in sorted(citationDict, key=citationDict.get, reverse=True):
+		print(w, citationDict[w])
+		print(backend.encode(articleDict[w].as_txt()) + '\n')
 
 
 def filterByYear(articles, sYear):
 	artList = []
 
 	for art in articles:
-		if art.attrs['date'][0] != None and art.attrs['date'][0].find(sYear) != -1:
+		sDate = art['date']
+		if sDate != None and sDate.find(sYear) != -1:
 			artList.append(art)
 
 	return artList
@@ -94,7 +483,8 @@ def filterByConference(articles, sConf):
 	artList = []
 
 	for art in articles:
-		if art.attrs['conference'][0] != None and art.attrs['conference'][0].find(sConf) != -1:
+		sArtConf = art['conference']
+		if sArtConf != None and sArtConf.find(sConf) != -1:
 			artList.append(art)
 
 	return artList
@@ -107,9 +497,10 @@ def filterByTitle(articles, sTitle):
 
 	for art in articles:
 		flag = True
+		sArtTitle = art['title']
 
 		for word in wordList:
-			if art.attrs['title'][0] != None and art.attrs['title'][0].find(word) == -1:
+			if sArtTitle != None and sArtTitle.find(word) == -1:
 				flag = False
 				break
 
@@ -120,57 +511,166 @@ def filterByTitle(articles, sTitle):
 
 
 
-def queryACMCitation(paperList):
-	querier = ScholarQuerier()
-	query = SearchScholarQuery()
+def makeACMQuery(backend, paper):
+	query = backend.SearchScholarQuery()
+	query.set_title(paper)
+	return query
 
-	
-	citationDict = {}
-	articleDict = {}
 
-	for paper in paperList:
-		query.set_title(paper)
-		querier.send_query(query)
+def makeACMBatchQuery(backend, papers):
+	query = backend.SearchScholarQuery()
+	query.set_titles(papers)
+	return query
 
-		articles = querier.articles
 
-		if len(articles) != 1:
-			articles = filterByYear(articles, sYear)			
-			articles = filterByConference(articles, sConf)
-			articles = filterByTitle(articles, paper)
+# Per database: the backend module, the query builders for one and for
+# several papers and for a cluster ID (if the database has clusters),
+# and the article fields the lookups need.
+SOURCES = {
+	'google': ('google_scholar', makeGoogleQuery, makeGoogleBatchQuery, makeGoogleClusterQuery,
+				['title', 'year', 'num_citations']),
+	'acm': ('acmld', makeACMQuery, makeACMBatchQuery, None,
+			['title', 'url', 'date', 'conference', 'num_citations']),
+}
 
-			if len(articles) != 1:
-				print paper, len(articles)
+if __name__=='__main__':
+	parseOptions(sys.argv[1:])
+
+	if len(fileList) == 0 or len(dbList) == 0:
+		usage()
+		sys.exit(2)
+	for sDB in dbList:
+		if sDB not in SOURCES:
+			usage()
+			sys.exit(2)
+
+	sources = [Source(sDB) for sDB in dbList]
+
+	for source in sources:
+		if sCacheDir != None:
+			source.backend.ScholarConf.CACHE_DIR = sCacheDir
+		if sStore != None:
+			source.backend.ScholarConf.STORE_FILE = sStore
+		if sArchive != None:
+			source.backend.ScholarConf.ARCHIVE_FILE = sArchive
+			source.backend.ScholarConf.ARCHIVE_MODE = sArchiveMode
+			source.backend.ScholarConf.ARCHIVE_LATENCY = archiveLatency
+		if nParse > 0:
+			source.backend.ScholarConf.PARSE_PROCESSES = nParse
+
+	# The parsing processes get started before any lookup threads:
+	if nParse > 0:
+		ProcessPool.shared(nParse)
+
+	paperLists = []
+	for sPaperFile in fileList:
+		with open(sPaperFile) as f:
+			paperList = f.read().splitlines()
+		sListConf, sListYear = listVenue(sPaperFile)
+		paperLists.append((sListConf, sListYear, paperList))
+
+	if sTrace != None:
+		tracer = Tracer()
+
+	if sStore != None:
+		store = ArticleStore.shared(sStore)
+		# Lookups by cluster ID need to know the ones papers resolve to:
+		for source in sources:
+			if source.makeClusterQuery != None:
+				source.fields.append('cluster_id')
+		if bRefresh:
+			policy = makeRefreshPolicy(nMinAge, nMaxAge)
+	elif bRefresh:
+		usage()
+		sys.exit(2)
+
+	if bJournal:
+		for source in sources:
+			if sJournal == None:
+				source.sJournal = '%s.%s.journal' % (fileList[0], source.name)
+			elif len(sources) > 1:
+				source.sJournal = '%s.%s' % (sJournal, source.name)
 			else:
-				citationDict[paper] = int(articles[0].attrs['num_citations'][0])
-				articleDict[paper] = articles[0]
-
+				source.sJournal = sJournal
+			source.journal = ResultJournal(source.sJournal)
+
+	try:
+		results = batchQuery(sources, paperLists)
+	finally:
+		for source in sources:
+			if source.journal != None:
+				source.journal.close()
+
+	# With a single list and source, just that ranking gets printed;
+	# otherwise one per list and source, and per source one across all
+	# lists.
+	bSections = len(sources) > 1 or len(paperLists) > 1
+
+	for source in sources:
+		mergedCitations = {}
+		mergedArticles = {}
+		rankings = []
+		growth = []
+		for sPaperFile, (sListConf, sListYear, paperList) in zip(fileList, paperLists):
+			if bSections:
+				print('== %s, %s: unresolved ==' % (sPaperFile, source.name))
+			citationDict, articleDict = queryCitation(paperList, results[source.name], sListYear, sListConf)
+			rankings.append((sPaperFile, citationDict, articleDict))
+			if store != None and source.makeClusterQuery != None:
+				rememberClusters(source, articleDict)
+			growth.extend(paperGrowth(citationDict, source.previous, source.backend, sListYear, sListConf))
+			mergedCitations.update(citationDict)
+			mergedArticles.update(articleDict)
+
+		print()
+		print()
+
+		for sPaperFile, citationDict, articleDict in rankings:
+			if bSections:
+				print('== %s, %s ==' % (sPaperFile, source.name))
+			printRanking(citationDict, articleDict, source.backend)
+
+		if len(paperLists) > 1:
+			print('== all lists, %s ==' % source.name)
+			printRanking(mergedCitations, mergedArticles, source.backend)
+
+		if policy != None:
+			print('== growth, %s ==' % source.name)
+			printGrowth(growth)
+
+
+
+	if tracer != None:
+		tracer.save(sTrace)
+		sys.stderr.write(tracer.format_summary() + '\n')
+
+	for source in sources:
+		if source.nBatchQueries > 0:
+			sys.stderr.write('%s: batched: %d queries resolved %d papers\n' \
+							% (source.name, source.nBatchQueries, source.nBatchResolved))
+		if source.nClusterQueries > 0:
+			sys.stderr.write('%s: by cluster ID: %d queries resolved %d papers\n' \
+							% (source.name, source.nClusterQueries, source.nClusterResolved))
+		if policy != None:
+			sys.stderr.write('%s: refreshed: %d papers, still fresh: %d\n' \
+							% (source.name, len(source.previous), source.nStored))
+		elif store != None:
+			sys.stderr.write('%s: answered from store: %d papers\n' % (source.name, source.nStored))
+		sys.stderr.write('%s: requests saved by coalescing: %d\n' \
+						% (source.name, SingleFlight.shared(source.backend.ScholarConf.SCHOLAR_SITE).stats()[1]))
+
+	if sArchive != None and sArchiveMode == 'replay':
+		sys.stderr.write('replayed: %d, not in archive: %d\n' % HttpArchive.shared(sArchive).stats())
+
+	if sCacheDir != None:
+		sys.stderr.write('cache hits: %d, misses: %d\n' % ScholarCache.shared(sCacheDir).stats())
+
+	# Once every paper is resolved, there is nothing left to resume:
+	for source in sources:
+		if source.journal == None:
+			continue
+		if source.nUnresolved == 0:
+			source.journal.remove()
 		else:
-			citationDict[paper] = int(articles[0].attrs['num_citations'][0])
-			articleDict[paper] = articles[0]
-
-	#txt(querier)
-
-	return citationDict, articleDict
-
-if __name__=='__main__':
-	sPaperFile = sFile
-
-	with open(sPaperFile) as f:
-		paperList = f.read().splitlines()
-
-
-	if cmp(sDB, 'google') == 0:
-		citationDict = queryGoogleCitation(paperList)
-	elif cmp(sDB, 'acm') == 0:
-		citationDict, articleDict = queryACMCitation(paperList)
-
-
-	print 
-	print
-
-	for w in sorted(citationDict, key=citationDict.get, reverse=True):
-		print w, citationDict[w]
-		print(encode(articleDict[w].as_txt()) + '\n')
-
-
+			sys.stderr.write('%s: %d papers unresolved, rerun to retry them (journal: %s)\n' \
+							% (source.name, source.nUnresolved, source.sJournal))
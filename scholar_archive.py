@@ -0,0 +1,203 @@
+#
+# Record/replay archive of HTTP responses, for rerunning the queriers
+# in google_scholar.py and acmld.py offline against exactly the same
+# responses.
+#
+
+import json
+import os
+import threading
+import time
+import zlib
+
+from scholar_flight import canonical_url
+
+
+class HttpArchive(object):
+	"""
+	HttpArchive records the responses to the requests a querier sends,
+	and serves them again in place of the network. The archive is a
+	single append-only file of records, each a JSON header line (URL,
+	HTTP status, body length, response time) followed by the
+	zlib-compressed body. Replaying scans the headers once, seeking
+	past the bodies, to index the records by canonical URL (see
+	scholar_flight.canonical_url); a URL recorded more than once maps
+	to its latest record. Records damaged by an interrupted recording
+	get skipped, and recording again first cuts off a damaged tail.
+
+	In 'record' mode, record() appends to the archive. In 'replay'
+	mode, get() serves from it, optionally with simulated latency:
+	latency may be a fixed number of seconds per response, or
+	'recorded' to reproduce the response times seen when recording.
+	Instances are thread-safe and meant to be shared, see shared().
+	"""
+	RECORD = 'record'
+	REPLAY = 'replay'
+
+	# Every header starts so, its keys being sorted:
+	HEADER_START = b'{"elapsed": '
+	SCAN_CHUNK = 64*1024
+
+	# One instance per archive file, see shared():
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self, path, mode=REPLAY, latency=None):
+		if mode not in (self.RECORD, self.REPLAY):
+			raise ValueError('archive mode must be "record" or "replay", is "%s"' % mode)
+		self.path = path
+		self.mode = mode
+		self.latency = latency
+		self.lock = threading.Lock()
+		self.hdl = None
+		self.index = None # canonical URL -> (offset, header), once loaded
+		self.hits = 0
+		self.misses = 0
+
+	@classmethod
+	def shared(cls, path, mode=REPLAY, latency=None):
+		"""
+		Returns the process-wide archive for the given file, opening it
+		with the given arguments if needed.
+		"""
+		key = os.path.abspath(path)
+		with cls._instances_lock:
+			if key not in cls._instances:
+				cls._instances[key] = cls(path, mode, latency)
+			return cls._instances[key]
+
+	@property
+	def recording(self):
+		return self.mode == self.RECORD
+
+	def record(self, url, body, status=200, elapsed=0.0):
+		"""
+		Appends the response to a request for url: its body (None for
+		failed requests), HTTP status and response time in seconds.
+		"""
+		data = zlib.compress(body or b'')
+		header = json.dumps({'url': canonical_url(url),
+							'status': status,
+							'length': len(data),
+							'elapsed': round(elapsed, 4)}, sort_keys=True)
+
+		with self.lock:
+			if self.hdl is None:
+				_, end = self._scan()
+				self.hdl = open(self.path, 'ab')
+				# Drop what an interrupted recording left half written:
+				self.hdl.truncate(end)
+			self.hdl.write(header.encode('utf-8') + b'\n')
+			self.hdl.write(data)
+			self.hdl.flush()
+
+	def get(self, url):
+		"""
+		Returns the recorded (status, body) pair for a request for url,
+		after the configured latency, or None if the archive holds no
+		response for it.
+		"""
+		key = canonical_url(url)
+		with self.lock:
+			if self.index is None:
+				self.index = self._load_index()
+			entry = self.index.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			self.hits += 1
+
+			offset, header = entry
+			if self.hdl is None:
+				self.hdl = open(self.path, 'rb')
+			self.hdl.seek(offset)
+			data = self.hdl.read(header['length'])
+
+		if self.latency == 'recorded':
+			time.sleep(header.get('elapsed', 0))
+		elif self.latency:
+			time.sleep(self.latency)
+
+		body = zlib.decompress(data)
+		if header['status'] != 200:
+			body = None
+		return header['status'], body
+
+	def stats(self):
+		"""Returns the number of replay hits and misses."""
+		with self.lock:
+			return self.hits, self.misses
+
+	def close(self):
+		with self.lock:
+			if self.hdl is not None:
+				self.hdl.close()
+				self.hdl = None
+
+	def _load_index(self):
+		index = {}
+		records, _ = self._scan()
+		for offset, header in records:
+			index[header['url']] = (offset, header)
+		return index
+
+	def _scan(self):
+		"""
+		Returns the intact records of the archive, as (body offset,
+		header) pairs in file order, and the offset just past the last
+		one. A record counts as intact if a header or the end of the
+		file follows its body. Scanning resumes past damaged records,
+		e.g. one an interrupted recording cut short, at the next
+		header.
+		"""
+		records = []
+		end = 0
+		if not os.path.exists(self.path):
+			return records, end
+
+		size = os.path.getsize(self.path)
+		pos = 0
+		with open(self.path, 'rb') as hdl:
+			while pos < size:
+				hdl.seek(pos)
+				line = hdl.readline()
+				offset = pos + len(line)
+				header = self._parse_header(line)
+				if header is not None and offset + header['length'] <= size:
+					hdl.seek(offset + header['length'])
+					following = hdl.read(len(self.HEADER_START))
+					if following in (b'', self.HEADER_START):
+						records.append((offset, header))
+						pos = end = offset + header['length']
+						continue
+
+				pos = self._find_header(hdl, pos + 1)
+				if pos is None:
+					break
+		return records, end
+
+	@staticmethod
+	def _parse_header(line):
+		"""Returns the header in the given line, or None if it is none."""
+		try:
+			header = json.loads(line.decode('utf-8'))
+			valid = 'url' in header and 'status' in header \
+				and isinstance(header['length'], int) and header['length'] >= 0
+		except (ValueError, KeyError, TypeError):
+			return None
+		return header if valid else None
+
+	def _find_header(self, hdl, pos):
+		"""Returns the offset of the next header start from pos on, or None."""
+		hdl.seek(pos)
+		tail = b''
+		while True:
+			chunk = hdl.read(self.SCAN_CHUNK)
+			if not chunk:
+				return None
+			data = tail + chunk
+			idx = data.find(self.HEADER_START)
+			if idx >= 0:
+				return pos - len(tail) + idx
+			tail = data[-(len(self.HEADER_START) - 1):]
+			pos += len(chunk)
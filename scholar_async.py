@@ -0,0 +1,384 @@
+#
+# asyncio-based variant of the queriers in google_scholar.py and
+# acmld.py. This module needs Python 3.7 or newer; the rest of the
+# scripts keep working on Python 2.
+#
+# Requests share the response cache, the cookie jar and the rate
+# limiter with the blocking queriers, and honor the environment's
+# proxy settings. Unlike the blocking queriers, they neither coalesce
+# with identical requests in flight nor go through the HTTP archive.
+#
+
+import asyncio
+import email.parser
+import http.client
+import zlib
+
+from urllib.error import HTTPError
+from urllib.parse import unquote, urljoin, urlsplit
+from urllib.request import Request, getproxies
+
+
+class AsyncScholarQuerier(object):
+	"""
+	AsyncScholarQuerier mirrors ScholarQuerier, but its network and
+	parsing methods are coroutines, so a single process can keep many
+	requests in flight without a thread per request. It works with
+	either backend module: pass google_scholar or acmld. Responses are
+	fetched with a small non-blocking HTTP/1.1 client on top of
+	asyncio streams, and the CPU-bound BeautifulSoup parsing runs in
+	an executor, off the event loop. At most max_concurrency requests
+	are in flight at any time.
+
+	send_query() behaves like its blocking counterpart and leaves the
+	results in the articles member. For concurrent lookups use
+	lookup() or lookup_many(), which return the articles instead of
+	storing them. Cancelling any of these coroutines aborts the
+	outstanding requests cleanly.
+	"""
+	MAX_REDIRECTS = 5
+
+	class _ArticleSink(object):
+		"""
+		Stands in for the querier that the backend's Parser reports
+		results to, collecting articles instead of fetching their
+		citation data right away.
+		"""
+		def __init__(self):
+			self.articles = []
+
+		def add_article(self, art):
+			self.articles.append(art)
+
+	def __init__(self, backend, max_concurrency=8, executor=None, timeout=30):
+		self.backend = backend
+		self.articles = []
+		self.query = None
+		self.executor = executor
+		self.timeout = timeout
+		self.max_concurrency = max_concurrency
+		self._slots = None
+
+		# Reuse the blocking querier for the cookie jar and the
+		# response cache, so both flavors share their state:
+		self.sync_querier = backend.ScholarQuerier()
+		self.cjar = self.sync_querier.cjar
+		self.cache = self.sync_querier.cache
+		self.limiter = self.sync_querier.limiter
+		self.proxies = getproxies()
+		self.settings = None
+
+	async def apply_settings(self, settings):
+		"""
+		Applies settings as provided by a ScholarSettings instance. Only
+		meaningful for the google_scholar backend.
+		"""
+		if settings is None or not settings.is_configured():
+			return True
+		querier = self.sync_querier
+		if not hasattr(querier, 'GET_SETTINGS_URL'):
+			return False
+
+		self.settings = settings
+		html = await self._get_http_response(querier.GET_SETTINGS_URL,
+											err_msg='requesting settings failed',
+											cacheable=False)
+		if html is None:
+			return False
+
+		soup = await self._run_in_executor(self.backend.BeautifulSoup, html)
+		tag = soup.find(name='form', attrs={'id': 'gs_settings_form'})
+		if tag is not None:
+			tag = tag.find('input', attrs={'type':'hidden', 'name':'scisig'})
+		if tag is None:
+			self._log('info', 'parsing settings failed')
+			return False
+
+		urlargs = {'scisig': tag['value'],
+					'num': settings.per_page_results,
+					'scis': 'no',
+					'scisf': ''}
+
+		if settings.citform != 0:
+			urlargs['scis'] = 'yes'
+			urlargs['scisf'] = '&scisf=%d' % settings.citform
+
+		html = await self._get_http_response(querier.SET_SETTINGS_URL % urlargs,
+											err_msg='applying setttings failed',
+											cacheable=False)
+		if html is None:
+			return False
+
+		self._log('info', 'settings applied')
+		return True
+
+	async def send_query(self, query, fields=None):
+		"""
+		This coroutine initiates a search query (a ScholarQuery
+		instance) with subsequent parsing of the response. The results
+		end up in the articles member.
+		"""
+		self.clear_articles()
+		self.query = query
+		self.articles = await self.lookup(query, fields)
+
+	async def lookup(self, query, fields=None):
+		"""
+		Sends the query, parses the response and retrieves citation
+		data as configured. Returns the list of ScholarArticle
+		instances, an empty one if the request failed. If fields is
+		given, only those article attributes get extracted.
+		"""
+		html = await self._get_http_response(query.get_url(),
+											err_msg='results retrieval failed')
+		if html is None:
+			return []
+
+		articles = await self.parse(html, fields)
+		if self.settings is not None and self.settings.citform != 0:
+			await asyncio.gather(*[self.get_citation_data(art) for art in articles])
+		return articles
+
+	async def lookup_many(self, queries, fields=None):
+		"""
+		Runs lookup() on all queries concurrently, within the
+		concurrency bound, and returns the article lists in query
+		order.
+		"""
+		return await asyncio.gather(*[self.lookup(query, fields) for query in queries])
+
+	async def get_citation_data(self, article):
+		"""
+		Given an article, retrieves its citation export data. See
+		ScholarQuerier.get_citation_data().
+		"""
+		if article['url_citation'] is None:
+			return False
+		if article.citation_data is not None:
+			return True
+
+		# Export URLs depend on the result's position, so the blocking
+		# querier does not cache them by URL either:
+		self._log('info', 'retrieving citation export data')
+		data = await self._get_http_response(article['url_citation'],
+											err_msg='requesting citation data failed',
+											cacheable=False)
+		if data is None:
+			return False
+
+		article.set_citation_data(data)
+		return True
+
+	async def parse(self, html, fields=None):
+		"""
+		Parses the provided HTML content in the executor and returns the
+		resulting articles.
+		"""
+		return await self._run_in_executor(self._parse, html, fields)
+
+	def clear_articles(self):
+		"""Clears any existing articles stored from previous queries."""
+		self.articles = []
+
+	def _parse(self, html, fields):
+		sink = self._ArticleSink()
+		parser = self.backend.ScholarQuerier.Parser(sink, fields)
+		parser.parse(html)
+		return sink.articles
+
+	async def _run_in_executor(self, func, *args):
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(self.executor, func, *args)
+
+	async def _get_http_response(self, url, err_msg=None, cacheable=True):
+		"""
+		Coroutine counterpart of ScholarQuerier._get_http_response():
+		returns the response payload, or None if the request failed.
+		Requests go through the rate limiter; those the site rejects as
+		too frequent get retried after backing off. The cache's file
+		I/O runs in the executor.
+		"""
+		if err_msg is None:
+			err_msg = 'request failed'
+
+		if cacheable and self.cache is not None:
+			html = await self._run_in_executor(self.cache.get, self._cache_key(url))
+			if html is not None:
+				self._log('info', 'cache hit for %s' % unquote(url))
+				return html
+
+		if self._slots is None:
+			# Created lazily, so that it binds to the running loop.
+			self._slots = asyncio.Semaphore(self.max_concurrency)
+
+		querier = self.sync_querier
+		retries = self.backend.ScholarConf.RATE_LIMIT_RETRIES
+		for _ in range(retries + 1):
+			await self._acquire(url)
+			try:
+				async with self._slots:
+					self._log('info', 'requesting %s' % unquote(url))
+					status, headers, final_url, html = \
+						await asyncio.wait_for(self._fetch(url), self.timeout)
+			except asyncio.CancelledError:
+				raise
+			except Exception as err:
+				self._log('info', err_msg + ': %s' % err)
+				return None
+
+			if status in querier.RATE_LIMIT_CODES \
+				or (status < 400 and querier._is_block_page(final_url, html)):
+				querier._throttled(url, headers.get('Retry-After') if headers else None)
+				continue
+			if status >= 400:
+				self._log('info', err_msg + ': HTTP Error %d' % status)
+				return None
+
+			self.limiter.success(url)
+			if cacheable and self.cache is not None:
+				await self._run_in_executor(self.cache.put, self._cache_key(url), html)
+			return html
+
+		self._log('info', err_msg + ': still rate limited after %d retries' % retries)
+		return None
+
+	async def _acquire(self, url):
+		"""
+		Waits until the rate limiter lets a request to the host of the
+		given URL go out, without blocking the loop.
+		"""
+		while True:
+			delay = self.limiter.try_acquire(url)
+			if delay <= 0:
+				return
+			await asyncio.sleep(delay)
+
+	def _cache_key(self, url):
+		"""
+		Returns the key of the given URL's response in the cache, like
+		ScholarQuerier._cache_key() for the settings applied here.
+		"""
+		if self.settings is None or self.settings.citform == 0:
+			return url
+		return 'citform:%d:%s' % (self.settings.citform, url)
+
+	async def _fetch(self, url):
+		"""
+		Retrieves the given URL, following redirects, and returns a
+		(status, headers, final URL, body) tuple.
+		"""
+		if urlsplit(url).scheme in self.proxies:
+			return await self._run_in_executor(self._proxy_request, url)
+
+		for _ in range(self.MAX_REDIRECTS + 1):
+			status, headers, body = await self._request(url)
+			if status in (301, 302, 303, 307, 308) and headers.get('Location'):
+				url = urljoin(url, headers.get('Location'))
+				continue
+			return status, headers, url, body
+		raise IOError('too many redirects')
+
+	def _proxy_request(self, url):
+		"""
+		Retrieves the given URL through the environment's proxy, with
+		the blocking querier's opener, and returns the same tuple as
+		_fetch(). This runs in the executor.
+		"""
+		req = Request(url=url, headers={'User-Agent': self.backend.ScholarConf.USER_AGENT})
+		try:
+			hdl = self.sync_querier.opener.open(req)
+		except HTTPError as err:
+			return err.code, err.headers, url, err.read() if err.fp is not None else b''
+		return hdl.getcode(), hdl.info(), hdl.geturl(), hdl.read()
+
+	async def _request(self, url):
+		"""
+		Sends a single GET request and returns a (status, headers,
+		body) tuple, with the body already decompressed.
+		"""
+		parts = urlsplit(url)
+		secure = parts.scheme == 'https'
+		port = parts.port or (443 if secure else 80)
+		path = parts.path or '/'
+		if parts.query:
+			path += '?' + parts.query
+
+		req = Request(url=url, headers={'User-Agent': self.backend.ScholarConf.USER_AGENT})
+		self.cjar.add_cookie_header(req)
+
+		lines = ['GET %s HTTP/1.1' % path,
+				'Host: %s' % parts.netloc,
+				'Accept-Encoding: gzip, deflate',
+				'Connection: close']
+		for key, val in req.header_items():
+			lines.append('%s: %s' % (key, val))
+		head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+		reader, writer = await asyncio.open_connection(parts.hostname, port,
+														ssl=secure or None)
+		try:
+			writer.write(head)
+			await writer.drain()
+
+			raw = await reader.readuntil(b'\r\n\r\n')
+			status_line, _, raw = raw.partition(b'\r\n')
+			status = int(status_line.split()[1])
+			headers = email.parser.BytesParser(_class=http.client.HTTPMessage).parsebytes(raw)
+
+			if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+				body = await self._read_chunked(reader)
+			elif headers.get('Content-Length') is not None:
+				body = await reader.readexactly(int(headers.get('Content-Length')))
+			else:
+				body = await reader.read()
+		finally:
+			writer.close()
+
+		self.cjar.extract_cookies(_Response(url, status, headers), req)
+		return status, headers, self._decode(headers.get('Content-Encoding'), body)
+
+	@staticmethod
+	async def _read_chunked(reader):
+		chunks = []
+		while True:
+			size = int((await reader.readline()).split(b';')[0], 16)
+			if size == 0:
+				# Skip any trailers up to the terminating empty line.
+				while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+					pass
+				return b''.join(chunks)
+			chunks.append(await reader.readexactly(size))
+			await reader.readline()
+
+	@staticmethod
+	def _decode(encoding, body):
+		encoding = (encoding or '').lower()
+		if encoding == 'gzip':
+			return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+		if encoding == 'deflate':
+			try:
+				return zlib.decompress(body)
+			except zlib.error:
+				# Some servers send raw deflate data, without header.
+				return zlib.decompress(body, -zlib.MAX_WBITS)
+		return body
+
+	def _log(self, level, msg):
+		self.backend.ScholarUtils.log(level, msg)
+
+
+class _Response(object):
+	"""
+	The minimal response interface http.cookiejar needs in order to
+	extract cookies.
+	"""
+	def __init__(self, url, status, headers):
+		self.url = url
+		self.status = status
+		self.headers = headers
+
+	def info(self):
+		return self.headers
+
+	def geturl(self):
+		return self.url
@@ -0,0 +1,226 @@
+#
+# Concurrent batch lookups for the queriers in google_scholar.py and
+# acmld.py.
+#
+
+import multiprocessing
+import sys
+import threading
+
+try:
+	# Try importing for Python 3
+	# pylint: disable-msg=F0401
+	# pylint: disable-msg=E0611
+	from queue import Queue, Empty
+	from urllib.parse import urlparse
+except ImportError:
+	# Fallback for Python 2
+	from Queue import Queue, Empty
+	from urlparse import urlparse
+
+
+class BatchQuerier(object):
+	"""
+	BatchQuerier runs a list of queries through a pool of worker
+	threads. Every worker owns a querier of its own, created through
+	querier_factory (usually a ScholarQuerier class), so the articles
+	list and the cookie jar of a querier are never shared between
+	threads. On top of the pool size, the number of requests in flight
+	to any single host is capped at per_host. If fields is given, it
+	gets passed on to send_query() to restrict parsing to those article
+	attributes.
+
+	Jobs may bring a querier factory and fields of their own,
+	overriding the defaults, so that one pool can serve several
+	backends at once. Workers then keep one querier per factory.
+	"""
+	def __init__(self, querier_factory, num_workers=4, per_host=2, fields=None):
+		self.querier_factory = querier_factory
+		self.fields = fields
+		self.num_workers = max(1, num_workers)
+		self.per_host = max(1, per_host)
+		self.host_slots = {}
+		self.lock = threading.Lock()
+
+	def run(self, jobs, callback=None):
+		"""
+		Runs the given (key, query) pairs, or (key, query,
+		querier_factory, fields) tuples, and returns a dictionary
+		mapping each key to the list of ScholarArticle instances its
+		query produced. Failed lookups map to an empty list, just like
+		an empty querier.articles after a failed send_query(). If
+		callback is given, it gets invoked with each key and its
+		article list as soon as that lookup completes. Calls come from
+		the worker threads, one at a time.
+		"""
+		jobs = list(jobs)
+		results = {}
+		if len(jobs) == 0:
+			return results
+
+		todo = Queue()
+		for job in jobs:
+			todo.put(job)
+
+		workers = []
+		for _ in range(min(self.num_workers, len(jobs))):
+			thread = threading.Thread(target=self._work, args=(todo, results, callback))
+			thread.daemon = True
+			thread.start()
+			workers.append(thread)
+
+		for thread in workers:
+			thread.join()
+
+		return results
+
+	def _work(self, todo, results, callback):
+		queriers = {} # querier_factory -> querier
+
+		while True:
+			# All jobs are queued before the workers start, so an
+			# empty queue means we are done.
+			try:
+				job = todo.get_nowait()
+			except Empty:
+				return
+
+			key, query = job[:2]
+			querier_factory = self.querier_factory
+			fields = self.fields
+			if len(job) > 2:
+				querier_factory, fields = job[2:]
+
+			articles = []
+			try:
+				querier = queriers.get(querier_factory)
+				if querier is None:
+					querier = queriers[querier_factory] = querier_factory()
+
+				slot = self._host_slot(query.get_url())
+				slot.acquire()
+				try:
+					if fields is None:
+						querier.send_query(query)
+					else:
+						querier.send_query(query, fields=fields)
+				finally:
+					slot.release()
+				articles = list(querier.articles)
+			except Exception as err:
+				sys.stderr.write('[ WARN]  lookup of %s failed: %s\n' % (key, err))
+
+			with self.lock:
+				results[key] = articles
+				if callback is not None:
+					callback(key, articles)
+
+	def _host_slot(self, url):
+		"""
+		Returns the semaphore limiting concurrent requests to the host
+		of the given URL.
+		"""
+		host = urlparse(url).netloc
+		with self.lock:
+			if host not in self.host_slots:
+				self.host_slots[host] = threading.BoundedSemaphore(self.per_host)
+			return self.host_slots[host]
+
+
+class Prefetch(object):
+	"""
+	Prefetch runs func(*args) in a background thread right away, so
+	that its result is ready, or at least on its way, by the time
+	result() gets called. The queriers use it to fetch the next result
+	page while they parse the current one. Exceptions raised by func
+	get re-raised by result(). A prefetch that is never asked for its
+	result simply runs to completion and gets dropped.
+	"""
+	def __init__(self, func, *args):
+		self.func = func
+		self.args = args
+		self.value = None
+		self.error = None
+		self.thread = threading.Thread(target=self._run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def result(self):
+		"""Waits for func to finish and returns what it returned."""
+		self.thread.join()
+		if self.error is not None:
+			raise self.error
+		return self.value
+
+	def _run(self):
+		try:
+			self.value = self.func(*self.args)
+		except Exception as err:
+			self.error = err
+
+
+class ProcessPool(object):
+	"""
+	ProcessPool runs CPU-bound calls, such as parsing result pages, in
+	a pool of worker processes, where they neither hold up the fetching
+	threads through the GIL nor share a single core. run() blocks its
+	caller until the call is done, so any number of threads can use one
+	pool, each with one call in it at a time, and fetching, parsing and
+	the caller's own work overlap. Functions must be defined at module
+	level, and their arguments and results picklable. Instances are
+	meant to be shared, see shared().
+	"""
+	# One instance per number of processes, see shared():
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	# Waiting on a result without a timeout cannot be interrupted on
+	# Python 2, so we wait for a very long time instead:
+	MAX_WAIT = 7*24*3600
+
+	def __init__(self, processes):
+		self.processes = max(1, processes)
+		self.pool = _pool_context().Pool(self.processes)
+		self.lock = threading.Lock()
+
+	@classmethod
+	def shared(cls, processes):
+		"""
+		Returns the process-wide pool of the given size, starting it if
+		needed. Starting it before any threads makes sure no worker
+		inherits locks those threads hold.
+		"""
+		with cls._instances_lock:
+			if processes not in cls._instances:
+				cls._instances[processes] = cls(processes)
+			return cls._instances[processes]
+
+	def run(self, func, *args):
+		"""
+		Returns func(*args), as computed by one of the worker processes.
+		Exceptions get re-raised in the caller.
+		"""
+		with self.lock:
+			if self.pool is None:
+				raise ValueError('process pool is closed')
+			result = self.pool.apply_async(func, args)
+		return result.get(self.MAX_WAIT)
+
+	def close(self):
+		with self.lock:
+			if self.pool is not None:
+				self.pool.terminate()
+				self.pool.join()
+				self.pool = None
+
+
+def _pool_context():
+	"""
+	Returns the multiprocessing context to start worker processes in.
+	Where available, workers get forked off a fresh server process
+	rather than off the caller, which may be running threads.
+	"""
+	try:
+		return multiprocessing.get_context('forkserver')
+	except (AttributeError, ValueError):
+		return multiprocessing
@@ -0,0 +1,174 @@
+#
+# Persistent on-disk cache of HTTP responses for the queriers in
+# google_scholar.py and acmld.py.
+#
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+
+class ScholarCache(object):
+	"""
+	A URL-keyed cache of HTTP response bodies, kept in a directory so
+	that it survives across runs. Every entry lives in a file of its
+	own, holding its expiry time followed by the zlib-compressed
+	body. Entries are written to a temporary file and renamed into
+	place, so several processes can share a cache directory without
+	ever seeing a partial entry. Once the directory grows beyond
+	max_bytes, the least recently used entries (by file modification
+	time, which a hit refreshes) get evicted.
+	"""
+	# One instance per cache directory, see shared():
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self, path, ttl=7*24*3600, max_bytes=256*1024*1024):
+		self.path = path
+		self.ttl = ttl
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.size = None # Estimated directory size, None until scanned
+		self.lock = threading.Lock()
+
+		if not os.path.isdir(self.path):
+			try:
+				os.makedirs(self.path)
+			except OSError:
+				# Somebody else may have created it meanwhile.
+				if not os.path.isdir(self.path):
+					raise
+
+	@classmethod
+	def shared(cls, path, ttl=7*24*3600, max_bytes=256*1024*1024):
+		"""
+		Returns the process-wide cache instance for the given
+		directory, creating it if needed. Queriers use this so that
+		several of them (e.g. the workers of a BatchQuerier) share
+		their hit/miss counters.
+		"""
+		key = os.path.abspath(path)
+		with cls._instances_lock:
+			if key not in cls._instances:
+				cls._instances[key] = cls(path, ttl, max_bytes)
+			return cls._instances[key]
+
+	def get(self, url):
+		"""
+		Returns the cached body for the given URL, or None if there is
+		no fresh entry.
+		"""
+		fname = self._entry_path(url)
+		try:
+			with open(fname, 'rb') as hdl:
+				expires = int(hdl.readline())
+				data = hdl.read()
+			if expires < time.time():
+				self._remove(fname)
+				data = None
+			else:
+				data = zlib.decompress(data)
+				# Mark as recently used, for eviction:
+				os.utime(fname, None)
+		except (IOError, OSError, ValueError, zlib.error):
+			data = None
+
+		with self.lock:
+			if data is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+		return data
+
+	def put(self, url, data, ttl=None):
+		"""
+		Stores the body for the given URL, valid for ttl seconds
+		(default: the cache-wide TTL). Returns True if the entry got
+		written.
+		"""
+		if ttl is None:
+			ttl = self.ttl
+		fname = self._entry_path(url)
+		dname = os.path.dirname(fname)
+		payload = ('%d\n' % (time.time() + ttl)).encode('ascii') \
+			+ zlib.compress(data)
+
+		try:
+			if not os.path.isdir(dname):
+				try:
+					os.makedirs(dname)
+				except OSError:
+					pass
+			fd, tmpname = tempfile.mkstemp(dir=dname, prefix='.tmp')
+			try:
+				os.write(fd, payload)
+			finally:
+				os.close(fd)
+			try:
+				os.rename(tmpname, fname)
+			except OSError:
+				# Windows won't rename onto an existing file.
+				self._remove(fname)
+				os.rename(tmpname, fname)
+		except (IOError, OSError):
+			return False
+
+		with self.lock:
+			if self.size is not None:
+				self.size += len(payload)
+			needs_eviction = self.size is None or self.size > self.max_bytes
+		if needs_eviction:
+			self.evict()
+		return True
+
+	def evict(self):
+		"""
+		Scans the cache directory and deletes least recently used
+		entries until the cache fits into 90% of max_bytes.
+		"""
+		entries = []
+		total = 0
+		for dirpath, _, fnames in os.walk(self.path):
+			for fname in fnames:
+				if fname.startswith('.tmp'):
+					continue
+				fname = os.path.join(dirpath, fname)
+				try:
+					stat = os.stat(fname)
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, fname))
+				total += stat.st_size
+
+		if total > self.max_bytes:
+			entries.sort()
+			for _, size, fname in entries:
+				if total <= self.max_bytes * 0.9:
+					break
+				self._remove(fname)
+				total -= size
+
+		with self.lock:
+			self.size = total
+
+	def stats(self):
+		"""Returns a (hits, misses) tuple."""
+		with self.lock:
+			return self.hits, self.misses
+
+	def _entry_path(self, url):
+		if not isinstance(url, bytes):
+			url = url.encode('utf-8')
+		key = hashlib.sha1(url).hexdigest()
+		return os.path.join(self.path, key[:2], key[2:])
+
+	@staticmethod
+	def _remove(fname):
+		try:
+			os.remove(fname)
+		except OSError:
+			pass
@@ -0,0 +1,143 @@
+#
+# Breadth-first crawler of the citation graph Google Scholar exposes
+# through its "Cited by" links, for google_scholar.py queriers.
+#
+
+from scholar_batch import BatchQuerier
+from scholar_graph import CitationGraphBuilder
+
+
+class CitationCrawler(object):
+	"""
+	CitationCrawler expands the papers citing a set of seed papers,
+	breadth-first, up to the given depth: depth 1 finds the papers
+	citing the seeds, depth 2 those citing the latter, and so on.
+	Papers are identified by cluster ID, and each gets expanded at
+	most once, however often it turns up.
+
+	Each expansion is a citations query, built by query_factory from
+	the paper's cluster ID, paging through up to max_citing citing
+	papers. Papers known to be cited by none do not get queried at
+	all. The queries of a level run through a BatchQuerier with the
+	given number of workers and requests per host, so the queriers'
+	rate limiter, cache and request coalescing all apply.
+
+	With a journal (see scholar_journal.ResultJournal), every
+	expansion gets journaled as it completes, and a crawl started
+	again takes journaled expansions from it instead of querying
+	them again, so an interrupted crawl resumes where it stopped.
+	"""
+	# The article fields an expansion needs:
+	FIELDS = ('cluster_id', 'title', 'year', 'num_citations')
+
+	def __init__(self, querier_factory, query_factory, depth=1, max_citing=100,
+				num_workers=4, per_host=2, journal=None):
+		self.querier_factory = querier_factory
+		self.query_factory = query_factory
+		self.depth = depth
+		self.max_citing = max_citing
+		self.batch = BatchQuerier(querier_factory, num_workers=num_workers,
+								per_host=per_host, fields=self.FIELDS)
+		self.journal = journal
+		self.graph = CitationGraphBuilder()
+		self.papers = {} # Cluster ID -> record of the paper, once seen citing
+		self.num_queries = 0
+		self.num_resumed = 0
+		self.num_failed = 0
+
+	def crawl(self, seeds, callback=None):
+		"""
+		Crawls the papers citing the seed cluster IDs and returns the
+		resulting graph, a scholar_graph.CitationGraph. If callback is
+		given, it gets invoked after every level with the level
+		(counting from 1) and the number of papers expanded on it.
+		"""
+		done = {}
+		if self.journal is not None:
+			done = self.journal.load()
+
+		frontier = []
+		seen = set()
+		for seed in seeds:
+			seed = '%s' % seed
+			if seed not in seen:
+				seen.add(seed)
+				frontier.append(seed)
+
+		for level in range(1, self.depth + 1):
+			if len(frontier) == 0:
+				break
+
+			expanded = {}
+			jobs = []
+			for cluster_id in frontier:
+				if cluster_id in done:
+					expanded[cluster_id] = done[cluster_id]
+					self.num_resumed += 1
+					continue
+				total = self._expected(cluster_id)
+				if total == 0:
+					expanded[cluster_id] = []
+					continue
+				query = self.query_factory(cluster_id)
+				query.set_total_results(total)
+				jobs.append((cluster_id, query))
+
+			self.num_queries += len(jobs)
+			for cluster_id, articles in self.batch.run(jobs, self._journal).items():
+				expanded[cluster_id] = self._records(articles)
+
+			# The next level, in crawl order:
+			successors = []
+			for cluster_id in frontier:
+				records = expanded.get(cluster_id, [])
+				if len(records) == 0 and self._expected(cluster_id) != 0:
+					self.num_failed += 1
+				self.graph.add_citing(cluster_id, [record['cluster_id'] for record in records])
+				for record in records:
+					citing = record['cluster_id']
+					self.papers.setdefault(citing, record)
+					if citing not in seen:
+						seen.add(citing)
+						successors.append(citing)
+
+			if callback is not None:
+				callback(level, len(frontier))
+			frontier = successors
+
+		return self.graph.build()
+
+	def _expected(self, cluster_id):
+		"""
+		Returns the number of citing papers to retrieve for the given
+		paper: its citation count, if known, up to max_citing.
+		"""
+		record = self.papers.get(cluster_id)
+		if record is None or record.get('num_citations') is None:
+			return self.max_citing
+		try:
+			return min(int(record['num_citations']), self.max_citing)
+		except (TypeError, ValueError):
+			return self.max_citing
+
+	def _records(self, articles):
+		"""
+		Returns compact records of the given articles, leaving out any
+		without cluster ID, which cannot be expanded.
+		"""
+		records = []
+		for art in articles:
+			if art['cluster_id'] is None:
+				continue
+			record = {}
+			for key in self.FIELDS:
+				record[key] = art[key]
+			record['cluster_id'] = '%s' % record['cluster_id']
+			records.append(record)
+		return records
+
+	def _journal(self, cluster_id, articles):
+		# Empty results may stem from a failed request, so those get
+		# retried on the next run.
+		if self.journal is not None and len(articles) > 0:
+			self.journal.append(cluster_id, self._records(articles))
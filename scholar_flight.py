@@ -0,0 +1,113 @@
+#
+# Coalescing of identical requests in flight, for the queriers in
+# google_scholar.py and acmld.py.
+#
+
+import threading
+
+try:
+	# Try importing for Python 3
+	# pylint: disable-msg=F0401
+	# pylint: disable-msg=E0611
+	from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+except ImportError:
+	# Fallback for Python 2
+	from urlparse import urlsplit, urlunsplit, parse_qsl
+	from urllib import urlencode
+
+
+class SingleFlight(object):
+	"""
+	SingleFlight runs at most one call per key at a time: whoever asks
+	for a key first runs the call, and anyone asking for the same key
+	while it is still running waits for it and gets its result (or
+	exception) instead of running the call again. Once a call is done,
+	its key is free again; keeping results around is the job of the
+	response cache. Instances count the calls run and the ones saved
+	by joining a call in flight. They are thread-safe and meant to be
+	shared, see shared().
+	"""
+	# One instance per name, see shared():
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self):
+		self.calls = {} # key -> _Call in flight
+		self.lock = threading.Lock()
+		self.num_calls = 0
+		self.num_saved = 0
+
+	@classmethod
+	def shared(cls, name):
+		"""
+		Returns the process-wide instance of the given name, creating
+		it if needed. Queriers use this so that all of them (e.g. the
+		workers of a BatchQuerier and the page prefetches) coalesce
+		their requests with one another.
+		"""
+		with cls._instances_lock:
+			if name not in cls._instances:
+				cls._instances[name] = cls()
+			return cls._instances[name]
+
+	def do(self, key, func, *args):
+		"""
+		Returns func(*args), or the result of the call for the same key
+		already in flight. Exceptions get raised in every caller
+		sharing the call.
+		"""
+		with self.lock:
+			call = self.calls.get(key)
+			if call is None:
+				call = self.calls[key] = _Call()
+				self.num_calls += 1
+				leader = True
+			else:
+				self.num_saved += 1
+				leader = False
+
+		if not leader:
+			call.done.wait()
+			if call.error is not None:
+				raise call.error
+			return call.value
+
+		try:
+			call.value = func(*args)
+		except Exception as err:
+			call.error = err
+			raise
+		finally:
+			with self.lock:
+				del self.calls[key]
+			call.done.set()
+		return call.value
+
+	def stats(self):
+		"""Returns the number of calls run and of calls saved."""
+		with self.lock:
+			return self.num_calls, self.num_saved
+
+
+class _Call(object):
+	def __init__(self):
+		self.done = threading.Event()
+		self.value = None
+		self.error = None
+
+
+def canonical_url(url):
+	"""
+	Returns the given URL in a canonical form for telling whether two
+	requests are the same: scheme and host lowercased, default port
+	and fragment dropped, and query arguments sorted, with a uniform
+	encoding.
+	"""
+	parts = urlsplit(url)
+	scheme = parts.scheme.lower()
+	netloc = parts.netloc.lower()
+	if (scheme == 'http' and netloc.endswith(':80')) \
+		or (scheme == 'https' and netloc.endswith(':443')):
+		netloc = netloc.rsplit(':', 1)[0]
+	query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+	return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
@@ -0,0 +1,255 @@
+#
+# Compact citation graph, as crawled by scholar_crawl.CitationCrawler,
+# in compressed sparse row (CSR) layout that can be saved to a file and
+# memory-mapped back.
+#
+
+import mmap
+import struct
+import sys
+from array import array
+
+
+class CitationGraphBuilder(object):
+	"""
+	CitationGraphBuilder collects the edges of a citation graph, from
+	each cited paper to the papers citing it, with papers identified by
+	cluster ID. Papers get numbered in the order they first appear, and
+	the edges go into two flat integer arrays, so millions of them take
+	a few bytes each. build() turns them into a CitationGraph.
+	"""
+	def __init__(self):
+		self.ids = [] # Node -> cluster ID
+		self.nodes = {} # Cluster ID -> node
+		self.sources = array('i')
+		self.targets = array('i')
+
+	def node(self, cluster_id):
+		"""Returns the node number of the given cluster ID, adding it if new."""
+		cluster_id = '%s' % cluster_id
+		node = self.nodes.get(cluster_id)
+		if node is None:
+			node = self.nodes[cluster_id] = len(self.ids)
+			self.ids.append(cluster_id)
+		return node
+
+	def add_citing(self, cited, citing):
+		"""
+		Adds edges from the cited paper's cluster ID to those of the
+		papers citing it. Duplicates among the latter get dropped.
+		"""
+		source = self.node(cited)
+		seen = set()
+		for cluster_id in citing:
+			target = self.node(cluster_id)
+			if target in seen:
+				continue
+			seen.add(target)
+			self.sources.append(source)
+			self.targets.append(target)
+
+	def num_nodes(self):
+		return len(self.ids)
+
+	def num_edges(self):
+		return len(self.targets)
+
+	def build(self):
+		"""
+		Returns the graph collected so far as a CitationGraph, with each
+		node's citing papers in the order they were added.
+		"""
+		num_nodes = len(self.ids)
+		offsets = array('i', [0] * (num_nodes + 1))
+		for source in self.sources:
+			offsets[source + 1] += 1
+		for node in range(num_nodes):
+			offsets[node + 1] += offsets[node]
+
+		# Counting sort of the edges by source:
+		fill = array('i', offsets[:-1])
+		targets = array('i', [0] * len(self.targets))
+		for idx in range(len(self.sources)):
+			source = self.sources[idx]
+			targets[fill[source]] = self.targets[idx]
+			fill[source] += 1
+
+		return CitationGraph(offsets, targets, list(self.ids))
+
+
+class CitationGraph(object):
+	"""
+	CitationGraph is a read-only citation graph in CSR layout: the
+	papers citing node n are targets[offsets[n]:offsets[n + 1]], and
+	node n has cluster ID ids[n].
+
+	save() writes the graph to a single file: a header, the offsets and
+	targets as 32-bit integers, and the cluster IDs as text, one per
+	line. load() memory-maps such a file, so that a graph of any size
+	loads at once and takes memory only for the parts touched. The
+	cluster IDs get read only when first needed, e.g. by citing().
+	"""
+	MAGIC = b'SCSR'
+	VERSION = 1
+
+	# Magic, version, byte order (1 for little-endian), number of
+	# nodes and edges, length of the cluster ID text:
+	HEADER = struct.Struct('<4sIIIQQ')
+	HEADER_SIZE = 32
+
+	def __init__(self, offsets, targets, ids, mapped=None):
+		self.offsets = offsets
+		self.targets = targets
+		self._ids = ids # List, or (offset, length) in mapped while unread
+		self._nodes = None # Cluster ID -> node, once needed
+		self.mapped = mapped
+
+	def num_nodes(self):
+		return len(self.offsets) - 1
+
+	def num_edges(self):
+		return len(self.targets)
+
+	@property
+	def ids(self):
+		if isinstance(self._ids, tuple):
+			offset, length = self._ids
+			text = self.mapped[offset:offset + length].decode('ascii')
+			self._ids = text.split('\n') if length > 0 else []
+		return self._ids
+
+	def node(self, cluster_id):
+		"""Returns the node number of the given cluster ID, or None."""
+		if self._nodes is None:
+			self._nodes = dict([(cid, node) for node, cid in enumerate(self.ids)])
+		return self._nodes.get('%s' % cluster_id)
+
+	def citing_nodes(self, node):
+		"""Returns the node numbers of the papers citing the given node."""
+		return list(self.targets[self.offsets[node]:self.offsets[node + 1]])
+
+	def citing(self, cluster_id):
+		"""
+		Returns the cluster IDs of the papers citing the given one, as
+		far as crawled.
+		"""
+		node = self.node(cluster_id)
+		if node is None:
+			return []
+		ids = self.ids
+		return [ids[target] for target in self.citing_nodes(node)]
+
+	def in_degrees(self):
+		"""
+		Returns an array holding, for each node, the number of crawled
+		papers it cites.
+		"""
+		res = array('i', [0] * self.num_nodes())
+		for idx in range(self.num_edges()):
+			res[self.targets[idx]] += 1
+		return res
+
+	def save(self, path):
+		"""Writes the graph to the given file, see load()."""
+		text = '\n'.join(self.ids).encode('ascii')
+		header = self.HEADER.pack(self.MAGIC, self.VERSION,
+								1 if sys.byteorder == 'little' else 0,
+								self.num_nodes(), self.num_edges(), len(text))
+		with open(path, 'wb') as hdl:
+			hdl.write(header.ljust(self.HEADER_SIZE, b'\0'))
+			_write_ints(hdl, self.offsets)
+			_write_ints(hdl, self.targets)
+			hdl.write(text)
+
+	@classmethod
+	def load(cls, path):
+		"""
+		Returns the graph saved in the given file, memory-mapped. The
+		graph keeps the file mapped until close().
+		"""
+		with open(path, 'rb') as hdl:
+			mapped = mmap.mmap(hdl.fileno(), 0, access=mmap.ACCESS_READ)
+
+		try:
+			magic, version, little, num_nodes, num_edges, text_len = \
+				cls.HEADER.unpack_from(mapped, 0)
+		except struct.error:
+			mapped.close()
+			raise ValueError('%s is not a citation graph file' % path)
+		if magic != cls.MAGIC or version != cls.VERSION:
+			mapped.close()
+			raise ValueError('%s is not a citation graph file of version %d' % (path, cls.VERSION))
+
+		offset = cls.HEADER_SIZE
+		text_offset = offset + 4 * (num_nodes + 1) + 4 * num_edges
+		if text_offset + text_len > len(mapped):
+			mapped.close()
+			raise ValueError('%s is truncated' % path)
+
+		offsets = _IntView(mapped, offset, num_nodes + 1, little)
+		targets = _IntView(mapped, offset + 4 * (num_nodes + 1), num_edges, little)
+		return cls(offsets, targets, (text_offset, text_len), mapped)
+
+	def close(self):
+		"""Unmaps the graph's file, if it was loaded from one."""
+		if self.mapped is None:
+			return
+		self._ids = self.ids # Keeps the IDs usable
+		for view in (self.offsets, self.targets):
+			view.release()
+		self.mapped.close()
+		self.mapped = None
+
+
+class _IntView(object):
+	"""
+	A read-only sequence of the 32-bit integers in buf, starting at
+	offset. It indexes buf directly where the platform supports it
+	(Python 3, matching byte order), and unpacks items one by one
+	otherwise.
+	"""
+	def __init__(self, buf, offset, count, little):
+		self.count = count
+		self.view = None
+		self.buf = buf
+		self.offset = offset
+		self.fmt = struct.Struct('<i' if little else '>i')
+		native = (sys.byteorder == 'little') == bool(little)
+		if native and hasattr(memoryview, 'cast'):
+			self.view = memoryview(buf)[offset:offset + 4 * count].cast('i')
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			if self.view is not None:
+				return self.view[idx].tolist()
+			return [self[pos] for pos in range(*idx.indices(self.count))]
+		if idx < 0:
+			idx += self.count
+		if idx < 0 or idx >= self.count:
+			raise IndexError('index out of range')
+		if self.view is not None:
+			return self.view[idx]
+		return self.fmt.unpack_from(self.buf, self.offset + 4 * idx)[0]
+
+	def __iter__(self):
+		for idx in range(self.count):
+			yield self[idx]
+
+	def release(self):
+		if self.view is not None:
+			self.view.release()
+			self.view = None
+		self.buf = None
+
+
+def _write_ints(hdl, values):
+	"""Writes the given integers to hdl as native 32-bit integers."""
+	if not isinstance(values, array):
+		values = array('i', values)
+	if hasattr(values, 'tobytes'):
+		hdl.write(values.tobytes())
+	else:
+		hdl.write(values.tostring())
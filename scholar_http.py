@@ -0,0 +1,249 @@
+#
+# Pooled keep-alive HTTP transport for the queriers in
+# google_scholar.py and acmld.py.
+#
+
+import threading
+import time
+import zlib
+
+from io import BytesIO
+
+try:
+	# Try importing for Python 3
+	# pylint: disable-msg=F0401
+	# pylint: disable-msg=E0611
+	from http.client import HTTPConnection, HTTPSConnection, HTTPException
+	from urllib.error import HTTPError
+	from urllib.parse import urljoin, urlsplit
+	from urllib.request import HTTPCookieProcessor, Request, build_opener, getproxies
+except ImportError:
+	# Fallback for Python 2
+	from httplib import HTTPConnection, HTTPSConnection, HTTPException
+	from urllib2 import HTTPError, HTTPCookieProcessor, Request, build_opener
+	from urllib import getproxies
+	from urlparse import urljoin, urlsplit
+
+from scholar_trace import NULL_TRACER
+
+
+class ScholarTransport(object):
+	"""
+	A drop-in replacement for the urllib opener the queriers used to
+	build, i.e. build_opener(HTTPCookieProcessor(cjar)). Instead of a
+	fresh TCP connection per request, it keeps idle HTTP/1.1
+	connections per host around and reuses them. It asks for gzip or
+	deflate compressed responses and decompresses them incrementally
+	while reading. Cookies go through the given cookie jar just like
+	before, and so do redirects and HTTP errors (which raise
+	HTTPError). Instances are thread-safe, so several queriers may
+	share one.
+
+	If the environment configures a proxy for a URL's scheme, the
+	request falls back to the classic urllib opener.
+
+	With a tracer (see scholar_trace.Tracer), requests record spans
+	for connection setup, time to first byte, reading the body, and
+	decompressing it.
+	"""
+	MAX_REDIRECTS = 5
+	MAX_IDLE_PER_HOST = 4
+	READ_CHUNK = 64*1024
+
+	def __init__(self, cjar, timeout=60, tracer=None):
+		self.cjar = cjar
+		self.timeout = timeout
+		self.tracer = tracer or NULL_TRACER
+		self.idle = {} # (scheme, host, port) -> list of idle connections
+		self.lock = threading.Lock()
+		self.proxies = getproxies()
+		self.fallback = build_opener(HTTPCookieProcessor(self.cjar))
+
+	def open(self, req):
+		"""
+		Sends the given urllib Request and returns a response object
+		offering read(), geturl(), getcode() and info(), like the
+		ones urllib openers return.
+		"""
+		if urlsplit(req.get_full_url()).scheme in self.proxies:
+			return self.fallback.open(req)
+
+		for _ in range(self.MAX_REDIRECTS + 1):
+			resp = self._send(req)
+			location = resp.info().get('Location')
+			if resp.getcode() in (301, 302, 303, 307, 308) and location:
+				url = urljoin(req.get_full_url(), location)
+				req = Request(url=url, headers=dict(req.headers))
+				continue
+			if resp.getcode() >= 400:
+				raise HTTPError(resp.geturl(), resp.getcode(), resp.reason,
+								resp.info(), BytesIO(resp.read()))
+			return resp
+		raise HTTPError(req.get_full_url(), 310, 'too many redirects', None, None)
+
+	def close(self):
+		"""Closes all idle connections."""
+		with self.lock:
+			conns = [conn for pool in self.idle.values() for conn in pool]
+			self.idle = {}
+		for conn in conns:
+			conn.close()
+
+	def _send(self, req):
+		url = req.get_full_url()
+		parts = urlsplit(url)
+		key = (parts.scheme, parts.hostname, parts.port)
+		selector = parts.path or '/'
+		if parts.query:
+			selector += '?' + parts.query
+
+		self.cjar.add_cookie_header(req)
+		headers = dict(req.header_items())
+		headers['Accept-Encoding'] = 'gzip, deflate'
+		headers['Connection'] = 'keep-alive'
+
+		# A pooled connection may have been closed by the server in
+		# the meantime, and likely the other idle ones with it. If a
+		# reused one fails, those get dropped, and the request goes
+		# once more over a new connection:
+		for attempt in range(2):
+			conn, reused = self._checkout(key, attempt == 0)
+			try:
+				if conn.sock is None:
+					with self.tracer.span('connect', host=parts.hostname):
+						conn.connect()
+				start = time.time()
+				conn.request('GET', selector, headers=headers)
+				hdl = conn.getresponse()
+				self.tracer.record('ttfb', start, time.time() - start, url=url)
+				body = self._read_body(hdl)
+			except (HTTPException, IOError):
+				conn.close()
+				if reused:
+					self._discard(key)
+					continue
+				raise
+			break
+
+		if hdl.will_close:
+			conn.close()
+		else:
+			self._checkin(key, conn)
+
+		resp = PooledResponse(url, hdl.status, hdl.reason, hdl.msg, body)
+		self.cjar.extract_cookies(resp, req)
+		return resp
+
+	def _read_body(self, hdl):
+		"""
+		Reads the whole response body, decompressing it on the fly as
+		indicated by its Content-Encoding.
+		"""
+		encoding = (hdl.getheader('Content-Encoding') or '').lower()
+		decomp = None
+		if encoding == 'gzip':
+			decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+		elif encoding == 'deflate':
+			decomp = _DeflateDecoder()
+
+		chunks = []
+		start = time.time()
+		decomp_time = 0
+		while True:
+			chunk = hdl.read(self.READ_CHUNK)
+			if not chunk:
+				break
+			if decomp is not None:
+				decomp_start = time.time()
+				chunk = decomp.decompress(chunk)
+				decomp_time += time.time() - decomp_start
+			chunks.append(chunk)
+		if decomp is not None:
+			decomp_start = time.time()
+			chunks.append(decomp.flush())
+			decomp_time += time.time() - decomp_start
+
+		self.tracer.record('read', start, time.time() - start - decomp_time)
+		if decomp is not None:
+			self.tracer.record('decompress', start, decomp_time, encoding=encoding)
+		return b''.join(chunks)
+
+	def _checkout(self, key, pooled=True):
+		"""
+		Returns a connection to the given host, and whether it is an
+		idle one being reused. With pooled False, the connection is a
+		new one.
+		"""
+		if pooled:
+			with self.lock:
+				pool = self.idle.get(key)
+				if pool:
+					return pool.pop(), True
+
+		scheme, host, port = key
+		if scheme == 'https':
+			return HTTPSConnection(host, port, timeout=self.timeout), False
+		return HTTPConnection(host, port, timeout=self.timeout), False
+
+	def _checkin(self, key, conn):
+		with self.lock:
+			pool = self.idle.setdefault(key, [])
+			if len(pool) < self.MAX_IDLE_PER_HOST:
+				pool.append(conn)
+				return
+		conn.close()
+
+	def _discard(self, key):
+		"""Closes the idle connections to the given host."""
+		with self.lock:
+			conns = self.idle.pop(key, [])
+		for conn in conns:
+			conn.close()
+
+
+class PooledResponse(object):
+	"""
+	The response object ScholarTransport.open() returns. The body has
+	already been read and decompressed.
+	"""
+	def __init__(self, url, code, reason, headers, body):
+		self.url = url
+		self.code = code
+		self.reason = reason
+		self.headers = headers
+		self.body = body
+
+	def read(self):
+		return self.body
+
+	def geturl(self):
+		return self.url
+
+	def getcode(self):
+		return self.code
+
+	def info(self):
+		return self.headers
+
+
+class _DeflateDecoder(object):
+	"""
+	Streaming decoder for "deflate" content. Servers disagree on
+	whether that means zlib-wrapped or raw deflate data, so we decide
+	based on the first chunk.
+	"""
+	def __init__(self):
+		self.decomp = zlib.decompressobj()
+		self.started = False
+
+	def decompress(self, chunk):
+		if not self.started:
+			self.started = True
+			try:
+				return self.decomp.decompress(chunk)
+			except zlib.error:
+				self.decomp = zlib.decompressobj(-zlib.MAX_WBITS)
+		return self.decomp.decompress(chunk)
+
+	def flush(self):
+		return self.decomp.flush()
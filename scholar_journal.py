@@ -0,0 +1,103 @@
+#
+# Append-only journal of per-title lookup results, letting long
+# rankConfCitation.py runs resume where they left off.
+#
+
+import json
+import os
+import threading
+import time
+
+
+class ResultJournal(object):
+	"""
+	ResultJournal records lookup results as they complete, one JSON
+	object per line, so that a run that dies halfway can pick up where
+	it stopped. Lines are handed to the operating system right away,
+	but fsync()ed only in batches, every sync_every records or
+	sync_interval seconds, whichever comes first; a crash of the
+	process itself loses nothing, and a power failure at most the
+	last batch. A line cut short by such a crash gets ignored on
+	load. Instances are thread-safe.
+	"""
+	def __init__(self, path, sync_every=32, sync_interval=2.0):
+		self.path = path
+		self.sync_every = sync_every
+		self.sync_interval = sync_interval
+		self.lock = threading.Lock()
+		self.hdl = None
+		self.unsynced = 0
+		self.last_sync = time.time()
+
+	def load(self):
+		"""
+		Returns the records journaled so far, as a dictionary mapping
+		each key to its most recent record.
+		"""
+		records = {}
+		if not os.path.exists(self.path):
+			return records
+
+		with open(self.path) as hdl:
+			for line in hdl:
+				try:
+					entry = json.loads(line)
+					records[entry['key']] = entry['record']
+				except (ValueError, KeyError, TypeError):
+					# A partially written line from an interrupted run.
+					continue
+		return records
+
+	def append(self, key, record):
+		"""
+		Journals the given JSON-serializable record under key.
+		"""
+		line = json.dumps({'key': key, 'record': record}, sort_keys=True)
+
+		with self.lock:
+			if self.hdl is None:
+				partial = self._has_partial_line()
+				self.hdl = open(self.path, 'a')
+				if partial:
+					# Terminate what an earlier crash left behind.
+					self.hdl.write('\n')
+			self.hdl.write(line + '\n')
+			self.hdl.flush()
+
+			self.unsynced += 1
+			if self.unsynced >= self.sync_every \
+				or time.time() - self.last_sync >= self.sync_interval:
+				self._sync()
+
+	def close(self):
+		"""Syncs any pending records to disk and closes the journal."""
+		with self.lock:
+			if self.hdl is None:
+				return
+			self._sync()
+			self.hdl.close()
+			self.hdl = None
+
+	def remove(self):
+		"""Closes and deletes the journal, e.g. after a completed run."""
+		self.close()
+		try:
+			os.remove(self.path)
+		except OSError:
+			pass
+
+	def _has_partial_line(self):
+		try:
+			with open(self.path, 'rb') as hdl:
+				hdl.seek(0, os.SEEK_END)
+				if hdl.tell() == 0:
+					return False
+				hdl.seek(-1, os.SEEK_END)
+				return hdl.read(1) != b'\n'
+		except (IOError, OSError):
+			return False
+
+	def _sync(self):
+		os.fsync(self.hdl.fileno())
+		self.unsynced = 0
+		self.last_sync = time.time()
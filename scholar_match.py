@@ -0,0 +1,222 @@
+#
+# Fuzzy matching of paper titles against search results, for telling
+# which of several hits a lookup actually meant.
+#
+
+import re
+import sys
+import unicodedata
+
+if sys.version_info[0] == 3:
+	unicode = str # pylint: disable-msg=W0622
+
+STOPWORDS = frozenset(['a', 'an', 'and', 'are', 'as', 'at', 'by', 'for', 'from',
+						'in', 'into', 'is', 'its', 'of', 'on', 'or', 'the', 'to',
+						'towards', 'using', 'via', 'with'])
+
+ASCII_RE = re.compile(r'^[\x00-\x7f]*$')
+NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+
+
+def normalize_title(title):
+	"""
+	Returns the list of words in the given title that matter for
+	matching: lowercased, with diacritics and punctuation removed and
+	stopwords dropped. If nothing but stopwords remains, those are
+	kept.
+	"""
+	if title is None:
+		return []
+	if not isinstance(title, unicode):
+		title = title.decode('utf-8', 'replace')
+	if not ASCII_RE.match(title):
+		title = unicodedata.normalize('NFKD', title)
+		title = ''.join([char for char in title if not unicodedata.combining(char)])
+	words = NON_WORD_RE.sub(' ', title.lower()).split()
+	return [word for word in words if word not in STOPWORDS] or words
+
+
+def trigrams(words):
+	"""Returns the set of character trigrams of the given words."""
+	text = ' %s ' % ' '.join(words)
+	return set([text[idx:idx+3] for idx in range(len(text) - 2)])
+
+
+class TitleMatcher(object):
+	"""
+	TitleMatcher picks, among a set of candidate articles, the one
+	that best matches a paper title. Candidates get indexed by the
+	words and character trigrams of their normalized titles, so that
+	scoring a title against all of them takes a single pass over the
+	title's words and trigrams.
+
+	A candidate's score blends the Dice similarity of the word sets,
+	which tolerates reordering, with that of the trigram sets, which
+	tolerates small spelling and hyphenation differences. Agreement or
+	disagreement with the expected publication year and venue, where
+	both the caller and the candidate provide them, raises or lowers
+	the score. The best match's confidence is its score, reduced if
+	a candidate with a different title scores nearly as high.
+	"""
+	WORD_WEIGHT = 0.5
+	GRAM_WEIGHT = 0.5
+	YEAR_BONUS = 0.05
+	YEAR_PENALTY = 0.2
+	VENUE_BONUS = 0.05
+	VENUE_PENALTY = 0.1
+	AMBIGUITY_MARGIN = 0.05
+
+	def __init__(self, year=None, venue=None, min_confidence=0.7):
+		self.year = str(year) if year is not None else None
+		self.venue = normalize_title(venue) if venue else None
+		self.min_confidence = min_confidence
+		self.candidates = [] # (article, words, grams) tuples
+		self.word_index = {} # word -> candidate indices
+		self.gram_index = {} # trigram -> candidate indices
+
+	def add(self, article):
+		"""Adds an article (anything with a 'title' item) as candidate."""
+		words = set(normalize_title(article['title']))
+		grams = trigrams(sorted(words))
+		idx = len(self.candidates)
+		self.candidates.append((article, words, grams))
+		for word in words:
+			self.word_index.setdefault(word, []).append(idx)
+		for gram in grams:
+			self.gram_index.setdefault(gram, []).append(idx)
+
+	def add_all(self, articles):
+		for article in articles:
+			self.add(article)
+		return self
+
+	def rank(self, title):
+		"""
+		Scores all candidates sharing anything with the given title,
+		and returns (score, article) pairs, best first.
+		"""
+		words = set(normalize_title(title))
+		grams = trigrams(sorted(words))
+
+		shared_words = {}
+		for word in words:
+			for idx in self.word_index.get(word, ()):
+				shared_words[idx] = shared_words.get(idx, 0) + 1
+		shared_grams = {}
+		for gram in grams:
+			for idx in self.gram_index.get(gram, ()):
+				shared_grams[idx] = shared_grams.get(idx, 0) + 1
+
+		ranking = []
+		for idx, num_grams in shared_grams.items():
+			article, cand_words, cand_grams = self.candidates[idx]
+			score = self.WORD_WEIGHT * 2.0 * shared_words.get(idx, 0) / max(1, len(words) + len(cand_words)) \
+				+ self.GRAM_WEIGHT * 2.0 * num_grams / max(1, len(grams) + len(cand_grams))
+			score += self.context_score(article)
+			ranking.append((max(0.0, min(1.0, score)), idx))
+
+		ranking.sort(key=lambda item: (-item[0], item[1]))
+		return [(score, self.candidates[idx][0]) for score, idx in ranking]
+
+	def match(self, title):
+		"""
+		Returns a (article, confidence) pair for the best match of the
+		given title. The article is None if no candidate reaches
+		min_confidence.
+		"""
+		return self._best(self.rank(title))
+
+	def match_entries(self, title):
+		"""
+		Returns a (articles, confidence) pair like match(), but with
+		all entries of the best match's paper, best first: those of the
+		candidates carrying its title that score within
+		AMBIGUITY_MARGIN of it. Entries that the year or venue set
+		apart from the best match are left out. The list is empty if no
+		candidate reaches min_confidence.
+		"""
+		ranking = self.rank(title)
+		best, confidence = self._best(ranking)
+		if best is None:
+			return [], confidence
+
+		best_score = ranking[0][0]
+		best_words = normalize_title(best['title'])
+		entries = []
+		for score, article in ranking:
+			if best_score - score >= self.AMBIGUITY_MARGIN:
+				break
+			if normalize_title(article['title']) == best_words:
+				entries.append(article)
+		return entries, confidence
+
+	def _best(self, ranking):
+		"""Returns the (article, confidence) pair of match() for ranking."""
+		if len(ranking) == 0:
+			return None, 0.0
+
+		best_score, best = ranking[0]
+		confidence = best_score
+		best_words = normalize_title(best['title'])
+		for score, article in ranking[1:]:
+			if best_score - score >= self.AMBIGUITY_MARGIN:
+				break
+			if normalize_title(article['title']) != best_words:
+				confidence -= self.AMBIGUITY_MARGIN - (best_score - score)
+				break
+
+		if confidence < self.min_confidence:
+			return None, confidence
+		return best, confidence
+
+	def context_score(self, article):
+		"""
+		Returns the part of an article's score that stems from its
+		agreement with the expected year and venue, see rank().
+		"""
+		return self._year_feature(article) + self._venue_feature(article)
+
+	def _year_feature(self, article):
+		if self.year is None:
+			return 0.0
+		text = article['year'] or article['date']
+		if text is None:
+			return 0.0
+		years = YEAR_RE.findall('%s' % text)
+		if len(years) == 0:
+			return 0.0
+		if self.year in years:
+			return self.YEAR_BONUS
+		return -self.YEAR_PENALTY
+
+	def _venue_feature(self, article):
+		if self.venue is None:
+			return 0.0
+		venue = article['conference'] or article['venue']
+		if venue is None:
+			return 0.0
+		words = set(normalize_title(venue))
+		for word in self.venue:
+			if word not in words:
+				return -self.VENUE_PENALTY
+		return self.VENUE_BONUS
+
+
+def demultiplex(titles, articles, year=None, venue=None, min_confidence=0.7):
+	"""
+	Distributes the results of a query for several titles at once
+	among those titles. Returns a dictionary mapping each title some
+	article matches with enough confidence (see TitleMatcher) to the
+	entries of the best match's paper, see
+	TitleMatcher.match_entries(). Titles without a match are left
+	out.
+	"""
+	matcher = TitleMatcher(year, venue, min_confidence).add_all(articles)
+
+	result = {}
+	for title in titles:
+		entries, _ = matcher.match_entries(title)
+		if len(entries) > 0:
+			result[title] = entries
+	return result
@@ -0,0 +1,173 @@
+#
+# Per-host request rate limiting with adaptive backoff, for the
+# queriers in google_scholar.py and acmld.py.
+#
+
+import email.utils
+import threading
+import time
+
+try:
+	# Try importing for Python 3
+	# pylint: disable-msg=F0401
+	# pylint: disable-msg=E0611
+	from urllib.parse import urlsplit
+except ImportError:
+	# Fallback for Python 2
+	from urlparse import urlsplit
+
+
+class TokenBucket(object):
+	"""
+	A token bucket refilling at rate tokens per second, holding at
+	most burst tokens. Each request takes one token, waiting for it
+	if need be. On top of that, the bucket can be closed entirely
+	until a given point in time, e.g. as requested by a Retry-After
+	header.
+	"""
+	def __init__(self, rate, burst):
+		self.rate = rate
+		self.burst = burst
+		self.tokens = burst
+		self.stamp = time.time()
+		self.closed_until = 0
+		self.last_cut = 0
+
+	def take(self, now):
+		"""
+		Takes a token if one is available and returns 0, or returns the
+		number of seconds to wait before trying again.
+		"""
+		if now < self.closed_until:
+			return self.closed_until - now
+
+		self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+		self.stamp = now
+		if self.tokens >= 1:
+			self.tokens -= 1
+			return 0
+		return (1 - self.tokens) / self.rate
+
+
+class RateLimiter(object):
+	"""
+	RateLimiter spaces out requests with a token bucket per host, and
+	adapts each host's rate AIMD-style: every successful request
+	raises it additively by increase, up to max_rate, while every
+	rate-limited one (an HTTP 429, a block page, ...) cuts it by the
+	factor decrease, down to min_rate, and drains the bucket. If the
+	site says how long to back off, the host's bucket stays closed
+	that long. The rate thus settles just below what the site
+	tolerates, instead of alternating between bursts and lockouts.
+	Since the requests already in flight when the site starts pushing
+	back tend to get rejected all at once, the rate gets cut at most
+	once per request interval. Instances are thread-safe and meant to
+	be shared, see shared().
+	"""
+	# One instance per name, see shared():
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self, rate=1.0, burst=2, min_rate=0.02, max_rate=None,
+				increase=0.02, decrease=0.5):
+		self.rate = rate
+		self.burst = burst
+		self.min_rate = min_rate
+		self.max_rate = max_rate or rate
+		self.increase = increase
+		self.decrease = decrease
+		self.buckets = {}
+		self.lock = threading.Lock()
+
+	@classmethod
+	def shared(cls, name, **kwargs):
+		"""
+		Returns the process-wide limiter of the given name, creating it
+		with the given arguments if needed. Queriers use this so that
+		all of them (e.g. the workers of a BatchQuerier and the page
+		prefetches) draw from the same buckets.
+		"""
+		with cls._instances_lock:
+			if name not in cls._instances:
+				cls._instances[name] = cls(**kwargs)
+			return cls._instances[name]
+
+	def acquire(self, url):
+		"""
+		Blocks until a request to the host of the given URL may go
+		out, and returns the number of seconds it waited.
+		"""
+		waited = 0
+		while True:
+			delay = self.try_acquire(url)
+			if delay <= 0:
+				return waited
+			time.sleep(delay)
+			waited += delay
+
+	def try_acquire(self, url):
+		"""
+		Lets a request to the host of the given URL go out if it may
+		right now, returning 0, or returns the number of seconds to
+		wait before trying again. For callers that must not block,
+		such as the asyncio querier.
+		"""
+		with self.lock:
+			return self._bucket(url).take(time.time())
+
+	def success(self, url):
+		"""Reports a request to the URL's host that went through."""
+		with self.lock:
+			bucket = self._bucket(url)
+			bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+	def throttled(self, url, retry_after=None):
+		"""
+		Reports a request to the URL's host that the site rejected as
+		too frequent. retry_after is the value of the response's
+		Retry-After header, if any. Returns the host's new rate.
+		"""
+		now = time.time()
+		with self.lock:
+			bucket = self._bucket(url)
+			if now - bucket.last_cut >= 1.0 / bucket.rate:
+				bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+				bucket.last_cut = now
+			bucket.tokens = 0
+			bucket.stamp = now
+			delay = parse_retry_after(retry_after, now)
+			if delay is not None:
+				bucket.closed_until = max(bucket.closed_until, now + delay)
+			return bucket.rate
+
+	def get_rate(self, url):
+		"""Returns the current rate for the host of the given URL."""
+		with self.lock:
+			return self._bucket(url).rate
+
+	def _bucket(self, url):
+		host = urlsplit(url).netloc
+		if host not in self.buckets:
+			self.buckets[host] = TokenBucket(self.rate, self.burst)
+		return self.buckets[host]
+
+
+def parse_retry_after(value, now=None):
+	"""
+	Returns the delay in seconds a Retry-After header value asks for,
+	which may be given in seconds or as an HTTP date, or None if the
+	value is missing or malformed.
+	"""
+	if value is None:
+		return None
+	value = value.strip()
+	try:
+		return max(0, int(value))
+	except ValueError:
+		pass
+	parsed = email.utils.parsedate_tz(value)
+	if parsed is None:
+		return None
+	if now is None:
+		now = time.time()
+	return max(0, email.utils.mktime_tz(parsed) - now)
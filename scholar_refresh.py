@@ -0,0 +1,80 @@
+#
+# Staleness policy for refreshing citation counts tracked in the
+# article store (see scholar_store.ArticleStore.history()), so that
+# repeated runs re-query only the papers whose counts are likely to
+# have moved.
+#
+
+import time
+
+DAY = 86400.0
+
+
+class RefreshPolicy(object):
+	"""
+	RefreshPolicy decides when a tracked paper's citation count is due
+	for another look. The time between checks is how long the paper
+	takes, at its observed citation velocity, to gain change_ratio of
+	its count (and at least min_change citations). The velocity is
+	measured over the paper's whole series, up to the last check.
+
+	A paper whose count has not moved in a while gets checked about as
+	often as it has gone unchanged, so quiet papers back off
+	exponentially. Until a paper has been tracked for min_interval,
+	its velocity is unknown, and it gets checked again after
+	min_interval for every year since it appeared, plus one. The
+	interval always stays between min_interval and max_interval
+	seconds.
+	"""
+	def __init__(self, min_interval=DAY, max_interval=90*DAY, change_ratio=0.05,
+				min_change=1):
+		self.min_interval = min_interval
+		self.max_interval = max(min_interval, max_interval)
+		self.change_ratio = change_ratio
+		self.min_change = min_change
+
+	def interval(self, history, checked_at, year=None, now=None):
+		"""
+		Returns the number of seconds after checked_at, the time of the
+		last check, at which the paper with the given series of
+		(observed_at, num_citations) pairs is due again. year is when
+		the paper appeared, if known.
+		"""
+		if now is None:
+			now = time.time()
+		if len(history) == 0:
+			return 0.0
+
+		first_at, first_count = history[0]
+		last_at, last_count = history[-1]
+		span = max(0.0, checked_at - first_at)
+
+		if span <= 0 or span < self.min_interval:
+			# Too short a series to tell the velocity; go by age.
+			res = self.min_interval * (1 + self._age(year, now))
+		else:
+			velocity = max(0, last_count - first_count) / span
+			wanted = max(self.min_change, self.change_ratio * last_count)
+			res = checked_at - last_at # Unchanged that long
+			if velocity > 0:
+				res = max(res, wanted / velocity)
+
+		return min(self.max_interval, max(self.min_interval, res))
+
+	def is_stale(self, history, checked_at, year=None, now=None):
+		"""
+		Predicate telling whether the paper is due for a check, see
+		interval().
+		"""
+		if now is None:
+			now = time.time()
+		return now >= checked_at + self.interval(history, checked_at, year, now)
+
+	@staticmethod
+	def _age(year, now):
+		"""Returns the number of years since the given one, or 0."""
+		try:
+			return max(0, time.localtime(now).tm_year - int(year))
+		except (TypeError, ValueError):
+			return 0
+
@@ -0,0 +1,261 @@
+#
+# Local SQLite store of the articles the queriers in google_scholar.py
+# and acmld.py have parsed, for answering repeated lookups without
+# going to the network.
+#
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from scholar_match import normalize_title
+
+
+class ArticleStore(object):
+	"""
+	ArticleStore keeps parsed articles in an SQLite database, one row
+	per article and source ('scholar' or 'acm'), along with when it
+	was fetched. Besides the article's full set of attributes, a row
+	holds its title, normalized title (see
+	scholar_match.normalize_title), year, venue, citation count,
+	cluster ID and URL in columns of their own, for querying.
+
+	Articles are identified by cluster ID where known, otherwise by
+	URL or, failing that, normalized title. Storing an article again
+	refreshes its row, keeping attributes the new copy lacks (e.g.
+	because the parser was restricted to certain fields).
+
+	Each article's citation count also gets tracked over time, as a
+	compact series with a point only where the count changed; its
+	row's fetched_at tells until when the last count held. See
+	history().
+
+	Finally, the store remembers which cluster ID a paper title was
+	resolved to, so that later lookups can go by cluster ID instead
+	of searching for the title again. See put_title_clusters().
+
+	The database runs in write-ahead-log mode, so readers do not block
+	the writer and commits are cheap. Instances are thread-safe, with
+	one connection per thread.
+	"""
+	SCHEMA = '''
+		CREATE TABLE IF NOT EXISTS articles (
+			key TEXT PRIMARY KEY,
+			source TEXT NOT NULL,
+			title TEXT,
+			norm_title TEXT,
+			year TEXT,
+			venue TEXT,
+			num_citations INTEGER,
+			cluster_id TEXT,
+			url TEXT,
+			fetched_at REAL NOT NULL,
+			data TEXT NOT NULL
+		);
+		CREATE INDEX IF NOT EXISTS articles_title ON articles (source, norm_title);
+		CREATE INDEX IF NOT EXISTS articles_cluster ON articles (cluster_id);
+		CREATE TABLE IF NOT EXISTS citations (
+			key TEXT NOT NULL,
+			observed_at REAL NOT NULL,
+			num_citations INTEGER NOT NULL,
+			PRIMARY KEY (key, observed_at)
+		);
+		CREATE TABLE IF NOT EXISTS title_clusters (
+			source TEXT NOT NULL,
+			norm_title TEXT NOT NULL,
+			cluster_id TEXT NOT NULL,
+			resolved_at REAL NOT NULL,
+			PRIMARY KEY (source, norm_title)
+		);
+	'''
+
+	# One instance per database file, see shared():
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self, path):
+		self.path = path
+		self.local = threading.local()
+
+		dname = os.path.dirname(os.path.abspath(path))
+		if not os.path.isdir(dname):
+			os.makedirs(dname)
+
+		conn = self._conn()
+		conn.executescript(self.SCHEMA)
+		conn.commit()
+
+	@classmethod
+	def shared(cls, path):
+		"""
+		Returns the process-wide store for the given database file,
+		opening it if needed.
+		"""
+		key = os.path.abspath(path)
+		with cls._instances_lock:
+			if key not in cls._instances:
+				cls._instances[key] = cls(path)
+			return cls._instances[key]
+
+	def put(self, source, article, fetched_at=None):
+		"""Stores a single article, see put_many()."""
+		self.put_many(source, [article], fetched_at)
+
+	def put_many(self, source, articles, fetched_at=None):
+		"""
+		Stores the given articles (ScholarArticle instances, or
+		anything providing their keys() and item access) as fetched
+		from source at fetched_at, by default now, in one transaction.
+		"""
+		if fetched_at is None:
+			fetched_at = time.time()
+
+		conn = self._conn()
+		with conn:
+			for article in articles:
+				data = {}
+				for key in article.keys():
+					if article[key] is not None:
+						data[key] = article[key]
+				if not data.get('title'):
+					continue
+
+				key = self._article_key(source, data)
+				row = conn.execute('SELECT data FROM articles WHERE key = ?', (key,)).fetchone()
+				if row is not None:
+					merged = json.loads(row[0])
+					merged.update(data)
+					data = merged
+
+				venue = data.get('conference') or data.get('venue')
+				num_citations = self._int(data.get('num_citations'))
+				conn.execute('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+							(key, source, data['title'], ' '.join(normalize_title(data['title'])),
+							self._text(data.get('year')), venue, num_citations,
+							self._text(data.get('cluster_id')), data.get('url'), fetched_at,
+							json.dumps(data, sort_keys=True)))
+
+				if num_citations is not None:
+					last = conn.execute('SELECT num_citations FROM citations WHERE key = ? '
+										'ORDER BY observed_at DESC LIMIT 1', (key,)).fetchone()
+					if last is None or last[0] != num_citations:
+						conn.execute('INSERT OR REPLACE INTO citations VALUES (?, ?, ?)',
+									(key, fetched_at, num_citations))
+
+	def find_title(self, source, title, max_age=None):
+		"""
+		Returns the stored articles from source whose normalized title
+		equals that of the given one, as attribute dictionaries, most
+		cited first. With max_age, only articles fetched at most that
+		many seconds ago qualify.
+		"""
+		return [data for _, _, data in self.find_title_entries(source, title, max_age)]
+
+	def find_title_entries(self, source, title, max_age=None):
+		"""
+		Like find_title(), but returns (key, fetched_at, attribute
+		dictionary) triplets, the key being what history() takes.
+		"""
+		sql = 'SELECT key, fetched_at, data FROM articles WHERE source = ? AND norm_title = ?'
+		args = [source, ' '.join(normalize_title(title))]
+		if max_age is not None:
+			sql += ' AND fetched_at >= ?'
+			args.append(time.time() - max_age)
+		sql += ' ORDER BY num_citations DESC'
+		return [(row[0], row[1], json.loads(row[2])) for row in self._conn().execute(sql, args)]
+
+	def find_cluster(self, cluster_id, max_age=None):
+		"""
+		Returns the stored article with the given cluster ID as an
+		attribute dictionary, or None.
+		"""
+		sql = 'SELECT data FROM articles WHERE cluster_id = ?'
+		args = [self._text(cluster_id)]
+		if max_age is not None:
+			sql += ' AND fetched_at >= ?'
+			args.append(time.time() - max_age)
+		row = self._conn().execute(sql, args).fetchone()
+		if row is None:
+			return None
+		return json.loads(row[0])
+
+	def history(self, key):
+		"""
+		Returns the citation count series of the article with the given
+		key, as (observed_at, num_citations) pairs in time order, one
+		for each time the count was seen to change.
+		"""
+		sql = 'SELECT observed_at, num_citations FROM citations WHERE key = ? ORDER BY observed_at'
+		return [(row[0], row[1]) for row in self._conn().execute(sql, (key,))]
+
+	def put_title_clusters(self, source, clusters):
+		"""
+		Records, in one transaction, which article cluster each title
+		(e.g. from a paper list) resolved to at source, given a
+		dictionary mapping titles to cluster IDs. Titles that normalize
+		alike (see scholar_match.normalize_title) share their entry.
+		"""
+		now = time.time()
+		conn = self._conn()
+		with conn:
+			for title, cluster_id in clusters.items():
+				conn.execute('INSERT OR REPLACE INTO title_clusters VALUES (?, ?, ?, ?)',
+							(source, ' '.join(normalize_title(title)), self._text(cluster_id), now))
+
+	def find_title_cluster(self, source, title):
+		"""
+		Returns the cluster ID the given title was last resolved to at
+		source, or None.
+		"""
+		row = self._conn().execute('SELECT cluster_id FROM title_clusters '
+									'WHERE source = ? AND norm_title = ?',
+									(source, ' '.join(normalize_title(title)))).fetchone()
+		if row is None:
+			return None
+		return row[0]
+
+	def count(self, source=None):
+		"""Returns the number of stored articles, optionally per source."""
+		if source is None:
+			return self._conn().execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+		return self._conn().execute('SELECT COUNT(*) FROM articles WHERE source = ?',
+									(source,)).fetchone()[0]
+
+	def close(self):
+		"""Closes this thread's connection."""
+		conn = getattr(self.local, 'conn', None)
+		if conn is not None:
+			conn.close()
+			self.local.conn = None
+
+	def _conn(self):
+		conn = getattr(self.local, 'conn', None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=30)
+			conn.execute('PRAGMA journal_mode=WAL')
+			conn.execute('PRAGMA synchronous=NORMAL')
+			self.local.conn = conn
+		return conn
+
+	@staticmethod
+	def _article_key(source, data):
+		if data.get('cluster_id') is not None:
+			return '%s:cluster:%s' % (source, data['cluster_id'])
+		if data.get('url') is not None:
+			return '%s:url:%s' % (source, data['url'])
+		return '%s:title:%s' % (source, ' '.join(normalize_title(data['title'])))
+
+	@staticmethod
+	def _text(value):
+		if value is None:
+			return None
+		return '%s' % value
+
+	@staticmethod
+	def _int(value):
+		try:
+			return int(value)
+		except (TypeError, ValueError):
+			return None
@@ -0,0 +1,194 @@
+#
+# Timing spans for the fetch and parse path of the queriers in
+# google_scholar.py and acmld.py, with JSON lines export.
+#
+
+import itertools
+import json
+import threading
+import time
+
+
+class Tracer(object):
+	"""
+	Tracer records timing spans: named intervals, each with its start
+	time, duration, thread and enclosing span, plus optional
+	attributes such as the URL involved. Spans either wrap a block of
+	code, via span(), or get recorded after the fact with record(),
+	for time accumulated in pieces (e.g. decompression while reading
+	a body). Instances are thread-safe; spans nest per thread.
+
+	The spans can be written out as JSON lines, one object per span,
+	followed by one summarizing the durations per span name with
+	percentiles. summary() and format_summary() provide the latter
+	directly.
+	"""
+	enabled = True
+
+	def __init__(self):
+		self.spans = []
+		self.lock = threading.Lock()
+		self.ids = itertools.count(1)
+		self.local = threading.local()
+
+	def span(self, name, **attrs):
+		"""
+		Returns a context manager recording a span of the given name
+		around the code it wraps.
+		"""
+		return _Span(self, name, attrs)
+
+	def record(self, name, start, duration, parent=None, **attrs):
+		"""Records a span measured by the caller."""
+		if parent is None:
+			parent = self.current()
+		entry = {'id': next(self.ids),
+				'name': name,
+				'start': start,
+				'duration': duration,
+				'thread': threading.current_thread().name,
+				'parent': parent}
+		if attrs:
+			entry['attrs'] = attrs
+		with self.lock:
+			self.spans.append(entry)
+		return entry['id']
+
+	def current(self):
+		"""Returns the ID of the innermost open span in this thread."""
+		stack = getattr(self.local, 'stack', None)
+		if stack:
+			return stack[-1]
+		return None
+
+	def summary(self):
+		"""
+		Returns a dictionary mapping each span name to the count, total,
+		mean, 50th, 90th and 99th percentile and maximum of its
+		durations, in seconds.
+		"""
+		durations = {}
+		with self.lock:
+			for entry in self.spans:
+				durations.setdefault(entry['name'], []).append(entry['duration'])
+
+		result = {}
+		for name, values in durations.items():
+			values.sort()
+			total = sum(values)
+			result[name] = {'count': len(values),
+							'total': total,
+							'mean': total / len(values),
+							'p50': _percentile(values, 50),
+							'p90': _percentile(values, 90),
+							'p99': _percentile(values, 99),
+							'max': values[-1]}
+		return result
+
+	def format_summary(self):
+		"""Returns the summary as a human-readable table."""
+		lines = ['%-14s %7s %10s %9s %9s %9s %9s' \
+				% ('span', 'count', 'total ms', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms')]
+		summary = self.summary()
+		for name in sorted(summary, key=lambda name: -summary[name]['total']):
+			item = summary[name]
+			lines.append('%-14s %7d %10.1f %9.2f %9.2f %9.2f %9.2f' \
+						% (name, item['count'], item['total'] * 1000, item['p50'] * 1000,
+						item['p90'] * 1000, item['p99'] * 1000, item['max'] * 1000))
+		return '\n'.join(lines)
+
+	def export(self, hdl):
+		"""
+		Writes the spans recorded so far to the given file object as
+		JSON lines, followed by the summary.
+		"""
+		with self.lock:
+			spans = list(self.spans)
+		for entry in spans:
+			entry = dict(entry)
+			entry['type'] = 'span'
+			hdl.write(json.dumps(entry, sort_keys=True) + '\n')
+		hdl.write(json.dumps({'type': 'summary', 'spans': self.summary()}, sort_keys=True) + '\n')
+
+	def save(self, path):
+		"""Exports the spans to the file at the given path."""
+		with open(path, 'w') as hdl:
+			self.export(hdl)
+
+	def _push(self, span_id):
+		stack = getattr(self.local, 'stack', None)
+		if stack is None:
+			stack = self.local.stack = []
+		stack.append(span_id)
+
+	def _pop(self):
+		self.local.stack.pop()
+
+
+class NullTracer(object):
+	"""
+	A Tracer stand-in that records nothing, used when tracing is off.
+	"""
+	enabled = False
+
+	def span(self, name, **attrs):
+		return _NULL_SPAN
+
+	def record(self, name, start, duration, parent=None, **attrs):
+		return None
+
+	def current(self):
+		return None
+
+
+class _Span(object):
+	def __init__(self, tracer, name, attrs):
+		self.tracer = tracer
+		self.name = name
+		self.attrs = attrs
+		self.span_id = None
+		self.parent = None
+		self.start = None
+
+	def __enter__(self):
+		self.parent = self.tracer.current()
+		self.span_id = next(self.tracer.ids)
+		self.tracer._push(self.span_id)
+		self.start = time.time()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		duration = time.time() - self.start
+		self.tracer._pop()
+		entry = {'id': self.span_id,
+				'name': self.name,
+				'start': self.start,
+				'duration': duration,
+				'thread': threading.current_thread().name,
+				'parent': self.parent}
+		if self.attrs:
+			entry['attrs'] = self.attrs
+		if exc_type is not None:
+			entry['error'] = exc_type.__name__
+		with self.tracer.lock:
+			self.tracer.spans.append(entry)
+		return False
+
+
+class _NullSpan(object):
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+_NULL_SPAN = _NullSpan()
+
+# The tracer queriers use unless given one:
+NULL_TRACER = NullTracer()
+
+
+def _percentile(values, pct):
+	"""Nearest-rank percentile of a sorted, non-empty list."""
+	idx = int(len(values) * pct / 100.0 + 0.5) - 1
+	return values[min(len(values) - 1, max(0, idx))]
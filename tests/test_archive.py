@@ -0,0 +1,81 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scholar_archive import HttpArchive
+
+URL = 'http://scholar.example.com/scholar?q=%d'
+
+
+class HttpArchiveTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, 'run.har')
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def _record(self, first, last):
+		archive = HttpArchive(self.path, HttpArchive.RECORD)
+		for idx in range(first, last):
+			archive.record(URL % idx, ('page %d' % idx).encode('ascii') * 50)
+		archive.close()
+
+	def _replay(self, count):
+		archive = HttpArchive(self.path, HttpArchive.REPLAY)
+		try:
+			return [archive.get(URL % idx) for idx in range(count)]
+		finally:
+			archive.close()
+
+	def _cut(self, length):
+		with open(self.path, 'rb+') as hdl:
+			hdl.truncate(os.path.getsize(self.path) - length)
+
+	def test_interrupted_body(self):
+		self._record(0, 3)
+		self._cut(5) # The last body got cut short
+		self._record(3, 5)
+
+		responses = self._replay(5)
+		self.assertEqual(responses[2], None)
+		for idx in (0, 1, 3, 4):
+			self.assertEqual(responses[idx], (200, ('page %d' % idx).encode('ascii') * 50))
+
+	def test_interrupted_header(self):
+		self._record(0, 2)
+		with open(self.path, 'ab') as hdl:
+			hdl.write(b'{"elapsed": 0.1, "len')
+		self._record(2, 4)
+
+		responses = self._replay(4)
+		for idx in range(4):
+			self.assertEqual(responses[idx], (200, ('page %d' % idx).encode('ascii') * 50))
+
+	def test_damage_resync(self):
+		# Archives damaged by earlier versions, which appended right
+		# after a record cut short, still replay the later records:
+		self._record(0, 2)
+		self._cut(5)
+		with open(self.path, 'rb') as hdl:
+			damaged = hdl.read()
+		os.remove(self.path)
+		self._record(2, 3)
+		with open(self.path, 'rb') as hdl:
+			later = hdl.read()
+		with open(self.path, 'wb') as hdl:
+			hdl.write(damaged + later)
+
+		responses = self._replay(3)
+		self.assertEqual(responses[0], (200, b'page 0' * 50))
+		self.assertEqual(responses[1], None)
+		self.assertEqual(responses[2], (200, b'page 2' * 50))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,125 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import google_scholar
+from scholar_cache import ScholarCache
+from scholar_ratelimit import RateLimiter
+
+ASYNC = sys.version_info >= (3, 7)
+
+
+class _Handler(BaseHTTPRequestHandler):
+	"""Rejects the first request of each path as too frequent."""
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		self.server.requests.append(self.path)
+		if self.server.requests.count(self.path) == 1:
+			self.send_response(429)
+			self.send_header('Retry-After', '0')
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+			return
+		body = ('result for %s' % self.path).encode('ascii')
+		self.send_response(200)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+class _FakeOpener(object):
+	def __init__(self):
+		self.urls = []
+
+	def open(self, req):
+		self.urls.append(req.get_full_url())
+		return _FakeResponse(req.get_full_url())
+
+
+class _FakeResponse(object):
+	def __init__(self, url):
+		self.url = url
+
+	def read(self):
+		return b'proxied'
+
+	def geturl(self):
+		return self.url
+
+	def getcode(self):
+		return 200
+
+	def info(self):
+		return {}
+
+
+@unittest.skipIf(not ASYNC, 'needs Python 3.7')
+class AsyncScholarQuerierTest(unittest.TestCase):
+
+	def setUp(self):
+		from scholar_async import AsyncScholarQuerier
+
+		self.server = HTTPServer(('127.0.0.1', 0), _Handler)
+		self.server.requests = []
+		self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+		self.thread.daemon = True
+		self.thread.start()
+		self.base = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+		self.dir = tempfile.mkdtemp()
+		self.querier = AsyncScholarQuerier(google_scholar)
+		self.querier.proxies = {}
+		self.querier.cache = ScholarCache(self.dir)
+		self.querier.limiter = RateLimiter(rate=100, burst=10)
+		self.querier.sync_querier.limiter = self.querier.limiter
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		shutil.rmtree(self.dir)
+
+	def _run(self, coro):
+		import asyncio
+		return asyncio.run(coro)
+
+	def test_rate_limited_retry(self):
+		url = self.base + '/scholar?q=test'
+		html = self._run(self.querier._get_http_response(url))
+		self.assertEqual(html, b'result for /scholar?q=test')
+		self.assertEqual(len(self.server.requests), 2)
+		self.assertTrue(self.querier.limiter.get_rate(url) < 100)
+		self.assertEqual(self.querier.cache.get(url), html)
+
+	def test_export_not_cached(self):
+		art = google_scholar.ScholarArticle()
+		art['url_citation'] = self.base + '/scholar.bib?q=info:x'
+		self.assertTrue(self._run(self.querier.get_citation_data(art)))
+		self.assertEqual(art.citation_data, b'result for /scholar.bib?q=info:x')
+		self.assertTrue(self.querier.cache.get(art['url_citation']) is None)
+
+	def test_proxy(self):
+		opener = _FakeOpener()
+		self.querier.sync_querier.opener = opener
+		self.querier.proxies = {'http': 'http://proxy.example.com:3128'}
+		url = self.base + '/scholar?q=proxied'
+		self.assertEqual(self._run(self.querier._get_http_response(url)), b'proxied')
+		self.assertEqual(opener.urls, [url])
+		self.assertEqual(self.server.requests, [])
+
+
+if __name__ == '__main__':
+	unittest.main()
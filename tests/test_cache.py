@@ -0,0 +1,75 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import google_scholar
+from scholar_cache import ScholarCache
+
+
+class _FakeResponse(object):
+	def __init__(self, url, body):
+		self.url = url
+		self.body = body
+
+	def read(self):
+		return self.body
+
+	def geturl(self):
+		return self.url
+
+	def getcode(self):
+		return 200
+
+	def info(self):
+		return {}
+
+
+class _FakeOpener(object):
+	"""Answers with a page telling the number of the request."""
+	def __init__(self):
+		self.count = 0
+
+	def open(self, req):
+		self.count += 1
+		return _FakeResponse(req.get_full_url(), b'page %d' % self.count)
+
+
+class CacheKeyTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.cache = ScholarCache(self.dir)
+		self.opener = _FakeOpener()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def _querier(self, citform):
+		querier = google_scholar.ScholarQuerier(cache=self.cache)
+		querier.opener = self.opener
+		if citform != 0:
+			settings = google_scholar.ScholarSettings()
+			settings.set_citation_format(citform)
+			querier.settings = settings
+		return querier
+
+	def test_citation_format_in_key(self):
+		url = 'https://scholar.google.com/scholar?q=test'
+		plain = self._querier(0)
+		self.assertEqual(plain._get_http_response(url), b'page 1')
+		self.assertEqual(plain._get_http_response(url), b'page 1')
+
+		# The plain page lacks the export links, so it does not do:
+		bibtex = self._querier(google_scholar.ScholarSettings.CITFORM_BIBTEX)
+		self.assertEqual(bibtex._get_http_response(url), b'page 2')
+		self.assertEqual(bibtex._get_http_response(url), b'page 2')
+		self.assertEqual(plain._get_http_response(url), b'page 1')
+		self.assertEqual(self.opener.count, 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
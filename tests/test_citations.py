@@ -0,0 +1,92 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import google_scholar
+from scholar_cache import ScholarCache
+from scholar_flight import SingleFlight
+
+
+class _ExportQuerier(google_scholar.ScholarQuerier):
+	"""Answers export requests, counting them."""
+	def __init__(self, cache=None):
+		google_scholar.ScholarQuerier.__init__(self, cache=cache, flights=SingleFlight())
+		self.requests = []
+		self.lock = threading.Lock()
+
+	def _get_http_response(self, url, log_msg=None, err_msg=None, cacheable=True):
+		with self.lock:
+			self.requests.append(url)
+		return ('@article{%s}' % url).encode('ascii')
+
+
+class CitationDataTest(unittest.TestCase):
+
+	def setUp(self):
+		self.prefetches = []
+		self.saved = google_scholar.Prefetch
+
+		def counting(func, *args):
+			self.prefetches.append(func)
+			return self.saved(func, *args)
+		google_scholar.Prefetch = counting
+
+	def tearDown(self):
+		google_scholar.Prefetch = self.saved
+
+	def _articles(self, links):
+		articles = []
+		for idx, link in enumerate(links):
+			art = google_scholar.ScholarArticle()
+			art['title'] = 'paper %d' % idx
+			art['url_citation'] = link
+			articles.append(art)
+		return articles
+
+	def test_without_links(self):
+		querier = _ExportQuerier()
+		articles = self._articles([None] * 20)
+		self.assertEqual(list(querier._with_citation_data(articles)), articles)
+		self.assertEqual(self.prefetches, [])
+		self.assertEqual(querier.requests, [])
+
+	def test_with_links(self):
+		querier = _ExportQuerier()
+		links = ['http://scholar.example.com/bib?q=%d' % (idx % 3) for idx in range(12)]
+		articles = self._articles(links[:6] + [None] + links[6:])
+		self.assertEqual(list(querier._with_citation_data(articles)), articles)
+
+		# One retrieval thread per article with a link, none nested,
+		# and one request per link:
+		self.assertEqual(len(self.prefetches), 12)
+		self.assertEqual(sorted(set(querier.requests)), sorted(set(links)))
+		self.assertEqual(len(querier.requests), 3)
+		for art in articles:
+			if art['url_citation'] is not None:
+				self.assertEqual(art.citation_data, ('@article{%s}' % art['url_citation']).encode('ascii'))
+
+	def test_cached(self):
+		path = tempfile.mkdtemp()
+		try:
+			cache = ScholarCache(path)
+			links = ['http://scholar.example.com/bib?q=1']
+			first = _ExportQuerier(cache)
+			list(first._with_citation_data(self._articles(links)))
+			self.assertEqual(first.requests, links)
+
+			second = _ExportQuerier(cache)
+			articles = self._articles(links)
+			list(second._with_citation_data(articles))
+			self.assertEqual(second.requests, [])
+			self.assertEqual(articles[0].citation_data, ('@article{%s}' % links[0]).encode('ascii'))
+		finally:
+			shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,61 @@
+import os
+import random
+import sys
+import unittest
+
+TOP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, TOP_DIR)
+sys.path.insert(0, os.path.join(TOP_DIR, 'bench'))
+
+import google_scholar
+import make_corpus
+from scholar_crawl import CitationCrawler
+
+# Cited cluster ID -> IDs of the papers citing it:
+CITING = {
+	'1000000000000000001': ['1000000000000000002', '1000000000000000003'],
+	'1000000000000000002': ['1000000000000000004'],
+}
+
+
+class _GraphQuerier(google_scholar.ScholarQuerier):
+	"""Serves made-up citations pages for the papers in CITING."""
+	requested = []
+
+	def _get_http_response(self, url, log_msg=None, err_msg=None, cacheable=True):
+		cluster = url.split('cites=', 1)[1].split('&', 1)[0]
+		self.requested.append(cluster)
+		citing = CITING.get(cluster, [])
+		return make_corpus.scholar_page(random.Random(0), ['Paper %s' % cid for cid in citing],
+										'query', total=len(citing),
+										clusters=[int(cid) for cid in citing],
+										cites=[len(CITING.get(cid, [])) for cid in citing])
+
+
+class CitationCrawlerTest(unittest.TestCase):
+
+	def test_uncited_papers_are_leaves(self):
+		_GraphQuerier.requested = []
+		crawler = CitationCrawler(_GraphQuerier,
+								lambda cid: google_scholar.CitesScholarQuery(cluster=cid),
+								depth=3, num_workers=1)
+		graph = crawler.crawl(['1000000000000000001'])
+
+		self.assertEqual(graph.num_nodes(), 4)
+		self.assertEqual(graph.citing('1000000000000000001'),
+						['1000000000000000002', '1000000000000000003'])
+		self.assertEqual(graph.citing('1000000000000000002'), ['1000000000000000004'])
+
+		# The uncited papers made it into the graph, without getting
+		# queried:
+		for cid in ('1000000000000000003', '1000000000000000004'):
+			self.assertFalse(graph.node(cid) is None)
+			self.assertEqual(graph.citing(cid), [])
+			self.assertEqual(crawler.papers[cid]['num_citations'], 0)
+		self.assertEqual(sorted(_GraphQuerier.requested),
+						['1000000000000000001', '1000000000000000002'])
+		self.assertEqual(crawler.num_failed, 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,77 @@
+import os
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+	from http.cookiejar import CookieJar
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from urllib.request import Request
+except ImportError:
+	from cookielib import CookieJar
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from urllib2 import Request
+
+from scholar_http import ScholarTransport
+
+
+class _Handler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		body = b'hello'
+		self.send_response(200)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+class _StaleConnection(object):
+	"""An idle connection the server has closed in the meantime."""
+	def __init__(self):
+		self.sock = object()
+		self.closed = False
+
+	def request(self, *args, **kwargs):
+		raise socket.error(32, 'Broken pipe')
+
+	def close(self):
+		self.closed = True
+
+
+class ScholarTransportTest(unittest.TestCase):
+
+	def setUp(self):
+		self.server = HTTPServer(('127.0.0.1', 0), _Handler)
+		self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+		self.thread.daemon = True
+		self.thread.start()
+		self.transport = ScholarTransport(CookieJar(), timeout=5)
+		self.transport.proxies = {}
+
+	def tearDown(self):
+		self.transport.close()
+		self.server.shutdown()
+		self.server.server_close()
+
+	def test_retry_skips_stale_pool(self):
+		port = self.server.server_address[1]
+		key = ('http', '127.0.0.1', port)
+		stale = [_StaleConnection(), _StaleConnection()]
+		self.transport.idle[key] = list(stale)
+
+		resp = self.transport.open(Request('http://127.0.0.1:%d/' % port))
+		self.assertEqual(resp.getcode(), 200)
+		self.assertEqual(resp.read(), b'hello')
+		self.assertTrue(all([conn.closed for conn in stale]))
+
+		# The new connection is the only one kept:
+		self.assertEqual(len(self.transport.idle[key]), 1)
+		self.assertFalse(self.transport.idle[key][0] in stale)
+
+
+if __name__ == '__main__':
+	unittest.main()
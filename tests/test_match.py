@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import acmld
+import google_scholar
+import rankConfCitation
+from scholar_match import demultiplex
+
+TITLE = 'Language-based control and mitigation of timing channels'
+
+
+def acm_article(title, date, conference, num_citations):
+	art = acmld.ScholarArticle()
+	art['title'] = title
+	art['date'] = date
+	art['conference'] = conference
+	art['num_citations'] = num_citations
+	return art
+
+
+def scholar_article(title, year, num_citations):
+	art = google_scholar.ScholarArticle()
+	art['title'] = title
+	art['year'] = year
+	art['num_citations'] = num_citations
+	return art
+
+
+class ResolvePaperTest(unittest.TestCase):
+
+	def test_wrong_year_loses(self):
+		pldi = acm_article(TITLE, 'June 2012', "PLDI '12 Proceedings of the 33rd ACM SIGPLAN "
+							'conference on Programming Language Design and Implementation', 60)
+		notices = acm_article(TITLE, 'January 2011', 'ACM SIGPLAN Notices', 118)
+		self.assertTrue(rankConfCitation.resolvePaper(TITLE, [notices, pldi], '2012', 'PLDI') is pldi)
+
+	def test_most_cited_version_wins(self):
+		versions = [scholar_article(TITLE, 2012, 40), scholar_article(TITLE, 2012, 75)]
+		self.assertTrue(rankConfCitation.resolvePaper(TITLE, versions, '2012') is versions[1])
+
+
+class DemultiplexTest(unittest.TestCase):
+
+	def test_wrong_year_left_out(self):
+		other = 'Automatic parallelization of irregular loops on multicores'
+		pldi = acm_article(TITLE, 'June 2012', "PLDI '12 Proceedings", 60)
+		notices = acm_article(TITLE, 'January 2011', 'ACM SIGPLAN Notices', 118)
+		loops = acm_article(other, 'June 2012', "PLDI '12 Proceedings", 12)
+		result = demultiplex([TITLE, other], [notices, loops, pldi], '2012', 'PLDI')
+		self.assertEqual(result, {TITLE: [pldi], other: [loops]})
+
+	def test_versions_kept(self):
+		versions = [scholar_article(TITLE, 2012, 40), scholar_article(TITLE, 2012, 75)]
+		result = demultiplex([TITLE], versions + [scholar_article(TITLE, 2010, 90)], '2012')
+		self.assertEqual(result, {TITLE: versions})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import acmld
+import google_scholar
+
+
+class _FakePages(object):
+	"""
+	Stands in for a querier's _get_page(), serving pages of the given
+	size from a result set of the given total, which each page reports
+	when report is True. It records which pages got requested, and
+	which ones were requested while the first was still underway.
+	"""
+	def __init__(self, size, total, report=True):
+		self.size = size
+		self.total = total
+		self.report = report
+		self.requested = []
+		self.during_first = None
+		self.lock = threading.Lock()
+
+	def __call__(self, query, page, fields=None):
+		with self.lock:
+			self.requested.append(page)
+		if page == 0:
+			time.sleep(0.05) # Leave time for any premature prefetches
+			with self.lock:
+				self.during_first = list(self.requested)
+		first = page * self.size
+		articles = [{'title': 'paper %d' % idx}
+					for idx in range(first, min(first + self.size, self.total))]
+		return (self.total if self.report else None), articles
+
+
+class PagingTest(unittest.TestCase):
+
+	def _run(self, backend, pages, total_results):
+		querier = backend.ScholarQuerier()
+		querier._get_page = pages
+		query = backend.SearchScholarQuery()
+		query.set_total_results(total_results)
+		return list(querier._iter_query(query))
+
+	def test_first_page_alone(self):
+		for backend, size in ((google_scholar, google_scholar.ScholarConf.MAX_PAGE_RESULTS),
+							(acmld, acmld.ScholarConf.MAX_PAGE_RESULTS)):
+			pages = _FakePages(size, 2 * size + 1)
+			articles = self._run(backend, pages, 10 * size)
+			self.assertEqual(len(articles), 2 * size + 1)
+			self.assertEqual(pages.during_first, [0])
+			# No pages beyond the reported total:
+			self.assertEqual(sorted(pages.requested), [0, 1, 2])
+
+	def test_unreported_total(self):
+		size = google_scholar.ScholarConf.MAX_PAGE_RESULTS
+		pages = _FakePages(size, 2 * size, report=False)
+		articles = self._run(google_scholar, pages, 10 * size)
+		self.assertEqual(len(articles), 2 * size)
+		self.assertEqual(pages.requested, [0, 1, 2])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rankConfCitation
+from scholar_refresh import RefreshPolicy, DAY
+
+
+class RefreshPolicyTest(unittest.TestCase):
+
+	def test_zero_min_interval(self):
+		policy = RefreshPolicy(0, 10 * DAY)
+		now = 1000 * DAY
+		# A single check, just made: no span to tell the velocity from.
+		self.assertEqual(policy.interval([(now, 5)], now, 2010, now), 0)
+		self.assertTrue(policy.is_stale([(now, 5)], now, 2010, now))
+
+		history = [(now - 10 * DAY, 5), (now, 15)]
+		self.assertEqual(policy.interval(history, now, 2010, now), DAY)
+
+	def test_max_age_zero(self):
+		policy = rankConfCitation.makeRefreshPolicy(0, 0)
+		self.assertEqual(policy.max_interval, 0)
+		self.assertTrue(policy.is_stale([(0, 5), (DAY, 50)], DAY, 2010, DAY))
+
+		policy = rankConfCitation.makeRefreshPolicy(1, 0)
+		self.assertEqual(policy.max_interval, DAY)
+
+	def test_max_age_unset(self):
+		policy = rankConfCitation.makeRefreshPolicy(1, None)
+		self.assertEqual(policy.max_interval, 90 * DAY)
+
+
+if __name__ == '__main__':
+	unittest.main()